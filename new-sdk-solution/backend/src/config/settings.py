@@ -95,6 +95,10 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 GAMES_ROOT = BASE_DIR / 'games_assets'
 
+# Write-behind counters (games.counters): Redis when configured, in-process buffer otherwise
+COUNTERS_REDIS_URL = env('REDIS_URL', default='')
+COUNTERS_FLUSH_INTERVAL = env.float('COUNTERS_FLUSH_INTERVAL', default=5.0)
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -0,0 +1,132 @@
+import atexit
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Game
+
+
+class MemoryStorage:
+    """In-process stand-in for Redis, pending deltas are visible to the current process only."""
+
+    def __init__(self, name):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.deltas = defaultdict(int)
+        self.flushing = {}
+
+    def incr(self, pk, amount):
+        with self.lock:
+            self.deltas[pk] += amount
+
+    def pending(self, pks):
+        with self.lock:
+            return {pk: self.deltas.get(pk, 0) + self.flushing.get(pk, 0) for pk in pks}
+
+    def acquire(self):
+        return self.flush_lock.acquire(blocking=False)
+
+    def release(self):
+        self.flush_lock.release()
+
+    def take(self):
+        with self.lock:
+            if not self.flushing:
+                self.flushing, self.deltas = dict(self.deltas), defaultdict(int)
+            return dict(self.flushing)
+
+    def done(self):
+        with self.lock:
+            self.flushing = {}
+
+
+class RedisStorage:
+    """Deltas live in a Redis hash shared by all workers, a flush renames it to take them atomically."""
+
+    def __init__(self, name, url):
+        from redis import Redis
+        self.client = Redis.from_url(url)
+        self.key = f'counters:{name}'
+        self.flushing_key = f'counters:{name}:flushing'
+        self.lock_key = f'counters:{name}:lock'
+
+    def incr(self, pk, amount):
+        self.client.hincrby(self.key, pk, amount)
+
+    def pending(self, pks):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hmget(self.key, pks)
+        pipe.hmget(self.flushing_key, pks)
+        values, flushing = pipe.execute()
+        return {pk: int(a or 0) + int(b or 0) for pk, a, b in zip(pks, values, flushing)}
+
+    def acquire(self):
+        return bool(self.client.set(self.lock_key, 1, nx=True, ex=60))
+
+    def release(self):
+        self.client.delete(self.lock_key)
+
+    def take(self):
+        from redis import ResponseError
+        if not self.client.exists(self.flushing_key):
+            try:
+                self.client.renamenx(self.key, self.flushing_key)
+            except ResponseError:
+                return {}
+        return {int(pk): int(value) for pk, value in self.client.hgetall(self.flushing_key).items()}
+
+    def done(self):
+        self.client.delete(self.flushing_key)
+
+
+class CounterBuffer:
+    """
+    Write-behind counter: increments are buffered and written to the database with one
+    bulk UPDATE at most every `flush_interval` seconds. Reads add the pending deltas.
+    """
+
+    def __init__(self, model, field, name=None, flush_interval=None):
+        self.model = model
+        self.field = field
+        self.name = name or f'{model._meta.label_lower}.{field}'
+        self.flush_interval = settings.COUNTERS_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        if settings.COUNTERS_REDIS_URL:
+            self.storage = RedisStorage(self.name, settings.COUNTERS_REDIS_URL)
+        else:
+            self.storage = MemoryStorage(self.name)
+        self.flushed_at = time.monotonic()
+
+    def incr(self, pk, amount=1):
+        self.storage.incr(pk, amount)
+        if time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.flush()
+
+    def value(self, pk, db_value):
+        return db_value + self.storage.pending([pk])[pk]
+
+    def flush(self):
+        if not self.storage.acquire():
+            return 0
+        try:
+            self.flushed_at = time.monotonic()
+            deltas = {pk: delta for pk, delta in self.storage.take().items() if delta}
+            updated = 0
+            if deltas:
+                whens = [When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()]
+                with transaction.atomic():
+                    updated = self.model.objects.filter(pk__in=deltas.keys()).update(**{
+                        self.field: F(self.field) + Case(*whens, default=Value(0), output_field=IntegerField())
+                    })
+            self.storage.done()
+            return updated
+        finally:
+            self.storage.release()
+
+
+opens = CounterBuffer(Game, 'opens')
+# buffered opens of the process would be lost otherwise
+atexit.register(opens.flush)
@@ -0,0 +1,58 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F
+
+from games import counters
+from games.models import Game
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request UPDATEs of a single hot row with the write-behind counter buffer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=500, help='opens per thread')
+
+    def handle(self, *args, **options):
+        game, _ = Game.objects.get_or_create(
+            slug='benchmark-opens', defaults={'title': 'Benchmark opens', 'launch_url': '/', 'is_active': False},
+        )
+        total = options['threads'] * options['requests']
+
+        def direct(requests):
+            try:
+                for _ in range(requests):
+                    obj = Game.objects.get(pk=game.pk)
+                    obj.opens = F('opens') + 1
+                    obj.save(update_fields=['opens'])
+                    obj.refresh_from_db()
+            finally:
+                connection.close()
+
+        def buffered(requests):
+            try:
+                for _ in range(requests):
+                    obj = Game.objects.get(pk=game.pk)
+                    counters.opens.incr(obj.pk)
+                    counters.opens.value(obj.pk, obj.opens)
+            finally:
+                connection.close()
+
+        try:
+            for title, worker in (('F() update + refresh', direct), ('write-behind buffer', buffered)):
+                Game.objects.filter(pk=game.pk).update(opens=0)
+                start = time.monotonic()
+                with ThreadPoolExecutor(options['threads']) as executor:
+                    list(executor.map(worker, [options['requests']] * options['threads']))
+                counters.opens.flush()
+                duration = time.monotonic() - start
+                game.refresh_from_db()
+                self.stdout.write(self.style.SUCCESS(
+                    f'{title}: {total} opens in {duration:.2f}s, {total / duration:.0f} opens/s, '
+                    f'stored {game.opens}'
+                ))
+        finally:
+            game.delete()
@@ -1,10 +1,16 @@
 from rest_framework import serializers
+from . import counters
 from .models import Game
 
 class GameSerializer(serializers.ModelSerializer):
+    opens = serializers.SerializerMethodField()
+
     class Meta:
         model = Game
         fields = [
             'id', 'title', 'slug', 'description', 'launch_url', 'thumbnail', 'opens', 'category'
         ]
-        read_only_fields = ['opens'] 
\ No newline at end of file
+        read_only_fields = ['opens'] 
+
+    def get_opens(self, obj):
+        return counters.opens.value(obj.pk, obj.opens)
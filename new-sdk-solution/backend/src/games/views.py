@@ -1,7 +1,7 @@
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import F
+from . import counters
 from .models import Game
 from .serializers import GameSerializer
 
@@ -22,7 +22,5 @@ class GameViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[permissions.AllowAny])
     def open(self, request, slug=None):
         game = self.get_object()
-        game.opens = F('opens') + 1
-        game.save(update_fields=['opens'])
-        game.refresh_from_db()
-        return Response({'opens': game.opens}) 
\ No newline at end of file
+        counters.opens.incr(game.pk)
+        return Response({'opens': counters.opens.value(game.pk, game.opens)}) 
\ No newline at end of file
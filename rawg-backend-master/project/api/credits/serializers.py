@@ -10,7 +10,7 @@ from api.serializers_mixins import ReversionMixin
 from apps.common import seo
 from apps.credits import models, search_indexes
 from apps.credits.tasks import update_person
-from apps.games.tasks import update_game_totals
+from apps.games.tasks import denormalize_game
 from apps.reviews.models import Review
 from apps.utils.haystack import clear_id
 
@@ -197,7 +197,7 @@ class GamePersonCreateSerializer(ReversionMixin, serializers.ModelSerializer):
     def perform_create(self, validated_data):
         def on_commit():
             update_person.delay(self.create[0].person_id)
-            update_game_totals.delay(self.context['view'].game_id, 'persons')
+            denormalize_game(self.context['view'].game_id, totals=['persons'])
         transaction.on_commit(on_commit)
         models.GamePerson.objects.bulk_create(self.create, ignore_conflicts=True)
         return self.create[0]
@@ -222,7 +222,7 @@ class GamePersonCreateSerializer(ReversionMixin, serializers.ModelSerializer):
     def perform_update(self, instance, validated_data):
         def on_commit():
             update_person.delay(instance.person_id)
-            update_game_totals.delay(self.context['view'].game_id, 'persons')
+            denormalize_game(self.context['view'].game_id, totals=['persons'])
         transaction.on_commit(on_commit)
         models.GamePerson.objects.bulk_create(self.create, ignore_conflicts=True)
         models.GamePerson.objects.filter(
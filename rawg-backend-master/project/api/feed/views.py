@@ -3,6 +3,7 @@ from django.db import connection
 from django.db.models import Case, IntegerField, When, prefetch_related_objects
 from rest_framework import mixins, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.status import HTTP_404_NOT_FOUND
@@ -14,6 +15,7 @@ from api.games.serializers import GameSerializer
 from api.users.permissions import IsUserOwner
 from api.views_mixins import FakePaginateMixin, GetObjectMixin, PaginateDetailRouteMixin
 from apps.feed import models
+from apps.feed.timeline import ACTIONS, ORDERING_CREATED, ORDERING_CREATED_DESC, ORDERING_RANK, timeline
 from apps.games.models import Game
 from apps.utils.lang import get_languages
 
@@ -42,8 +44,19 @@ class FeedViewSet(FakePaginateMixin, GetObjectMixin, mixins.RetrieveModelMixin,
         qs = models.UserNotifyFeed.objects.prefetch().filter(user=self.request.user)
         return self.get_paginated_detail_response(qs)
 
+    def get_explore_languages(self, request):
+        if self.request.user.all_languages:
+            return None
+        languages = get_languages(request)[0:10]
+        languages.append('-')
+        if settings.DEFAULT_LANGUAGE not in languages:
+            languages.append(settings.DEFAULT_LANGUAGE)
+        return languages
+
     @action(detail=False)
     def explore(self, request):
+        if timeline.enabled:
+            return self.explore_timeline(request)
         args = [self.request.user.id]
         body = '''
             FROM feed_userfeed
@@ -56,11 +69,8 @@ class FeedViewSet(FakePaginateMixin, GetObjectMixin, mixins.RetrieveModelMixin,
             args += actions
             templates = ', '.join('%s' for _ in enumerate(actions))
             body += ' AND feed_feed.action IN ({})'.format(templates)
-        if not self.request.user.all_languages:
-            languages = get_languages(request)[0:10]
-            languages.append('-')
-            if settings.DEFAULT_LANGUAGE not in languages:
-                languages.append(settings.DEFAULT_LANGUAGE)
+        languages = self.get_explore_languages(request)
+        if languages is not None:
             args.append('{{{}}}'.format(models.UserFeed.SOURCES_COMMON))
             args += languages
             templates = ', '.join('%s' for _ in enumerate(languages))
@@ -110,6 +120,43 @@ class FeedViewSet(FakePaginateMixin, GetObjectMixin, mixins.RetrieveModelMixin,
         serializer = self.get_serializer(rows, many=True, context=self.get_serializer_context())
         return self.get_paginated_response(serializer.data)
 
+    def explore_timeline(self, request):
+        # the same explore from the precomputed timelines, the cursor keeps the merge state of the actions
+        # and the count of the first page, so the next pages don't depend on the offset
+        user_id = self.request.user.id
+        actions = request.GET.get('actions')
+        # every action is a stream of the merge, so the repeated and the unknown ones are skipped
+        actions = [action for action in dict.fromkeys(actions.split(',')) if action in ACTIONS] if actions else ACTIONS
+        languages = self.get_explore_languages(request)
+        ordering = ORDERING_CREATED_DESC if self.request.user.feed_chronological else ORDERING_RANK
+        if request.GET.get('ordering') in (ORDERING_CREATED, ORDERING_CREATED_DESC):
+            ordering = request.GET.get('ordering')
+
+        if self.paginator.is_cursor(request):
+            cursor = self.paginator.init_cursor_params(request)
+            state, count = {}, None
+            if cursor:
+                try:
+                    state, count = cursor[0]
+                    state = {
+                        str(key): [float(created), int(pk), int(taken)] for key, (created, pk, taken) in state.items()
+                    }
+                    count = int(count)
+                except (AttributeError, TypeError, ValueError):
+                    raise NotFound(self.paginator.invalid_cursor_message)
+            if count is None:
+                count = timeline.count(user_id, actions, languages)
+            rows = timeline.page(user_id, actions, languages, ordering, state, limit=self.paginator.page_size + 1)
+            rows = self.paginator.cursor_page(rows, count, lambda row: [row.timeline_state, count])
+        else:
+            count = timeline.count(user_id, actions, languages)
+            limit, offset = self.raw_paginate(request, count, [])
+            rows = timeline.page(user_id, actions, languages, ordering, offset=offset, limit=limit)
+
+        prefetch_related_objects(rows, 'feed', 'feed__user')
+        serializer = self.get_serializer(rows, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=False, permission_classes=[IsAuthenticatedOrReadOnly])
     def reactions(self, request):
         items = self.get_serializer(models.Reaction.objects.all(), many=True).data
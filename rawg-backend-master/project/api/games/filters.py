@@ -1,6 +1,9 @@
+import json
 import operator
-from copy import deepcopy
+from hashlib import md5
 
+from django.conf import settings
+from django.core.cache import cache as django_cache
 from django_filters.rest_framework import FilterSet, filters
 from drf_haystack.filters import HaystackFilter
 from drf_haystack.generics import HaystackGenericAPIView
@@ -65,25 +68,39 @@ class GameSearchBackend(HaystackFilter):
             start_offset = (page - 1) * end_offset
             end_offset = start_offset + end_offset
 
+        post_filter = None
+        if self.is_dates_filter:
+            # https://3.basecamp.com/3964781/buckets/11829505/todos/1799018118
+            # the facets are counted without the dates filter, so it is moved to the post filter
+            # and the hits, the count and the facets are returned by one request
+            post_filter = custom_query['bool']['filter'].pop(self.is_dates_filter - 1)
+
+        view.is_search = True
+        cache_key = None
+        if settings.GAMES_SEARCH_CACHE_TIMEOUT:
+            cache_key = 'api.games.filters.search.{}'.format(md5(json.dumps(
+                [custom_query, post_filter, ordering, facets_rows, start_offset, end_offset],
+                sort_keys=True, default=str,
+            ).encode()).hexdigest())
+            cached = django_cache.get(cache_key)
+            if cached:
+                results, view.search_count, view.facets = cached
+                return results
+
         search_queryset = search_queryset.custom_query(
-            custom_query, ordering, facets_rows if not self.is_dates_filter else None, start_offset, end_offset
+            custom_query, ordering, facets_rows, start_offset, end_offset, post_filter
         )
         search_queryset.query.run()
-        view.is_search = True
         view.facets = (search_queryset.facet_counts() or {}).get('fields') or {}
         view.search_count = search_queryset.count()
-
-        # https://3.basecamp.com/3964781/buckets/11829505/todos/1799018118
-        if self.is_dates_filter:
-            without_dates_query = deepcopy(custom_query)
-            without_dates_query['bool']['filter'] = [
-                row for i, row in enumerate(without_dates_query['bool']['filter']) if i + 1 != self.is_dates_filter
-            ]
-            without_dates_queryset = search_queryset.custom_query(without_dates_query, ordering, facets_rows, 0, 1)
-            without_dates_queryset.query.run()
-            view.facets = (without_dates_queryset.facet_counts() or {}).get('fields') or {}
-
-        return search_queryset.query._results
+        results = search_queryset.query._results
+
+        if cache_key:
+            django_cache.set(
+                cache_key, (results, view.search_count, view.facets),
+                settings.GAMES_SEARCH_CACHE_TIMEOUT
+            )
+        return results
 
     def build_custom_query(self, request, view=None):
         active = False
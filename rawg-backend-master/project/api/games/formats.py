@@ -40,6 +40,21 @@ def percents(games, children, word, to_dict=True, filter_hidden=False, fields=No
     return sorted(results.values(), key=lambda x: -x['count'])
 
 
+def counters_percents(counters, items, word):
+    results = []
+    total = sum(counters[item.id] for item in items)
+    percent = total / 100
+    for item in items:
+        result = {'count': counters[item.id], word: item.id, 'name': item.name}
+        if hasattr(item, f'name_{settings.MODELTRANSLATION_DEFAULT_LANGUAGE}'):
+            for lang, _ in settings.LANGUAGES:
+                result[f'name_{lang}'] = getattr(item, f'name_{lang}')
+        result['slug'] = item.slug
+        result['percent'] = round(result['count'] / percent, 2)
+        results.append(result)
+    return sorted(results, key=lambda x: (-x['count'], x[word]))
+
+
 def ratings():
     return [
         {
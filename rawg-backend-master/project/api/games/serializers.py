@@ -32,7 +32,7 @@ from apps.common.cache import CommonContentType
 from apps.common.seo import hide_description
 from apps.discussions.models import Discussion
 from apps.external.models import Imgur, Twitch, Youtube
-from apps.games import models, search_indexes
+from apps.games import counters, models, search_indexes
 from apps.games.apps import GamesConfig
 from apps.games.cache import GenreList, PlatformList, PlatformParentList, PlatformParentListByPlatform, StoreList
 from apps.games.tasks import update_game_json_field
@@ -1402,7 +1402,7 @@ class GameSingleSerializer(GameJSONSerializerMixin, GameSerializerMixin, seriali
     alternative_fullscreen = serializers.BooleanField(read_only=True)
     image = serializers.FileField(read_only=True)
     short_platforms = False
-    plays = serializers.IntegerField(read_only=True)
+    plays = serializers.SerializerMethodField()
     exit_button_position = serializers.ListField(source='get_exit_button_position', read_only=True)
 
     class Meta:
@@ -1510,6 +1510,9 @@ class GameSingleSerializer(GameJSONSerializerMixin, GameSerializerMixin, seriali
                     pass
         return data
 
+    def get_plays(self, obj):
+        return counters.plays.value(obj.id, obj.plays)
+
     def get_iframe_url(self, obj):
         iframe_url = obj.get_iframe_display()
         if not iframe_url:
@@ -59,9 +59,9 @@ from apps.common.seo import games_list_seo
 from apps.credits.models import GamePerson, Person
 from apps.discussions.models import Discussion
 from apps.files.models import File
-from apps.games import cache, models
+from apps.games import cache, counters, models
 from apps.games.cache import PlatformList, PlatformListMain, PlatformParentListByPlatform
-from apps.games.tasks import increment_plays, touch_game_visit
+from apps.games.tasks import touch_game_visit
 from apps.recommendations.models import UserRecommendation
 from apps.reviews.models import Review, Versus
 from apps.stat.tasks import add_recommendations_visit, add_recommended_game_visit
@@ -425,6 +425,7 @@ class GameViewSet(
 
         order = 'games_game.added DESC'
         ordering_field = 'added'
+        ordering_direction = 'DESC'
         ordering = request.GET.get('ordering')
         if ordering:
             ordering_field = ordering
@@ -434,20 +435,45 @@ class GameViewSet(
                 ordering_direction = 'DESC'
             if ordering_field in self.ordering_fields:
                 order = '{} {}'.format(ordering_field, ordering_direction)
+            else:
+                ordering_field = 'added'
+                ordering_direction = 'DESC'
         if ordering_field in filters.NOT_UNIQUE_ORDERING_FIELDS:
             order += ', id DESC'
 
         count = cache.GameCount().get()
-        args = self.raw_paginate(request, count, [])
         fields = ', '.join(f'games_game.{field}' for field in models.Game.objects.raw_list_fields)
-        rows = list(queryset.raw(
-            f'''
-            SELECT {fields}
-            FROM games_game
-            ORDER BY {order}
-            LIMIT %s OFFSET %s
-            ''', args,
-        ))
+        if self.paginator.is_cursor(request):
+            # the keyset mode doesn't depend on the page depth, the id is always used as a tie-breaker
+            cursor = self.paginator.init_cursor_params(request)
+            where = ''
+            args = []
+            if cursor:
+                where, args = self.paginator.cursor_sql(
+                    f'games_game.{ordering_field}', 'games_game.id', ordering_direction == 'DESC', cursor
+                )
+                where = f'WHERE {where}'
+            args.append(self.paginator.page_size + 1)
+            rows = list(queryset.raw(
+                f'''
+                SELECT {fields}
+                FROM games_game
+                {where}
+                ORDER BY games_game.{ordering_field} {ordering_direction}, games_game.id DESC
+                LIMIT %s
+                ''', args,
+            ))
+            rows = self.paginator.cursor_page(rows, count, lambda row: getattr(row, ordering_field))
+        else:
+            args = self.raw_paginate(request, count, [])
+            rows = list(queryset.raw(
+                f'''
+                SELECT {fields}
+                FROM games_game
+                ORDER BY {order}
+                LIMIT %s OFFSET %s
+                ''', args,
+            ))
         serializer = self.get_serializer(rows, many=True, context=self.get_serializer_context())
         response = self.get_paginated_response(serializer.data)
         games_list_seo(request, response, count)
@@ -2242,7 +2268,7 @@ class GamePlays(APIView):
     permission_classes = (AllowAny,)
 
     def post(self, request, game_id):
-        increment_plays.delay(game_id)
+        counters.plays.incr(game_id)
         return Response()
 
 
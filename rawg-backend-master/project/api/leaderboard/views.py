@@ -1,4 +1,3 @@
-from dateutil.relativedelta import relativedelta
 from django.contrib.auth import get_user_model
 from django.db.models import CharField, Count, IntegerField, Value
 from django.db.models.functions import Cast
@@ -13,6 +12,7 @@ from api.leaderboard import paginations, serializers
 from apps.credits.models import GamePerson
 from apps.games.cache import GameEditingContentTypes, GameEditingEarliestDate
 from apps.games.models import Addition, Game, GameStore, ScreenShot
+from apps.stat.models import EditingCounter
 from apps.utils.api import int_or_none, int_or_number
 from apps.utils.dates import first_day_of_month
 from apps.utils.db import join
@@ -45,14 +45,8 @@ class LeaderBoardViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         return serializer_class(*args, **kwargs)
 
     def get_queryset(self):
-        qs = (
-            super().get_queryset()
-            .values('user')
-            .annotate(count=Count('id', distinct=True))
-            .order_by('-count')
-            .exclude(user=None)
-        )
         if self.action == 'list':
+            # the monthly counters are updated with every revision, see apps.stat.models.EditingCounter
             date_created = first_day_of_month(now())
             self.month = int_or_none(self.request.GET.get('month')) or now().month
             if self.month:
@@ -60,9 +54,19 @@ class LeaderBoardViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
             self.year = int_or_none(self.request.GET.get('year')) or now().year
             if self.year:
                 date_created = date_created.replace(year=self.year)
-            date_created_end = date_created + relativedelta(months=1)
-            qs = qs.filter(date_created__date__gte=date_created, date_created__date__lt=date_created_end)
-        return qs
+            return (
+                EditingCounter.objects
+                .filter(month=date_created.date(), count__gt=0)
+                .values('user', 'count')
+                .order_by('-count', 'user_id')
+            )
+        return (
+            super().get_queryset()
+            .values('user')
+            .annotate(count=Count('id', distinct=True))
+            .order_by('-count')
+            .exclude(user=None)
+        )
 
     @swagger_auto_schema(operation_summary='List The User Editing Leaderboard.')
     def list(self, request, *args, **kwargs):
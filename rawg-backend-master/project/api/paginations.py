@@ -1,13 +1,41 @@
-from typing import Union
+import binascii
+import json
+from datetime import datetime
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple, Union
 
 from django.core.paginator import InvalidPage, Page, Paginator as DjangoPaginator
-from django.db.models import QuerySet
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q, QuerySet
+from django.utils.dateparse import parse_datetime
 from django.utils.functional import cached_property
 from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination as DefaultPageNumberPagination
 from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.views import APIView
 
+Cursor = Tuple[Any, int]
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder cuts datetimes to milliseconds, a cursor keeps the microseconds to compare with the rows
+    def default(self, o):
+        if isinstance(o, datetime):
+            return {'datetime': o.isoformat()}
+        return super().default(o)
+
+
+def cursor_object_hook(data: dict) -> Any:
+    if list(data) == ['datetime']:
+        value = parse_datetime(data['datetime'])
+        if value is None:
+            raise ValueError(data['datetime'])
+        return value
+    return data
+
 
 class CountPaginator(DjangoPaginator):
     count_queryset = None
@@ -27,6 +55,12 @@ class CountPaginator(DjangoPaginator):
 class PageNumberPagination(DefaultPageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 40
+    cursor_query_param = 'cursor'
+    cursor_annotation = 'pagination_cursor'
+    invalid_cursor_message = 'Invalid cursor.'
+    cursor_mode = False
+    cursor_count = None
+    cursor_next = None
 
     def init_params(self, queryset: QuerySet, request: Request):
         if getattr(self, 'request', None):
@@ -58,6 +92,115 @@ class PageNumberPagination(DefaultPageNumberPagination):
             self.display_page_controls = True
         return paginator
 
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.cursor_count),
+            ('next', self.cursor_next),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+    def is_cursor(self, request: Request) -> bool:
+        """
+        The keyset mode is opt-in: it is enabled by the `cursor` parameter, an empty value means the first page.
+        """
+        return self.cursor_query_param in request.query_params
+
+    def encode_cursor(self, value: Any, pk: int) -> str:
+        data = json.dumps([value, pk], cls=CursorJSONEncoder, separators=(',', ':'))
+        return urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request: Request) -> Optional[Cursor]:
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            data = urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+            value, pk = json.loads(data, object_hook=cursor_object_hook)
+            return value, int(pk)
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def init_cursor_params(self, request: Request) -> Optional[Cursor]:
+        self.cursor_mode = True
+        self.page_size = self.get_page_size(request)
+        self.request = request
+        return self.decode_cursor(request)
+
+    def cursor_filter(self, field: str, descending: bool, cursor: Cursor) -> Q:
+        # rows are ordered by the field and then by the primary key descending, nulls are the first ones
+        # in the descending order and the last ones in the ascending order, as postgres does by default
+        value, pk = cursor
+        if value is None:
+            q = Q(**{f'{field}__isnull': True, 'pk__lt': pk})
+            if descending:
+                q |= Q(**{f'{field}__isnull': False})
+            return q
+        q = Q(**{f'{field}__lt' if descending else f'{field}__gt': value}) | Q(**{field: value, 'pk__lt': pk})
+        if not descending:
+            q |= Q(**{f'{field}__isnull': True})
+        return q
+
+    def cursor_sql(self, column: str, pk_column: str, descending: bool, cursor: Cursor) -> Tuple[str, list]:
+        # the same conditions as in `cursor_filter` for raw queries
+        value, pk = cursor
+        if value is None:
+            where = f'({column} IS NULL AND {pk_column} < %s)'
+            if descending:
+                where = f'({where} OR {column} IS NOT NULL)'
+            return where, [pk]
+        where = f'{column} {"<" if descending else ">"} %s OR ({column} = %s AND {pk_column} < %s)'
+        if not descending:
+            where += f' OR {column} IS NULL'
+        return f'({where})', [value, value, pk]
+
+    def cursor_page(self, rows: list, count: int, get_value: Callable[[Any], Any]) -> list:
+        """
+        Takes `page_size + 1` rows and returns the page, the extra row shows that the next page exists.
+        """
+        self.cursor_count = count
+        self.cursor_next = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+            cursor = self.encode_cursor(get_value(rows[-1]), rows[-1].pk)
+            self.cursor_next = replace_query_param(url, self.cursor_query_param, cursor)
+        return rows
+
+    def get_cursor_ordering(self, queryset: QuerySet) -> Optional[Tuple[str, bool]]:
+        if queryset.query.values_select or queryset.query.group_by is not None:
+            return None
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        if not ordering or not isinstance(ordering[0], str) or ordering[0] == '?':
+            return None
+        field = ordering[0].lstrip('-')
+        return 'pk' if field == 'id' else field, ordering[0].startswith('-')
+
+    def paginate_cursor_queryset(
+        self, queryset: QuerySet, request: Request, count_queryset: Union[QuerySet, int, None] = None
+    ) -> Optional[list]:
+        """
+        Returns a page in the keyset mode or None if the queryset ordering doesn't allow it.
+        """
+        ordering = self.get_cursor_ordering(queryset)
+        if not ordering:
+            return None
+        field, descending = ordering
+        cursor = self.init_cursor_params(request)
+        if count_queryset is None:
+            count_queryset = queryset
+        count = count_queryset if isinstance(count_queryset, int) else count_queryset.count()
+        field_order = F(self.cursor_annotation)
+        queryset = queryset.annotate(**{self.cursor_annotation: F(field)}).order_by(
+            field_order.desc(nulls_first=True) if descending else field_order.asc(nulls_last=True), '-pk'
+        )
+        if cursor:
+            queryset = queryset.filter(self.cursor_filter(self.cursor_annotation, descending, cursor))
+        rows = list(queryset[:self.page_size + 1])
+        return self.cursor_page(rows, count, lambda row: getattr(row, self.cursor_annotation))
+
 
 class PageNumberCountPagination(PageNumberPagination):
     count_queryset = None
@@ -45,12 +45,12 @@ from apps.merger.models import Import
 from apps.merger.profiles import psn, steam, xbox
 from apps.recommendations.models import UserRecommendation
 from apps.reviews.models import Review
-from apps.stat.models import APIUserCounter
 from apps.users import models
 from apps.users.models import UserFollowElement
 from apps.users.tasks import (
     delete_user, save_user_follow_element_last_viewed_id, save_user_follow_element_last_viewed_ids, save_user_setting,
 )
+from apps.utils import api_limits
 from apps.utils.api import filter_int_or_none, int_or_none, true
 from apps.utils.dates import split_dates
 from apps.utils.elastic import ConfigurableSearchQuerySet
@@ -1553,18 +1553,13 @@ class UserViewSet(
 
     @action(detail=True, url_path='api-requests', permission_classes=[IsAuthenticated])
     def api_requests(self, request, pk):
-        from apps.utils.middlewares import _api_counter
         user = self.get_object()
         if request.user.id != user.id:
             return Response(status=status.HTTP_403_FORBIDDEN)
         api_limit = settings.API_LIMITS[request.user.api_group] or 0
         date_from, date_to = user.api_dates
-        db = sum(
-            APIUserCounter.objects
-            .filter(user_id=user.id, date__gte=date_from)
-            .values_list('count', flat=True)
-        )
-        memory = _api_counter.get(user.id, 0)
+        db = api_limits.limiter.used_db(user.id, date_from)
+        memory = api_limits.limiter.pending(user.id)
         return Response(
             {
                 'count': api_limit - db,
@@ -1,5 +1,6 @@
 import reversion
 from django.conf import settings
+from django.db.models import QuerySet
 from django.http import Http404
 from django.utils import translation
 from django.utils.decorators import method_decorator
@@ -53,9 +54,16 @@ class PaginateDetailRouteMixin:
 
     def get_paginated_detail_response(self, queryset, serializer_class=None, serializer_kwargs=None,
                                       count_queryset=None):
-        if count_queryset is not None:
+        page = None
+        if (
+            isinstance(queryset, QuerySet)
+            and getattr(self.paginator, 'is_cursor', None)
+            and self.paginator.is_cursor(self.request)
+        ):
+            page = self.paginator.paginate_cursor_queryset(queryset, self.request, count_queryset)
+        if page is None and count_queryset is not None:
             page = self.paginator.paginate_count_queryset(queryset, count_queryset, self.request, view=self)
-        else:
+        elif page is None:
             page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_paginated_detail_serializer(page, serializer_class, serializer_kwargs)
@@ -3,7 +3,7 @@ from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
 from apps.achievements import models
-from apps.games.tasks import update_game_totals
+from apps.games.tasks import denormalize_game
 # from apps.token.models import CycleKarma
 # from apps.token.tasks import achievements_to_active_cycle
 from apps.utils.tasks import detect_language
@@ -31,7 +31,7 @@ def parent_achievement_post_save(sender, instance, created, **kwargs):
                 instance.id, instance._meta.app_label, instance._meta.model_name,
             )
         if created:
-            update_game_totals.delay(instance.game_id, 'achievements')
+            denormalize_game(instance.game_id, totals=['achievements'])
     transaction.on_commit(on_commit)
     # if created:
     #     transaction.on_commit(lambda: update_game_totals.delay(instance.game_id, 'achievements'))
@@ -51,7 +51,7 @@ def parent_achievement_post_save(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=models.ParentAchievement)
 def parent_achievement_post_delete(instance, **kwargs):
-    transaction.on_commit(lambda: update_game_totals.delay(instance.game_id, 'achievements'))
+    transaction.on_commit(lambda: denormalize_game(instance.game_id, totals=['achievements']))
 
 
 # @receiver(post_save, sender=models.UserAchievement)
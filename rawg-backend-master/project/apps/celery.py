@@ -130,6 +130,16 @@ if settings.MERGER_CHECK_TOKENS:
         'schedule': crontab(minute='*/5'),
     }
 
+schedule['stat-dump-api'] = {
+    'task': 'apps.stat.tasks.dump_api_stat',
+    'schedule': crontab(minute='*'),
+}
+
+schedule['utils-flush-counters'] = {
+    'task': 'apps.utils.tasks.flush_counters',
+    'schedule': crontab(minute='*'),
+}
+
 if settings.WARM_CACHE:
     schedule['utils-warm-cache'] = {
         'task': 'apps.utils.tasks.warm_cache',
@@ -204,9 +214,11 @@ app.conf.task_routes = {
     'apps.files.tasks.update_games_counters': 'denormalize',
     # - rebuild_games_added, rebuild_games_counts, rebuild_games_items, rebuild_games_json
     'apps.games.tasks.update_game': 'denormalize',
+    'apps.games.tasks.update_games': 'denormalize',
     'apps.games.tasks.update_game_totals': 'denormalize',
     'apps.games.tasks.update_game_item': 'denormalize',
     'apps.games.tasks.update_game_json_field': 'denormalize',
+    'apps.games.tasks.update_game_denormalized': 'denormalize',
     # - rebuild_collections
     'apps.games.tasks.update_collection': 'denormalize',
     'apps.games.tasks.update_likes_totals': 'denormalize',
@@ -223,6 +235,7 @@ app.conf.task_routes = {
     'apps.common.tasks.*': 'stat',
     'apps.merger.tasks.ga_import': 'stat',
     'apps.stat.tasks.*': 'stat',
+    'apps.utils.tasks.flush_counters': 'stat',
     'apps.users.tasks.update_last_entered': 'stat',
     'apps.users.tasks.ga_auth_signup': 'stat',
     'apps.users.tasks.ga_auth_login': 'stat',
@@ -7,14 +7,19 @@ from apps.utils.dates import monday
 
 class Command(BaseCommand):
     help = 'Update the charts'
+    charts = (
+        models.GameFull,
+        models.GameYear,
+        models.GameToPlay,
+        models.GameUpcoming,
+        models.GameGenre,
+        models.GameReleased,
+        models.GameCreditPerson,
+    )
 
     def handle(self, *args, **options):
+        # only the newest week is calculated, the previous weeks are kept as they are
         week = monday(now())
-        models.GameFull.calculate_and_write(week, save_game=True)
-        models.GameYear.calculate_and_write(week, save_game=True)
-        models.GameToPlay.calculate_and_write(week, save_game=True)
-        models.GameUpcoming.calculate_and_write(week, save_game=True)
-        models.GameGenre.calculate_and_write(week, save_game=True)
-        models.GameReleased.calculate_and_write(week, save_game=True)
-        models.GameCreditPerson.calculate_and_write(week, save_game=True)
+        for model in self.charts:
+            model.calculate_and_write(week, save_game=True)
         self.stdout.write(self.style.SUCCESS('OK'))
@@ -1,9 +1,10 @@
-import operator
+import json
 from datetime import timedelta
 
-from django.db import IntegrityError, models, transaction
-from django.db.models import Count
-from django.db.models.functions import ExtractYear
+import numpy as np
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
+from django.db.models.functions import ExtractYear, Greatest, Trunc
 from django.utils.timezone import now
 from psycopg2 import errorcodes
 
@@ -12,34 +13,130 @@ from apps.games.models import Game, Genre
 from apps.reviews.models import Review
 from apps.users.models import UserGame
 from apps.utils.dates import monday
+from apps.utils.list import split
 
 
 class ChartMixin(object):
     chart_name = 'full'
+    group_column = None
 
     @classmethod
-    def calculate_qs(cls, week, limit_date=False):
-        qs = UserGame.objects.visible()
-        if limit_date:
-            qs = qs.filter(added__lt=week)
-        return qs
+    def chart_qs(cls, **kwargs):
+        # the records of the chart with the date limiting the weeks, the annotated group is ranked separately
+        return UserGame.objects.visible().annotate(date=F('added'))
+
+    @classmethod
+    def chart_aggregates(cls):
+        return {'count': Count('id')}
+
+    @classmethod
+    def chart_values(cls, week=None, weekly=False, **kwargs):
+        # one grouped query for all the groups and weeks of the chart
+        qs = cls.chart_qs(**kwargs)
+        if week:
+            qs = qs.filter(date__lt=week)
+        fields = ['game_id']
+        if 'group' in qs.query.annotations:
+            fields.append('group')
+        if weekly:
+            qs = qs.annotate(week=Trunc('date', 'week'))
+            fields.append('week')
+        aggregates = list(cls.chart_aggregates())
+        rows = qs.values_list(*fields).annotate(**cls.chart_aggregates()) \
+            .values_list(*fields, *aggregates).order_by()
+        columns = dict(zip(fields + aggregates, zip(*rows))) if rows else {}
+        values = {
+            name: np.array(columns.get(name, ()), dtype=np.int64)
+            for name in ['game_id', 'group'] + aggregates if name in fields + aggregates
+        }
+        values['game'] = values.pop('game_id')
+        if 'group' not in values:
+            values['group'] = np.zeros(len(values['game']), dtype=np.int64)
+        if weekly:
+            values['week'] = np.array([date.timestamp() for date in columns.get('week', ())], dtype=np.float64)
+        return values
+
+    @classmethod
+    def chart_scores(cls, totals):
+        return totals['count'], totals['count']
+
+    @classmethod
+    def chart_mask(cls, group, week):
+        return None
+
+    @classmethod
+    def rank(cls, game, group, totals, week):
+        # positions inside every group: by score descending, then by game id descending
+        score, count = cls.chart_scores(totals)
+        mask = totals['count'] > 0
+        week_mask = cls.chart_mask(group, week)
+        if week_mask is not None:
+            mask &= week_mask
+        game, group, score, count = game[mask], group[mask], score[mask], count[mask]
+        order = np.lexsort((-game, -score, group))
+        game, group, count = game[order], group[order], count[order]
+        position = np.arange(len(game)) - np.searchsorted(group, group)
+        return game, group, position, count
 
     @classmethod
     def calculate(cls, week, limit_date=False, **kwargs):
-        return cls.calculate_qs(week, limit_date).values_list('game_id').annotate(count=Count('game_id')) \
-            .values_list('game_id', 'count').order_by('-count', '-game_id')
+        values = cls.chart_values(week if limit_date else None, **kwargs)
+        return cls.rank(values['game'], values['group'], values, week)
+
+    @classmethod
+    def create_objects(cls, objects):
+        cls.objects.bulk_create(objects, batch_size=10000)
+
+    @classmethod
+    def chart_data(cls, game, group, position):
+        return dict(zip(game.tolist(), position.tolist()))
+
+    @classmethod
+    def old_charts(cls, game_ids):
+        result = {}
+        for ids in split(game_ids, 10000):
+            for game_id, charts in Game.objects.filter(id__in=ids).values_list('id', 'charts'):
+                result[game_id] = (charts or {}).get(cls.chart_name)
+        return result
+
+    @staticmethod
+    def change(old_position, position):
+        if old_position is None:
+            return 'new'
+        if position < old_position:
+            return 'up'
+        if position > old_position:
+            return 'down'
+        return 'equal'
 
     @classmethod
-    def write(cls, game_count, week, save_game=True):
+    def save_charts(cls, data):
+        # one statement merges the chart into the charts of every game, the other charts are not touched
+        if not data:
+            return
+        with connection.cursor() as cursor:
+            sql = '''
+                update games_game
+                set charts = coalesce(games_game.charts, '{}'::jsonb) || jsonb_build_object(%s::text, data.value)
+                from jsonb_each(%s::jsonb) as data
+                where games_game.id = data.key::integer
+            '''
+            cursor.execute(sql, [cls.chart_name, json.dumps(data)])
+
+    @classmethod
+    def write(cls, chart, week, save_game=True):
+        game, group, position, count = chart
         objects = []
-        for position, (game_id, count) in enumerate(game_count):
-            objects.append(cls(game_id=game_id, position=position, count=count, week=week))
-            if save_game:
-                with transaction.atomic():
-                    charts = Game.objects.values_list('charts', flat=True).get(id=game_id) or {}
-                    charts[cls.chart_name] = position
-                    Game.objects.filter(id=game_id).update(charts=charts)
-        cls.objects.bulk_create(objects)
+        for game_id, group_id, game_position, game_count in zip(
+            game.tolist(), group.tolist(), position.tolist(), count.tolist()
+        ):
+            obj = cls(game_id=game_id, position=game_position, count=game_count, week=week)
+            if cls.group_column:
+                setattr(obj, cls.group_column, group_id)
+            objects.append(obj)
+        cls.create_objects(objects)
+        if save_game:
+            cls.save_charts(cls.chart_data(game, group, position))
         return len(objects)
 
     @classmethod
@@ -49,18 +146,50 @@ class ChartMixin(object):
         return cls.write(cls.calculate(week, limit_date, **kwargs), week, save_game)
 
     @classmethod
-    def rebuild(cls, *args, **kwargs):
+    def rebuild(cls, *args, save_previous=True, **kwargs):
         cls.objects.filter(**kwargs).delete()
         delta = timedelta(days=7)
         try:
             start = monday(UserGame.objects.values_list('created', flat=True).earliest('created'))
         except UserGame.DoesNotExist:
-            return
+            return 0
+        values = cls.chart_values(weekly=True, **kwargs)
+        pairs, pair_index = np.unique(
+            np.stack([values['group'], values['game']], axis=1), axis=0, return_inverse=True
+        )
+        pair_index = pair_index.reshape(-1)
+        order = np.argsort(values['week'], kind='stable')
+        weeks = values['week'][order]
+        totals = {name: np.zeros(len(pairs), dtype=values[name].dtype) for name in cls.chart_aggregates()}
+        records = 0
+        added = 0
+        # the weeks of the records are summed up one by one, every week counts the records before its monday
         while start <= now():
             last = start + delta > now()
             prev_last = start + delta + delta > now()
-            cls.calculate_and_write(start, True, last or prev_last, **kwargs)
+            end = np.searchsorted(weeks, start.timestamp(), 'left')
+            for name, total in totals.items():
+                np.add.at(total, pair_index[order[added:end]], values[name][order[added:end]])
+            added = end
+            chart = cls.rank(pairs[:, 1], pairs[:, 0], totals, start)
+            records += cls.write(chart, start, last or (save_previous and prev_last))
             start += delta
+        return records
+
+
+class GroupChartMixin(ChartMixin):
+    @classmethod
+    def chart_data(cls, game, group, position):
+        old = cls.old_charts(game.tolist())
+        data = {}
+        for game_id, group_id, game_position in zip(game.tolist(), group.tolist(), position.tolist()):
+            if game_id not in data:
+                data[game_id] = dict(old.get(game_id) or {})
+            group_id = str(group_id)
+            old_position = data[game_id].get(group_id)
+            change = cls.change(old_position[0] if old_position else None, game_position)
+            data[game_id][group_id] = [game_position, change]
+        return data
 
 
 class GameFull(ChartMixin, models.Model):
@@ -69,6 +198,7 @@ class GameFull(ChartMixin, models.Model):
     position = models.PositiveIntegerField()
     count = models.PositiveIntegerField()
     week = models.DateTimeField()
+    rating_map = {1: 1, 3: 2, 4: 3, 5: 4}
 
     def __str__(self):
         return str(self.id)
@@ -78,44 +208,34 @@ class GameFull(ChartMixin, models.Model):
         verbose_name_plural = 'Games full'
 
     @classmethod
-    def calculate_qs(self, week, limit_date=False):
-        qs = Review.objects.visible()
-        if limit_date:
-            qs = qs.filter(created__lt=week, edited__lt=week)
-        return qs
+    def chart_qs(cls, **kwargs):
+        # the games with parents are counted in the average rating but are not ranked
+        return Review.objects.visible().annotate(
+            date=Greatest('created', 'edited'),
+            group=Case(When(game__parents_count__gt=0, then=Value(1)), default=Value(0), output_field=IntegerField()),
+        )
 
     @classmethod
-    def calculate(self, week, limit_date=False, **kwargs):
-        reviews_qs = self.calculate_qs(week, limit_date)
-        rating_map = {1: 1, 3: 2, 4: 3, 5: 4}
-
-        avg_set = reviews_qs.values_list('rating', flat=True)
-
-        if not avg_set:
-            avg = 0
-        else:
-            avg = sum([rating_map[i] for i in avg_set]) / len(avg_set)
+    def chart_aggregates(cls):
+        return {
+            'count': Count('id'),
+            'rating': Sum(Case(
+                *[When(rating=rating, then=Value(value)) for rating, value in cls.rating_map.items()],
+                output_field=IntegerField()
+            )),
+        }
 
-        games_qs = reviews_qs.values('game_id') \
-            .exclude(game__parents_count__gt=0) \
-            .annotate(Count('rating')) \
-            .order_by('-rating__count')
-
-        games = []
-        for game in games_qs.iterator():
-            game_reviews = reviews_qs.filter(game_id=game['game_id']).values_list('rating', flat=True)
-            game_rating = sum([rating_map[i] for i in game_reviews]) / len(game_reviews)
-
-            weighted_rating = (
-                (float(game['rating__count'] / (game['rating__count'] + Game.RATING_TRESHOLD)) * float(
-                    game_rating))
-                + (float(Game.RATING_TRESHOLD / (game['rating__count'] + Game.RATING_TRESHOLD)) * float(avg))
-            )
-            games.append(((game['game_id']), (weighted_rating * 100000)))
-
-        games.sort(key=operator.itemgetter(1), reverse=True)
+    @classmethod
+    def chart_scores(cls, totals):
+        count, rating = totals['count'], totals['rating']
+        reviews = count.sum()
+        avg = rating.sum() / reviews if reviews else 0
+        weighted_rating = (rating + Game.RATING_TRESHOLD * avg) / (count + Game.RATING_TRESHOLD) * 100000
+        return weighted_rating, weighted_rating.astype(np.int64)
 
-        return games
+    @classmethod
+    def chart_mask(cls, group, week):
+        return group == 0
 
 
 class GameYear(ChartMixin, models.Model):
@@ -127,11 +247,12 @@ class GameYear(ChartMixin, models.Model):
     chart_name = 'year'
 
     @classmethod
-    def calculate_qs(cls, week, limit_date=False):
-        qs = UserGame.objects.visible().filter(game__released__year=week.year)
-        if limit_date:
-            qs = qs.filter(added__lt=week)
-        return qs
+    def chart_qs(cls, **kwargs):
+        return super().chart_qs(**kwargs).annotate(group=ExtractYear('game__released'))
+
+    @classmethod
+    def chart_mask(cls, group, week):
+        return group == week.year
 
     def __str__(self):
         return str(self.id)
@@ -150,11 +271,8 @@ class GameToPlay(ChartMixin, models.Model):
     chart_name = 'toplay'
 
     @classmethod
-    def calculate_qs(cls, week, limit_date=False):
-        qs = UserGame.objects.visible().filter(status=UserGame.STATUS_TOPLAY)
-        if limit_date:
-            qs = qs.filter(added__lt=week)
-        return qs
+    def chart_qs(cls, **kwargs):
+        return super().chart_qs(**kwargs).filter(status=UserGame.STATUS_TOPLAY)
 
     def __str__(self):
         return str(self.id)
@@ -173,11 +291,8 @@ class GameUpcoming(ChartMixin, models.Model):
     chart_name = 'upcoming'
 
     @classmethod
-    def calculate_qs(cls, week, limit_date=False):
-        qs = UserGame.objects.visible().filter(status=UserGame.STATUS_TOPLAY, game__released__gte=now())
-        if limit_date:
-            qs = qs.filter(added__lt=week)
-        return qs
+    def chart_qs(cls, **kwargs):
+        return super().chart_qs(**kwargs).filter(status=UserGame.STATUS_TOPLAY, game__released__gte=now())
 
     def __str__(self):
         return str(self.id)
@@ -187,7 +302,7 @@ class GameUpcoming(ChartMixin, models.Model):
         verbose_name_plural = 'Games upcoming'
 
 
-class GameGenre(ChartMixin, models.Model):
+class GameGenre(GroupChartMixin, models.Model):
     id = models.BigAutoField(primary_key=True)
     game = models.ForeignKey(Game, models.CASCADE)
     position = models.PositiveIntegerField()
@@ -195,48 +310,12 @@ class GameGenre(ChartMixin, models.Model):
     week = models.DateTimeField()
     genre = models.ForeignKey(Genre, models.CASCADE)
     chart_name = 'genre'
+    group_column = 'genre_id'
 
     @classmethod
-    def calculate_genre_qs(cls, genre_id, week, limit_date=False):
-        qs = UserGame.objects.visible().filter(game__genres__in=[genre_id])
-        if limit_date:
-            qs = qs.filter(added__lt=week)
-        return qs
-
-    @classmethod
-    def calculate(cls, week, limit_date=False, **kwargs):
-        result = {}
-        for genre_id in Genre.objects.visible().values_list('id', flat=True):
-            result[genre_id] = cls.calculate_genre_qs(genre_id, week, limit_date).values_list('game_id') \
-                .annotate(count=Count('game_id')).values_list('game_id', 'count').order_by('-count', '-game_id')
-        return result
-
-    @classmethod
-    def write(cls, genre_game_count, week, save_game=True):
-        objects = []
-        for genre_id, game_count in genre_game_count.items():
-            for position, (game_id, count) in enumerate(game_count):
-                objects.append(cls(game_id=game_id, position=position, count=count, week=week, genre_id=genre_id))
-                if save_game:
-                    charts = Game.objects.values_list('charts', flat=True).get(id=game_id)
-                    if not charts:
-                        charts = {}
-                    if not charts.get(cls.chart_name):
-                        charts[cls.chart_name] = {}
-                    change = 'new'
-                    genre_id = str(genre_id)
-                    old_position = charts[cls.chart_name].get(genre_id)
-                    if old_position:
-                        if position < old_position[0]:
-                            change = 'up'
-                        elif position > old_position[0]:
-                            change = 'down'
-                        else:
-                            change = 'equal'
-                    charts[cls.chart_name][genre_id] = [position, change]
-                    Game.objects.filter(id=game_id).update(charts=charts)
-        cls.objects.bulk_create(objects)
-        return len(objects)
+    def chart_qs(cls, **kwargs):
+        return super().chart_qs(**kwargs).annotate(group=F('game__genres')) \
+            .filter(group__in=Genre.objects.visible().values('id'))
 
     def __str__(self):
         return str(self.id)
@@ -254,46 +333,24 @@ class GameReleased(ChartMixin, models.Model):
     week = models.DateTimeField()
     released = models.PositiveIntegerField()
     chart_name = 'released'
+    group_column = 'released'
 
     @classmethod
-    def calculate_released_qs(cls, released, week, limit_date=False):
-        qs = UserGame.objects.visible().filter(game__released__year=released)
-        if limit_date:
-            qs = qs.filter(added__lt=week)
-        return qs
+    def chart_qs(cls, **kwargs):
+        return super().chart_qs(**kwargs).filter(game__released__isnull=False) \
+            .annotate(group=ExtractYear('game__released'))
 
     @classmethod
-    def calculate(cls, week, limit_date=False, **kwargs):
-        result = {}
-        for year in UserGame.objects.visible().annotate(year=ExtractYear('game__released')).values('year') \
-                .annotate(c=Count('id')).values_list('year', flat=True):
-            result[year] = cls.calculate_released_qs(year, week, limit_date).values_list('game_id') \
-                .annotate(count=Count('game_id')).values_list('game_id', 'count').order_by('-count', '-game_id')
-        return result
-
-    @classmethod
-    def write(cls, released_game_count, week, save_game=True):
-        objects = []
-        for year, game_count in released_game_count.items():
-            for position, (game_id, count) in enumerate(game_count):
-                objects.append(cls(game_id=game_id, position=position, count=count, week=week, released=year))
-                if save_game:
-                    charts = Game.objects.values_list('charts', flat=True).get(id=game_id)
-                    if not charts:
-                        charts = {}
-                    change = 'new'
-                    old_position = charts.get(cls.chart_name)
-                    if old_position and old_position['year'] == year:
-                        if position < old_position['position']:
-                            change = 'up'
-                        elif position > old_position['position']:
-                            change = 'down'
-                        else:
-                            change = 'equal'
-                    charts[cls.chart_name] = {'position': position, 'change': change, 'year': year}
-                    Game.objects.filter(id=game_id).update(charts=charts)
-        cls.objects.bulk_create(objects)
-        return len(objects)
+    def chart_data(cls, game, group, position):
+        old = cls.old_charts(game.tolist())
+        data = {}
+        for game_id, year, game_position in zip(game.tolist(), group.tolist(), position.tolist()):
+            old_position = old.get(game_id)
+            if not old_position or old_position.get('year') != year:
+                old_position = {'position': None}
+            change = cls.change(old_position['position'], game_position)
+            data[game_id] = {'position': game_position, 'change': change, 'year': year}
+        return data
 
     def __str__(self):
         return str(self.id)
@@ -303,7 +360,7 @@ class GameReleased(ChartMixin, models.Model):
         verbose_name_plural = 'Games released'
 
 
-class GameCreditPerson(ChartMixin, models.Model):
+class GameCreditPerson(GroupChartMixin, models.Model):
     id = models.BigAutoField(primary_key=True)
     game = models.ForeignKey(Game, models.CASCADE)
     position = models.PositiveIntegerField()
@@ -311,58 +368,31 @@ class GameCreditPerson(ChartMixin, models.Model):
     week = models.DateTimeField()
     person = models.ForeignKey(Person, models.CASCADE)
     chart_name = 'person'
+    group_column = 'person_id'
 
     @classmethod
-    def calculate_person_qs(cls, person_id, week, limit_date=False):
-        qs = UserGame.objects.visible().filter(game__gameperson__person_id__in=[person_id])
-        if limit_date:
-            qs = qs.filter(added__lt=week)
-        return qs.values_list('game_id') \
-            .annotate(count=Count('game_id')) \
-            .values_list('game_id', 'count') \
-            .order_by('-count', '-game_id')
-
-    @classmethod
-    def calculate(cls, week, limit_date=False, **kwargs):
-        result = {}
-        qs = Person.objects.values_list('id', flat=True).order_by('-games_count')
+    def chart_qs(cls, **kwargs):
+        qs = super().chart_qs(**kwargs).annotate(group=F('game__gameperson__person_id')).filter(group__isnull=False)
         if kwargs.get('person_id'):
-            qs = qs.filter(id=kwargs['person_id'])
-        for person_id in qs:
-            result[person_id] = cls.calculate_person_qs(person_id, week, limit_date)
-        return result
+            qs = qs.filter(group=kwargs['person_id'])
+        return qs
 
     @classmethod
-    def write(cls, person_game_count, week, save_game=True):
-        objects = []
-        for person_id, game_count in person_game_count.items():
-            for position, (game_id, count) in enumerate(game_count):
-                objects.append(cls(game_id=game_id, position=position, count=count, week=week, person_id=person_id))
-                if save_game:
-                    charts = Game.objects.values_list('charts', flat=True).get(id=game_id)
-                    if not charts:
-                        charts = {}
-                    if not charts.get(cls.chart_name):
-                        charts[cls.chart_name] = {}
-                    change = 'new'
-                    person_id = str(person_id)
-                    old_position = charts[cls.chart_name].get(person_id)
-                    if old_position:
-                        if position < old_position[0]:
-                            change = 'up'
-                        elif position > old_position[0]:
-                            change = 'down'
-                        else:
-                            change = 'equal'
-                    charts[cls.chart_name][person_id] = [position, change]
-                    Game.objects.filter(id=game_id).update(charts=charts)
-        for obj in objects:
-            try:
-                obj.save()
-            except IntegrityError as e:
-                if e.__cause__.pgcode != errorcodes.FOREIGN_KEY_VIOLATION:
-                    raise
-        return len(objects)
+    def create_objects(cls, objects):
+        try:
+            with transaction.atomic():
+                super().create_objects(objects)
+        except IntegrityError as e:
+            if e.__cause__.pgcode != errorcodes.FOREIGN_KEY_VIOLATION:
+                raise
+            # a person was deleted during the calculation
+            for obj in objects:
+                try:
+                    with transaction.atomic():
+                        obj.save()
+                except IntegrityError as error:
+                    if error.__cause__.pgcode != errorcodes.FOREIGN_KEY_VIOLATION:
+                        raise
 
     def __str__(self):
         return str(self.id)
@@ -5,6 +5,7 @@ from apps.utils.cache import Job
 
 class CommonContentType(Job):
     lifetime = 60 * 60 * 24
+    local_lifetime = 60 * 60
     is_warm = False
 
     def get(self, model):
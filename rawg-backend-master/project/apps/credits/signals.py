@@ -3,7 +3,7 @@ from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from apps.credits import models, tasks
-from apps.games.tasks import update_game_totals
+from apps.games.tasks import denormalize_game
 
 
 @receiver(post_save, sender=models.Person)
@@ -24,9 +24,9 @@ def game_person_post_save(sender, instance, created, **kwargs):
                 tasks.update_person.delay(instance.person_id)
         if instance.is_init_was_changed(('game_id', 'hidden'), created):
             if instance.initial_game_id:
-                update_game_totals.delay(instance.initial_game_id, 'persons')
+                denormalize_game(instance.initial_game_id, totals=['persons'])
             if instance.game_id != instance.initial_game_id:
-                update_game_totals.delay(instance.game_id, 'persons')
+                denormalize_game(instance.game_id, totals=['persons'])
     transaction.on_commit(on_commit)
 
 
@@ -34,5 +34,5 @@ def game_person_post_save(sender, instance, created, **kwargs):
 def game_person_post_delete(instance, **kwargs):
     def on_commit():
         tasks.update_person.delay(instance.person_id)
-        update_game_totals.delay(instance.game_id, 'persons')
+        denormalize_game(instance.game_id, totals=['persons'])
     transaction.on_commit(on_commit)
@@ -8,6 +8,7 @@ from django.utils.timezone import now
 
 from apps.common.cache import CommonContentType
 from apps.feed.models import Feed, FeedQueue, UserFeed, UserNotifyFeed
+from apps.feed.timeline import timeline
 from apps.games.models import PlatformParent
 from apps.reviews.models import Review
 from apps.users.models import UserFollowElement, UserGame
@@ -25,19 +26,19 @@ deletion_lock = '{}.lock'.format(deletion)
 
 
 def addition_lock_user(ins, ob):
-    user_lock_id.format(ob.user_id)
+    return user_lock_id.format(ob.user_id)
 
 
 def deletion_lock_user(ins, ob):
-    user_lock_id.format(ins.data['user'])
+    return user_lock_id.format(ins.data['user'])
 
 
 def addition_lock_collection(ins, ob):
-    collection_lock_id.format(ob.collection_id)
+    return collection_lock_id.format(ob.collection_id)
 
 
 def deletion_lock_collection(ins, ob):
-    collection_lock_id.format(ins.data['collection'])
+    return collection_lock_id.format(ins.data['collection'])
 
 
 params = {
@@ -142,7 +143,31 @@ params = {
 }
 
 
-def process_queue(instance, process_num):
+def get_group(instance):
+    name = '{}.{}'.format(instance.content_type.app_label, instance.content_type.model)
+    group = params.get(name) or {}
+    action = group.get(instance.action)
+    group_name = getattr(instance.content_type.model_class(), 'group_name', None)
+    if not action and group_name:
+        name = '{}^{}'.format(instance.content_type.app_label, group_name)
+        group = params.get(name) or {}
+    return group
+
+
+def get_lock_id(instance):
+    if instance.action == FeedQueue.LANGUAGE:
+        return None
+    group = get_group(instance)
+    lock = group.get(addition_lock if instance.action == addition else deletion_lock)
+    if not lock or not group.get(instance.action):
+        return None
+    content_object = instance.content_object
+    if instance.action == addition and not content_object:
+        return None
+    return lock(instance, content_object)
+
+
+def process_queue(instance, process_num, commit=True):
     delete = False
     status = FeedQueue.FINISHED
     with transaction.atomic():
@@ -151,14 +176,8 @@ def process_queue(instance, process_num):
             if not Feed.objects.filter(**instance.data).update(language=language):
                 status = FeedQueue.EMPTY
         else:
-            name = '{}.{}'.format(instance.content_type.app_label, instance.content_type.model)
-            group = params.get(name) or {}
+            group = get_group(instance)
             action = group.get(instance.action)
-            group_name = getattr(instance.content_type.model_class(), 'group_name', None)
-            if not action and group_name:
-                name = '{}^{}'.format(instance.content_type.app_label, group_name)
-                group = params.get(name) or {}
-                action = group.get(instance.action)
             if action:
                 if instance.action == addition:
                     if not instance.content_object:
@@ -173,7 +192,8 @@ def process_queue(instance, process_num):
                 else:
                     status = process_action(instance, action, group.get(deletion_lock), process_num)
         if delete:
-            instance.delete()
+            if commit:
+                instance.delete()
             return False
         instance.status = status
         update_fields = ['status']
@@ -181,7 +201,8 @@ def process_queue(instance, process_num):
             instance.retries += 1
             instance.execute = now() + timedelta(seconds=instance.retries * 2)
             update_fields += ['retries', 'execute']
-        instance.save(update_fields=update_fields)
+        if commit:
+            instance.save(update_fields=update_fields)
         return True
 
 
@@ -779,6 +800,13 @@ def _offer(game_id, user_id, feed_fn):
     UserFeed.objects.create_user_feed(user_id, feed, UserFeed.SOURCES_RECOMMEND)
 
 
+def delete_feeds(feeds):
+    # the user feeds are deleted by the fast cascade without the signals, so the timelines are changed by their keys
+    if timeline.enabled:
+        timeline.changed(UserFeed.objects.filter(feed__in=feeds).values_list('user_id', 'feed_id'))
+    feeds.delete()
+
+
 def popular_games(data=None):
     queue = None
     if data:
@@ -802,10 +830,10 @@ def popular_games(data=None):
     for platform in platforms:
         if not platform['game_ids']:
             continue
-        Feed.objects.filter(
+        delete_feeds(Feed.objects.filter(
             action=Feed.ACTIONS_POPULAR_GAMES,
             data__platform__id=platform['platform'].id
-        ).delete()
+        ))
         feed = Feed.objects.create_popular_games(
             platform['game_ids'],
             platform['games_count'],
@@ -822,6 +850,7 @@ def popular_games(data=None):
                 user_id, feed.id, '{{{}}}'.format(UserFeed.SOURCES_RECOMMEND), True, queue.created.isoformat(), False
             ])
         copy_from(UserFeed, ['user_id', 'feed_id', 'sources', 'new', 'created', 'hidden'], records)
+        timeline.changed((user_id, feed.id) for user_id in platform['user_ids'])
 
 
 def most_rated_games(data=None):
@@ -840,7 +869,7 @@ def most_rated_games(data=None):
         queue.created = end
     if not game_ids:
         return
-    Feed.objects.filter(action=Feed.ACTIONS_MOST_RATED_GAMES).delete()
+    delete_feeds(Feed.objects.filter(action=Feed.ACTIONS_MOST_RATED_GAMES))
     feed = Feed.objects.create_most_rated_games(game_ids, games_count, users_count, queue)
     if user_ids:
         for user_id in user_ids:
@@ -1,4 +1,6 @@
 import signal
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
 from time import sleep
 
 from django.conf import settings
@@ -6,7 +8,7 @@ from django.core.management.base import BaseCommand
 from django.db import connections
 from django.utils.timezone import now
 
-from apps.feed.feed import process_queue
+from apps.feed.feed import get_lock_id, process_queue
 from apps.feed.models import FeedQueue
 from apps.utils.exceptions import capture_exception
 
@@ -15,14 +17,20 @@ class Command(BaseCommand):
     is_sync = False
     is_exit = False
     pause = 10
+    pause_min = 0.5
+    idle = 0
     iterations = 0
     process_num = 0
     processes = 0
+    batch = 0
+    workers = 1
     old = False
 
     def add_arguments(self, parser):
         parser.add_argument('-n', '--num', action='store', dest='num', default=0, type=int)
         parser.add_argument('-l', '--len', action='store', dest='len', default=1, type=int)
+        parser.add_argument('-b', '--batch', action='store', dest='batch', default=0, type=int)
+        parser.add_argument('-w', '--workers', action='store', dest='workers', default=4, type=int)
         parser.add_argument('--old', action='store_true', dest='old', default=False)
 
     def handle(self, *args, **options):
@@ -31,21 +39,25 @@ class Command(BaseCommand):
 
         self.process_num = options['num']
         self.processes = options['len']
+        self.batch = options['batch']
+        self.workers = max(options['workers'], 1)
         self.old = options['old']
 
         self.stdout.write(self.style.SUCCESS('Process {} | Hello!'.format(self.process_num)))
 
         while not self.is_exit:
             try:
-                result = self.process()
+                result = self.process_batch() if self.batch else self.process()
                 self.iterations += 1
                 if settings.ENVIRONMENT == 'TESTS' and self.iterations == 2:
                     break
-                if not result and settings.ENVIRONMENT != 'TESTS':
+                if result:
+                    self.idle = 0
+                elif settings.ENVIRONMENT != 'TESTS':
                     if self.old:
                         break
                     connections.close_all()
-                    sleep(self.pause)
+                    sleep(self.backoff())
                 if settings.DEBUG:
                     self.stdout.write(self.style.SUCCESS('Process {} | Tick!'.format(self.process_num)))
             except KeyboardInterrupt:
@@ -53,6 +65,12 @@ class Command(BaseCommand):
 
         self.exit()
 
+    def backoff(self):
+        # the pause grows from pause_min up to pause while the queue stays empty
+        pause = min(self.pause_min * 2 ** self.idle, self.pause)
+        self.idle += 1
+        return pause
+
     def exit_handler(self, *args, **kwargs):
         self.is_exit = True
 
@@ -89,3 +107,58 @@ class Command(BaseCommand):
             self.stdout.write(style(message.format(now(), text)))
             return True
         return False
+
+    def process_batch(self):
+        instances = FeedQueue.claim(self.processes, self.process_num, self.batch, self.old)
+        if not instances:
+            return False
+
+        # items with the same lock are processed one after another by the same worker,
+        # so they don't delay each other
+        buckets = defaultdict(list)
+        for instance in instances:
+            lock_id = get_lock_id(instance)
+            buckets[hash(lock_id) if lock_id else instance.id].append(instance)
+        chunks = defaultdict(list)
+        for key, bucket in buckets.items():
+            chunks[key % self.workers].extend(bucket)
+
+        started = now()
+        with ThreadPool(min(self.workers, len(chunks))) as pool:
+            results = pool.map(self.process_chunk, chunks.values())
+
+        updated = []
+        deleted_ids = []
+        for chunk_updated, chunk_deleted_ids in results:
+            updated += chunk_updated
+            deleted_ids += chunk_deleted_ids
+        FeedQueue.save_claimed(updated, deleted_ids)
+
+        message = '{:%Y-%m-%d %H:%M:%S} | Process {} | Batch of {} items is finished - {} sec'
+        self.stdout.write(self.style.SUCCESS(
+            message.format(now(), self.process_num, len(instances), (now() - started).seconds)
+        ))
+        return True
+
+    def process_chunk(self, instances):
+        updated = []
+        deleted_ids = []
+        try:
+            for instance in instances:
+                started = now()
+                try:
+                    delete = not process_queue(instance, self.process_num, commit=False)
+                except Exception as e:
+                    capture_exception(e, raise_on_tests=False)
+                    instance.status = FeedQueue.ERROR
+                    updated.append(instance)
+                    self.stdout.write(self.style.ERROR('Feed #{} - {}'.format(instance.id, e)))
+                    continue
+                if delete:
+                    deleted_ids.append(instance.id)
+                    continue
+                instance.duration = (now() - started).seconds
+                updated.append(instance)
+        finally:
+            connections.close_all()
+        return updated, deleted_ids
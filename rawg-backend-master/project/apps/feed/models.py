@@ -7,17 +7,17 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import ArrayField, JSONField
 from django.contrib.postgres.indexes import GinIndex
 from django.core.management import call_command
-from django.db import IntegrityError, models, transaction
-from django.db.models import ExpressionWrapper, F, IntegerField
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import ExpressionWrapper, F, IntegerField, Value
 from django.utils.timezone import now
 from ordered_model.models import OrderedModel
-from psycopg2 import errorcodes
+from psycopg2 import errorcodes, sql
 
 from apps.common.cache import CommonContentType
 from apps.feed.context import get_many_context, to_representation
 from apps.games.models import Collection
 from apps.users.models import UserFollowElement, UserGame
-from apps.utils.db import copy_from_conflict
+from apps.utils.db import ArrayRemove
 from apps.utils.fields.autoslug import CIAutoSlugField
 
 
@@ -416,27 +416,13 @@ class UserFeedManager(models.Manager):
         return self.get_queryset().prefetch_related('feed', 'feed__user')
 
     def create_from_feed(self, feed, update=False):
+        users = []
         # create events for followers of the game
         if feed.action in Feed.ACTIONS_FOR_FOLLOWERS_OF_GAME:
-            # we can do it instead
-            # `UserFeed.objects.create_user_feed(user_id, feed, self.model.SOURCES_GAME, update=update)`
-            # because we can just append the `UserFeed.SOURCES_GAME` source to this user feed
-            records = []
             qs = UserGame.objects.filter(hidden=False, game_id=feed.data['games'][0])
-            for user_id in qs.values_list('user_id', flat=True):
-                if user_id == feed.user_id:
-                    continue
-                records.append([
-                    user_id, feed.id, '{{{}}}'.format(UserFeed.SOURCES_GAME), feed.set_user_feed_as_new,
-                    feed.created.isoformat(), False
-                ])
-            if records:
-                copy_from_conflict(
-                    UserFeed, ['user_id', 'feed_id', 'sources', 'new', 'created', 'hidden'], records,
-                    "(user_id, feed_id) DO UPDATE SET sources = "
-                    "ARRAY(SELECT DISTINCT UNNEST(a.sources || EXCLUDED.sources))",
-                    'temp_user_feed_game_{}'.format(feed.id)
-                )
+            if feed.user_id:
+                qs = qs.exclude(user_id=feed.user_id)
+            users.append((UserFeed.SOURCES_GAME, qs.values_list('user_id', flat=True)))
             if not Feed.REVIEWS_DISCUSSIONS_COMMUNITY['comments'] and not Feed.REVIEWS_DISCUSSIONS_COMMUNITY['likes']:
                 # todo delete after reverting https://github.com/behindthegames/rawg/issues/499
                 from apps.reviews.models import Review
@@ -451,26 +437,31 @@ class UserFeedManager(models.Manager):
                     feed.action,
                     now(),
                 )
-        # create events for followers of the collection
-        if feed.action in Feed.ACTIONS_FOR_FOLLOWERS_OF_COLLECTION:
-            pk = feed.data['collections'][0]
-            for user_id in UserFollowElement.objects.filter(
-                object_id=pk, content_type=CommonContentType().get(Collection)
-            ).values_list('user_id', flat=True):
-                UserFeed.objects.create_user_feed(user_id, feed, UserFeed.SOURCES_COLLECTION, update=update)
-        if feed.user:
-            # create events for following users
-            for user_id in UserFollowElement.objects.filter(
-                object_id=feed.user_id, content_type=CommonContentType().get(get_user_model())
-            ).values_list('user_id', flat=True):
-                UserFeed.objects.create_user_feed(user_id, feed, update=update)
-            # create an event for a current user
-            UserFeed.objects.create_user_feed(feed.user_id, feed, update=update)
+        if feed.action not in Feed.ACTIONS_HIDDEN:
+            # create events for followers of the collection
+            if feed.action in Feed.ACTIONS_FOR_FOLLOWERS_OF_COLLECTION:
+                users.append((UserFeed.SOURCES_COLLECTION, UserFollowElement.objects.filter(
+                    object_id=feed.data['collections'][0], content_type=CommonContentType().get(Collection)
+                ).values_list('user_id', flat=True)))
+            if feed.user_id:
+                # create events for following users
+                users.append((UserFeed.SOURCES_USER, UserFollowElement.objects.filter(
+                    object_id=feed.user_id, content_type=CommonContentType().get(get_user_model())
+                ).values_list('user_id', flat=True)))
+                # create an event for a current user
+                users.append((UserFeed.SOURCES_USER, [feed.user_id]))
+        if users:
+            self.create_user_feeds(feed, users)
 
     def update_from_feed(self, feed):
+        from apps.feed.timeline import timeline
+
         self.create_from_feed(feed, feed.new_element_was_deleted)
         if feed.new_element_was_saved:
-            self.get_queryset().filter(feed=feed).update(new=feed.set_user_feed_as_new, created=feed.created)
+            qs = self.get_queryset().filter(feed=feed)
+            if timeline.enabled:
+                timeline.changed((user_id, feed.id) for user_id in qs.values_list('user_id', flat=True))
+            qs.update(new=feed.set_user_feed_as_new, created=feed.created)
 
     def create_user_feed(self, user_id, feed, source=None, update=False):
         if not source:
@@ -492,7 +483,10 @@ class UserFeedManager(models.Manager):
                 return
 
         if self.only_notify_cases(feed, user_id):
+            from apps.feed.timeline import timeline
+
             instance.delete()
+            timeline.changed([(user_id, feed.id)])
             return
 
         if source not in instance.sources:
@@ -502,24 +496,79 @@ class UserFeedManager(models.Manager):
         return instance
 
     def delete_source(self, source, **kwargs):
-        for user_feed in self.get_queryset().filter(sources__contains=[source], **kwargs):
-            user_feed.sources = [s for s in user_feed.sources if source != s]
-            if user_feed.sources:
-                user_feed.save()
+        from apps.feed.timeline import timeline
+
+        with transaction.atomic():
+            if timeline.enabled:
+                timeline.changed(
+                    self.get_queryset().filter(sources__contains=[source], **kwargs).values_list('user_id', 'feed_id')
+                )
+            # only the user feeds which have no other sources are deleted, the ones which were already
+            # without sources are left as they are
+            self.get_queryset().filter(sources__contains=[source], sources__contained_by=[source], **kwargs).delete()
+            self.get_queryset().filter(sources__contains=[source], **kwargs).update(
+                sources=ArrayRemove(F('sources'), Value(source), output_field=ArrayField(models.CharField()))
+            )
+
+    def create_user_feeds(self, feed, users):
+        # users is a list of (source, queryset or list of user ids) pairs, all of them are upserted at once
+        # and sources of existing user feeds are merged
+        from apps.feed.timeline import timeline
+
+        selects = []
+        params = []
+        for source, user_ids in users:
+            if isinstance(user_ids, models.QuerySet):
+                query, query_params = user_ids.query.sql_with_params()
+                selects.append(sql.SQL('SELECT s.user_id, %s FROM ({}) s (user_id)').format(sql.SQL(query)))
+                params += [source, *query_params]
             else:
-                user_feed.delete()
+                selects.append(sql.SQL('SELECT UNNEST(%s::integer[]), %s'))
+                params += [list(user_ids), source]
+        only_notify_user_id = self.only_notify_user_id(feed)
+        only_notify_user_ids = [only_notify_user_id] if only_notify_user_id else []
+        query = sql.SQL("""
+            WITH u (user_id, source) AS ({selects}),
+            d AS (
+                DELETE FROM {table}
+                WHERE feed_id = %s AND user_id = ANY(%s) AND user_id IN (SELECT user_id FROM u)
+            )
+            INSERT INTO {table} AS a (user_id, feed_id, sources, new, created, hidden)
+            SELECT u.user_id, %s, ARRAY_AGG(DISTINCT u.source), %s, %s, FALSE
+            FROM u
+            WHERE u.user_id IS NOT NULL AND u.user_id <> ALL(%s)
+            GROUP BY u.user_id
+            ON CONFLICT (user_id, feed_id) DO UPDATE
+            SET sources = ARRAY(SELECT DISTINCT UNNEST(a.sources || EXCLUDED.sources))
+            RETURNING a.user_id
+        """).format(
+            selects=sql.SQL(' UNION ALL ').join(selects),
+            table=sql.Identifier(self.model._meta.db_table),
+        )
+        params += [
+            feed.id, only_notify_user_ids,
+            feed.id, feed.set_user_feed_as_new, feed.created, only_notify_user_ids,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            user_ids = [user_id for user_id, in cursor.fetchall()] + only_notify_user_ids
+        timeline.changed((user_id, feed.id) for user_id in user_ids)
 
-    def only_notify_cases(self, feed, user_id):
+    def only_notify_user_id(self, feed):
         # notification about following
-        if feed.action == Feed.ACTIONS_FOLLOW_USER and feed.data['users'] == [user_id]:
-            return True
-        # notification about collection following
-        if feed.action == Feed.ACTIONS_FOLLOW_COLLECTION and feed.data['collections_creators'] == [user_id]:
-            return True
-        # notification about collection suggesting
-        if feed.action == Feed.ACTIONS_SUGGEST_GAME_TO_COLLECTION and feed.data['collections_creators'] == [user_id]:
-            return True
-        return False
+        if feed.action == Feed.ACTIONS_FOLLOW_USER and len(feed.data['users']) == 1:
+            return feed.data['users'][0]
+        # notification about collection following or suggesting
+        if (
+            feed.action in (Feed.ACTIONS_FOLLOW_COLLECTION, Feed.ACTIONS_SUGGEST_GAME_TO_COLLECTION)
+            and len(feed.data['collections_creators']) == 1
+        ):
+            return feed.data['collections_creators'][0]
+        return None
+
+    def only_notify_cases(self, feed, user_id):
+        only_notify_user_id = self.only_notify_user_id(feed)
+        return only_notify_user_id is not None and only_notify_user_id == user_id
 
 
 class UserFeed(models.Model):
@@ -681,6 +730,32 @@ class FeedQueue(models.Model):
             .filter(mod=process_num, status__in=[cls.NEW, cls.DELAY], execute__lte=now(), old=old) \
             .order_by('id')
 
+    @classmethod
+    def claim(cls, processes, process_num, limit, old=False):
+        # rows which are locked by other workers are skipped instead of waiting for them
+        with transaction.atomic():
+            instances = list(
+                cls.feed_qs(processes, process_num, old)
+                .select_related('content_type')
+                .select_for_update(skip_locked=True, of=('self',))[0:limit]
+            )
+            if instances:
+                cls.objects.filter(id__in=[instance.id for instance in instances]).update(status=cls.STARTED)
+        for instance in instances:
+            instance.status = cls.STARTED
+        return instances
+
+    @classmethod
+    def save_claimed(cls, instances, deleted_ids):
+        updated = now()
+        for instance in instances:
+            instance.updated = updated
+        with transaction.atomic():
+            if instances:
+                cls.objects.bulk_update(instances, ['status', 'retries', 'execute', 'duration', 'updated'])
+            if deleted_ids:
+                cls.objects.filter(id__in=deleted_ids).delete()
+
     def __str__(self):
         return str(self.id)
 
@@ -16,6 +16,7 @@ from apps.common.cache import CommonContentType
 from apps.discussions import models as discussions_models
 from apps.feed import feed, tasks
 from apps.feed.models import Feed, FeedElement, FeedQueue, UserFeed, UserNotifyFeed, UserReaction
+from apps.feed.timeline import timeline
 from apps.games import models as games_models
 from apps.games.signals import game_fields_updated
 from apps.reviews import models as reviews_models
@@ -37,6 +38,11 @@ def feed_post_save(sender, instance, created, **kwargs):
         UserFeed.objects.update_from_feed(instance)
 
 
+@receiver(post_save, sender=UserFeed)
+def user_feed_post_save(sender, instance, **kwargs):
+    timeline.changed([(instance.user_id, instance.feed_id)])
+
+
 @receiver(post_save, sender=FeedElement)
 def feed_element_post_save(sender, instance, created, **kwargs):
     if created:
@@ -0,0 +1,642 @@
+from bisect import bisect_left, insort
+from collections import defaultdict, deque
+from heapq import heappop, heappush
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from apps.feed.models import Feed, UserFeed
+from apps.utils import storages
+
+LOADED_TIMEOUT = 60 * 60 * 24
+# the number of the last changes of the shared timeline which are kept to update the overlaps of the user timelines
+LOG_SIZE = 10000
+# the user feeds with user_id = None are shown to all the users
+SHARED = 0
+ORDERING_RANK = 'rank'
+ORDERING_CREATED = 'created'
+ORDERING_CREATED_DESC = '-created'
+ACTIONS = [action for action, _ in Feed.ACTIONS]
+
+
+def get_member(feed_id):
+    # the members with the same score are ordered by the feed id
+    return '{:010d}'.format(feed_id)
+
+
+def get_language(language, sources):
+    # only the common user feeds are filtered by the languages, they are the shared ones
+    return language if sources == [UserFeed.SOURCES_COMMON] else None
+
+
+def get_field(action, language):
+    return '{}:{}'.format(action, language or '')
+
+
+def parse_fields(values):
+    # {b'action:language': b'count'} to {(action, language or None): count}
+    result = {}
+    for field, count in values.items():
+        action, _, language = field.decode().partition(':')
+        if int(count):
+            result[(action, language or None)] = int(count)
+    return result
+
+
+# the keys of the scripts are the action keys prefix and the languages of the owner, the action keys prefix,
+# the languages and the counts of the shared timeline, the overlaps and the synced version of the owner,
+# the version and the log of the shared timeline, the first arguments are the timeout, the log size and the actions;
+# the overlaps of a user timeline are the numbers of its items which are in the shared timeline by the actions and
+# the languages of the shared items, they are moved to the current version of the shared timeline by the log of its
+# changes or are counted again if the log doesn't cover the changes since the last sync
+SYNC_SCRIPT = '''
+local timeout = tonumber(ARGV[1])
+local actions = {}
+for action in string.gmatch(ARGV[3], '%S+') do
+    table.insert(actions, action)
+end
+
+local function sync()
+    local version = tonumber(redis.call('get', KEYS[8]) or '0')
+    local synced = tonumber(redis.call('get', KEYS[7]) or '-1')
+    if synced == version then
+        return
+    end
+    local length = redis.call('llen', KEYS[9])
+    if version - synced <= length then
+        for _, entry in ipairs(redis.call('lrange', KEYS[9], length - (version - synced), -1)) do
+            local member, action, field, delta = string.match(entry, '(%S+) (%S+) (%S+) (%S+)')
+            if redis.call('zscore', KEYS[1] .. action, member) then
+                redis.call('hincrby', KEYS[6], field, delta)
+            end
+        end
+    else
+        redis.call('del', KEYS[6])
+        for _, action in ipairs(actions) do
+            for _, member in ipairs(redis.call('zrange', KEYS[1] .. action, 0, -1)) do
+                if redis.call('zscore', KEYS[3] .. action, member) then
+                    local language = redis.call('hget', KEYS[4], tonumber(member)) or ''
+                    redis.call('hincrby', KEYS[6], action .. ':' .. language, 1)
+                end
+            end
+        end
+    end
+    redis.call('set', KEYS[7], version, 'ex', timeout)
+    redis.call('expire', KEYS[6], timeout)
+end
+'''
+
+# the arguments are the shared flag, the feed id, the member, the action, the created time and the language,
+# the action is empty for a removed item
+SET_SCRIPT = SYNC_SCRIPT + '''
+local shared = ARGV[4] == '1'
+local feed_id, member, action, language = ARGV[5], ARGV[6], ARGV[7], ARGV[9]
+
+local function changed(item_action, item_language, delta)
+    if shared then
+        local field = item_action .. ':' .. item_language
+        redis.call('hincrby', KEYS[5], field, delta)
+        redis.call('expire', KEYS[5], timeout)
+        redis.call('incr', KEYS[8])
+        redis.call('rpush', KEYS[9], member .. ' ' .. item_action .. ' ' .. field .. ' ' .. delta)
+        redis.call('ltrim', KEYS[9], -tonumber(ARGV[2]), -1)
+    elseif redis.call('zscore', KEYS[3] .. item_action, member) then
+        local field = item_action .. ':' .. (redis.call('hget', KEYS[4], feed_id) or '')
+        redis.call('hincrby', KEYS[6], field, delta)
+        redis.call('expire', KEYS[6], timeout)
+    end
+end
+
+if not shared then
+    sync()
+end
+local old = nil
+for _, item_action in ipairs(actions) do
+    if redis.call('zscore', KEYS[1] .. item_action, member) then
+        old = item_action
+    end
+end
+local old_language = redis.call('hget', KEYS[2], feed_id) or ''
+-- the counts are changed only when the action or the language of the item are changed
+if old and (old ~= action or old_language ~= language) then
+    redis.call('zrem', KEYS[1] .. old, member)
+    redis.call('hdel', KEYS[2], feed_id)
+    changed(old, old_language, -1)
+    old = nil
+end
+if action ~= '' then
+    redis.call('zadd', KEYS[1] .. action, ARGV[8], member)
+    redis.call('expire', KEYS[1] .. action, timeout)
+    if language ~= '' then
+        redis.call('hset', KEYS[2], feed_id, language)
+        redis.call('expire', KEYS[2], timeout)
+    end
+    if not old then
+        changed(action, language, 1)
+    end
+end
+'''
+
+OVERLAPS_SCRIPT = SYNC_SCRIPT + '''
+sync()
+return redis.call('hgetall', KEYS[6])
+'''
+
+
+class RedisStorage(storages.RedisStorage):
+    # every action of a timeline is a sorted set of the feed ids by the created time, the languages of the
+    # common user feeds are in a hash, a timeline is loaded from the database and expires to be loaded again
+    scripts = {'set': SET_SCRIPT, 'overlaps': OVERLAPS_SCRIPT}
+
+    def __init__(self, name, client=None):
+        super().__init__(name, client)
+        self.action_key = 'feed.{}.{{}}.{{}}'.format(name)
+        self.languages_key = 'feed.{}.{{}}.languages'.format(name)
+        self.loaded_key = 'feed.{}.{{}}.loaded'.format(name)
+        self.counts_key = 'feed.{}.{{}}.counts'.format(name)
+        self.overlaps_key = 'feed.{}.{{}}.overlaps'.format(name)
+        self.synced_key = 'feed.{}.{{}}.synced'.format(name)
+        self.version_key = 'feed.{}.version'.format(name)
+        self.log_key = 'feed.{}.log'.format(name)
+
+    def get_keys(self, owner):
+        return [
+            self.action_key.format(owner, ''), self.languages_key.format(owner),
+            self.action_key.format(SHARED, ''), self.languages_key.format(SHARED), self.counts_key.format(SHARED),
+            self.overlaps_key.format(owner), self.synced_key.format(owner), self.version_key, self.log_key,
+        ]
+
+    def get_args(self):
+        return [LOADED_TIMEOUT, LOG_SIZE, ' '.join(ACTIONS)]
+
+    def loaded(self, owners):
+        with self.get_client().pipeline(transaction=False) as pipe:
+            for owner in owners:
+                pipe.exists(self.loaded_key.format(owner))
+            return {owner for owner, exists in zip(owners, pipe.execute()) if exists}
+
+    def load(self, owner, rows):
+        actions = defaultdict(dict)
+        languages = {}
+        counts = defaultdict(int)
+        for feed_id, created, action, language in rows:
+            actions[action][get_member(feed_id)] = created
+            if language:
+                languages[feed_id] = language
+            counts[get_field(action, language)] += 1
+        keys = [self.languages_key, self.counts_key, self.overlaps_key, self.synced_key]
+        with self.get_client().pipeline(transaction=True) as pipe:
+            pipe.delete(*[key.format(owner) for key in keys], *[self.action_key.format(owner, a) for a in ACTIONS])
+            for action, members in actions.items():
+                pipe.zadd(self.action_key.format(owner, action), members)
+                pipe.expire(self.action_key.format(owner, action), LOADED_TIMEOUT)
+            if languages:
+                pipe.hset(self.languages_key.format(owner), mapping=languages)
+                pipe.expire(self.languages_key.format(owner), LOADED_TIMEOUT)
+            if owner == SHARED:
+                if counts:
+                    pipe.hset(self.counts_key.format(owner), mapping=counts)
+                    pipe.expire(self.counts_key.format(owner), LOADED_TIMEOUT)
+                # the log doesn't cover the new shared timeline, so the overlaps of the users are counted again
+                pipe.incr(self.version_key)
+                pipe.delete(self.log_key)
+            pipe.set(self.loaded_key.format(owner), 1, ex=LOADED_TIMEOUT)
+            pipe.execute()
+
+    def update(self, changes):
+        # changes are (owner, feed_id, created, action, language), created is None for the removed items
+        with self.get_client().pipeline(transaction=False) as pipe:
+            for owner, feed_id, created, action, language in changes:
+                args = [int(owner == SHARED), feed_id, get_member(feed_id), '', 0, '']
+                if created is not None:
+                    args[3:] = [action, created, language or '']
+                self.run_script('set', keys=self.get_keys(owner), args=self.get_args() + args, client=pipe)
+            pipe.execute()
+
+    def ranges(self, queries):
+        # queries are (owner, action, bound, descending, offset, count), the bound is the score to start from
+        with self.get_client().pipeline(transaction=False) as pipe:
+            for owner, action, bound, descending, offset, count in queries:
+                key = self.action_key.format(owner, action)
+                if descending:
+                    pipe.zrevrangebyscore(key, '+inf' if bound is None else bound, '-inf', offset, count, True)
+                else:
+                    pipe.zrangebyscore(key, '-inf' if bound is None else bound, '+inf', offset, count, True)
+            results = [[(score, int(member)) for member, score in rows] for rows in pipe.execute()]
+            shared = {feed_id for query, rows in zip(queries, results) if query[0] == SHARED for _, feed_id in rows}
+            languages = self.languages(SHARED, shared)
+        return [
+            [(created, feed_id, languages.get(feed_id) if query[0] == SHARED else None) for created, feed_id in rows]
+            for query, rows in zip(queries, results)
+        ]
+
+    def languages(self, owner, feed_ids):
+        feed_ids = list(feed_ids)
+        if not feed_ids:
+            return {}
+        values = self.get_client().hmget(self.languages_key.format(owner), feed_ids)
+        return {feed_id: value.decode() for feed_id, value in zip(feed_ids, values) if value}
+
+    def counts(self, owner, actions):
+        with self.get_client().pipeline(transaction=False) as pipe:
+            for action in actions:
+                pipe.zcard(self.action_key.format(owner, action))
+            return dict(zip(actions, pipe.execute()))
+
+    def contains(self, queries):
+        # queries are (owner, action, feed_ids), the result is the set of the feed ids in the timeline for every query
+        with self.get_client().pipeline(transaction=False) as pipe:
+            for owner, action, feed_ids in queries:
+                for feed_id in feed_ids:
+                    pipe.zscore(self.action_key.format(owner, action), get_member(feed_id))
+            scores = iter(pipe.execute())
+        return [{feed_id for feed_id in feed_ids if next(scores) is not None} for _, _, feed_ids in queries]
+
+    def shared_counts(self):
+        return parse_fields(self.get_client().hgetall(self.counts_key.format(SHARED)))
+
+    def overlaps(self, owner):
+        values = self.run_script('overlaps', keys=self.get_keys(owner), args=self.get_args())
+        return parse_fields(dict(zip(values[::2], values[1::2])))
+
+    def drop(self, owner):
+        keys = [self.loaded_key, self.languages_key, self.counts_key, self.overlaps_key, self.synced_key]
+        self.get_client().delete(
+            *[key.format(owner) for key in keys], *[self.action_key.format(owner, action) for action in ACTIONS]
+        )
+
+
+class MemoryStorage(storages.MemoryStorage):
+    # every action of a timeline is a sorted list of the (created, feed_id) pairs,
+    # the changes of the shared timeline are logged like in the redis storage
+    def __init__(self, name):
+        super().__init__(name)
+        self.timelines = {}
+        self.version = 0
+        self.log = deque(maxlen=LOG_SIZE)
+
+    def loaded(self, owners):
+        with self.lock:
+            return {owner for owner in owners if owner in self.timelines}
+
+    def load(self, owner, rows):
+        timeline = {
+            'actions': defaultdict(list), 'items': {}, 'counts': defaultdict(int),
+            'overlaps': defaultdict(int), 'synced': None,
+        }
+        for feed_id, created, action, language in rows:
+            timeline['items'][feed_id] = (created, action, language)
+        for feed_id, (created, action, language) in timeline['items'].items():
+            timeline['actions'][action].append((created, feed_id))
+            timeline['counts'][(action, language)] += 1
+        for items in timeline['actions'].values():
+            items.sort()
+        with self.lock:
+            self.timelines[owner] = timeline
+            if owner == SHARED:
+                self.version += 1
+                self.log.clear()
+
+    def sync(self, timeline):
+        # the overlaps of a user timeline are moved to the current version of the shared timeline by the log
+        # of its changes, they are counted again if the log doesn't cover the changes since the last sync
+        synced = timeline['synced']
+        if synced == self.version:
+            return
+        overlaps = timeline['overlaps']
+        if synced is not None and self.version - synced <= len(self.log):
+            for feed_id, action, language, delta in islice(self.log, len(self.log) - (self.version - synced), None):
+                item = timeline['items'].get(feed_id)
+                if item and item[1] == action:
+                    overlaps[(action, language)] += delta
+        else:
+            overlaps.clear()
+            shared = self.timelines[SHARED]['items'] if SHARED in self.timelines else {}
+            for feed_id, (_, action, _) in timeline['items'].items():
+                item = shared.get(feed_id)
+                if item and item[1] == action:
+                    overlaps[(action, item[2])] += 1
+        timeline['synced'] = self.version
+
+    def changed(self, owner, timeline, feed_id, action, language, delta):
+        if owner == SHARED:
+            timeline['counts'][(action, language)] += delta
+            self.version += 1
+            self.log.append((feed_id, action, language, delta))
+            return
+        item = self.timelines[SHARED]['items'].get(feed_id) if SHARED in self.timelines else None
+        if item and item[1] == action:
+            timeline['overlaps'][(action, item[2])] += delta
+
+    def set_item(self, owner, feed_id, item):
+        timeline = self.timelines[owner]
+        if owner != SHARED:
+            self.sync(timeline)
+        old = timeline['items'].pop(feed_id, None)
+        if old:
+            items = timeline['actions'][old[1]]
+            del items[bisect_left(items, (old[0], feed_id))]
+        if item:
+            timeline['items'][feed_id] = item
+            insort(timeline['actions'][item[1]], (item[0], feed_id))
+        # the counts are changed only when the action or the language of the item are changed
+        if old and (not item or old[1:] != item[1:]):
+            self.changed(owner, timeline, feed_id, old[1], old[2], -1)
+        if item and (not old or old[1:] != item[1:]):
+            self.changed(owner, timeline, feed_id, item[1], item[2], 1)
+
+    def update(self, changes):
+        with self.lock:
+            for owner, feed_id, created, action, language in changes:
+                if owner in self.timelines:
+                    self.set_item(owner, feed_id, None if created is None else (created, action, language))
+
+    def ranges(self, queries):
+        result = []
+        with self.lock:
+            for owner, action, bound, descending, offset, count in queries:
+                timeline = self.timelines[owner]
+                items = timeline['actions'].get(action, [])
+                if descending:
+                    end = len(items) if bound is None else bisect_left(items, (bound, float('inf')))
+                    rows = items[max(end - offset - count, 0):max(end - offset, 0)][::-1]
+                else:
+                    start = 0 if bound is None else bisect_left(items, (bound, -1))
+                    rows = items[start + offset:start + offset + count]
+                result.append([
+                    (created, feed_id, timeline['items'][feed_id][2] if owner == SHARED else None)
+                    for created, feed_id in rows
+                ])
+        return result
+
+    def counts(self, owner, actions):
+        with self.lock:
+            return {action: len(self.timelines[owner]['actions'].get(action, [])) for action in actions}
+
+    def contains(self, queries):
+        with self.lock:
+            return [
+                {
+                    feed_id for feed_id in feed_ids
+                    if self.timelines[owner]['items'].get(feed_id, (None, None))[1] == action
+                }
+                for owner, action, feed_ids in queries
+            ]
+
+    def shared_counts(self):
+        with self.lock:
+            return {key: count for key, count in self.timelines[SHARED]['counts'].items() if count}
+
+    def overlaps(self, owner):
+        with self.lock:
+            timeline = self.timelines[owner]
+            self.sync(timeline)
+            return {key: count for key, count in timeline['overlaps'].items() if count}
+
+    def drop(self, owner):
+        with self.lock:
+            self.timelines.pop(owner, None)
+
+
+STORAGES = {
+    'redis': RedisStorage,
+    'memory': MemoryStorage,
+}
+
+
+class Source:
+    # the items of one action of one timeline after the cursor, they are read by chunks,
+    # the shared items which are in the timeline of the user are skipped
+    def __init__(self, owner, action, descending, bound, user_id=None):
+        self.owner = owner
+        self.user_id = user_id
+        self.action = action
+        self.descending = descending
+        self.bound = bound
+        self.offset = 0
+        self.items = []
+        self.exhausted = False
+
+    def query(self, count):
+        created = self.bound[0] if self.bound else None
+        return self.owner, self.action, created, self.descending, self.offset, count
+
+    def fill(self, rows, count, skipped):
+        self.offset += len(rows)
+        self.exhausted = len(rows) < count
+        rows = [row for row in rows if row[1] not in skipped]
+        if self.bound:
+            # the items with the same created time are read again from the bound
+            created, feed_id = self.bound
+            rows = [
+                row for row in rows
+                if row[0] != created or (row[1] < feed_id if self.descending else row[1] > feed_id)
+            ]
+        self.items.extend(rows)
+
+
+class Stream:
+    # the items of one action of the user timeline and the shared timeline, the user feed is shown
+    # instead of the shared one like in the legacy explore
+    def __init__(self, timeline, action, user_id, languages, descending, state):
+        created, feed_id, self.taken = state or (None, None, 0)
+        bound = (created, feed_id) if created is not None else None
+        self.timeline = timeline
+        self.action = action
+        self.languages = languages
+        self.descending = descending
+        self.sources = [
+            Source(user_id, action, descending, bound), Source(SHARED, action, descending, bound, user_id),
+        ]
+        self.head = None
+        self.last = state
+
+    def sort_key(self, item):
+        return (-item[0], -item[1]) if self.descending else (item[0], item[1])
+
+    def peek(self):
+        while self.head is None:
+            for source in self.sources:
+                while not source.items and not source.exhausted:
+                    self.timeline.fill([source])
+            candidates = [source for source in self.sources if source.items]
+            if not candidates:
+                return None
+            source = min(candidates, key=lambda s: self.sort_key(s.items[0]))
+            created, feed_id, language = source.items.pop(0)
+            if language and self.languages is not None and language not in self.languages:
+                continue
+            self.head = (created, feed_id, source.owner)
+        return self.head
+
+    def pop(self):
+        item = self.head
+        self.head = None
+        self.taken += 1
+        self.last = [item[0], item[1], self.taken]
+        return item
+
+
+class Timeline:
+    # the explore timeline of a user is the merge of the user feeds of the user and the shared user feeds,
+    # the timelines are kept in the storage and are changed with the user feeds, a page is a merge of the
+    # first items of every action after the cursor instead of a window query over all the user feeds
+    def __init__(self, name, storage=None):
+        self.name = name
+        self.storage = storage or storages.get_storage(STORAGES, name)
+        self.chunk = 50
+
+    @property
+    def enabled(self):
+        return settings.FEED_TIMELINE
+
+    def ensure(self, owners):
+        for owner in set(owners) - self.storage.loaded(list(set(owners))):
+            self.load(owner)
+
+    def load(self, owner):
+        with connection.cursor() as cursor:
+            sql = '''
+                SELECT feed_userfeed.feed_id, feed_userfeed.created, feed_feed.action, feed_feed.language,
+                    feed_userfeed.sources
+                FROM feed_userfeed
+                INNER JOIN feed_feed ON (feed_userfeed.feed_id = feed_feed.id)
+                WHERE feed_userfeed.user_id {} AND NOT feed_userfeed.hidden
+            '''.format('IS NULL' if owner == SHARED else '= %s')
+            cursor.execute(sql, [] if owner == SHARED else [owner])
+            self.storage.load(owner, [
+                (feed_id, created.timestamp(), action, get_language(language, sources))
+                for feed_id, created, action, language, sources in cursor.fetchall()
+            ])
+
+    def refresh(self, keys):
+        # keys are (user_id, feed_id) pairs of the changed user feeds, only the loaded timelines are changed
+        if not self.enabled:
+            return
+        keys = {(user_id or SHARED, feed_id) for user_id, feed_id in keys}
+        owners = self.storage.loaded(list({owner for owner, _ in keys}))
+        keys = [(owner, feed_id) for owner, feed_id in keys if owner in owners]
+        if not keys:
+            return
+        rows = {}
+        with connection.cursor() as cursor:
+            sql = '''
+                SELECT keys.user_id, keys.feed_id, feed_feed.action, feed_feed.language,
+                    feed_userfeed.created, feed_userfeed.hidden, feed_userfeed.sources
+                FROM unnest(%s::integer[], %s::integer[]) AS keys (user_id, feed_id)
+                LEFT JOIN feed_feed ON feed_feed.id = keys.feed_id
+                LEFT JOIN feed_userfeed ON feed_userfeed.feed_id = keys.feed_id AND (
+                    feed_userfeed.user_id = keys.user_id OR (keys.user_id = 0 AND feed_userfeed.user_id IS NULL)
+                )
+            '''
+            cursor.execute(sql, [[owner for owner, _ in keys], [feed_id for _, feed_id in keys]])
+            for owner, feed_id, action, language, created, hidden, sources in cursor.fetchall():
+                rows[(owner, feed_id)] = (action, language, created, hidden, sources)
+        changes = []
+        for owner, feed_id in keys:
+            action, language, created, hidden, sources = rows[(owner, feed_id)]
+            if created is None or hidden:
+                changes.append((owner, feed_id, None, action, None))
+            else:
+                changes.append((owner, feed_id, created.timestamp(), action, get_language(language, sources)))
+        self.storage.update(changes)
+
+    def changed(self, keys):
+        # the timelines are refreshed after the commit, so they have only the committed user feeds
+        keys = list(keys)
+        if self.enabled and keys:
+            transaction.on_commit(lambda: self.refresh(keys))
+
+    def drop(self, owner):
+        self.storage.drop(owner)
+
+    def fill(self, sources):
+        count = self.chunk
+        results = self.storage.ranges([source.query(count) for source in sources])
+        contained = iter(self.storage.contains([
+            (source.user_id, source.action, [row[1] for row in rows])
+            for source, rows in zip(sources, results) if source.user_id
+        ]))
+        for source, rows in zip(sources, results):
+            source.fill(rows, count, next(contained) if source.user_id else set())
+
+    def count(self, user_id, actions, languages):
+        # the user items and the shared items of the languages without the ones which are in the user timeline,
+        # both are counted by the actions and the languages in the storage
+        self.ensure([user_id, SHARED])
+        result = sum(self.storage.counts(user_id, actions).values())
+        overlaps = self.storage.overlaps(user_id)
+        for (action, language), count in self.storage.shared_counts().items():
+            if action in actions and (not language or languages is None or language in languages):
+                result += count - overlaps.get((action, language), 0)
+        return result
+
+    def items(self, user_id, actions, languages, ordering, state=None):
+        # yields (feed_id, owner, state) in the order of the explore, the state is a cursor after the item
+        self.ensure([user_id, SHARED])
+        state = dict(state or {})
+        descending = ordering != ORDERING_CREATED
+        streams = [Stream(self, action, user_id, languages, descending, state.get(action)) for action in actions]
+        self.fill([source for stream in streams for source in stream.sources])
+        now_timestamp = now().timestamp()
+
+        def get_key(stream, item):
+            created, feed_id, _ = item
+            if ordering == ORDERING_RANK:
+                # the same rank as RANK() OVER (PARTITION BY action ORDER BY created DESC) plus a week
+                # for every week after the first three weeks
+                penalty = max(0, int((now_timestamp - created) // (60 * 60 * 24)) // 7 - 3)
+                return stream.taken + 1 + penalty, -created, -feed_id
+            return stream.sort_key(item)
+
+        heap = []
+        for i, stream in enumerate(streams):
+            item = stream.peek()
+            if item:
+                heappush(heap, (get_key(stream, item), i))
+        while heap:
+            _, i = heappop(heap)
+            stream = streams[i]
+            created, feed_id, owner = stream.pop()
+            state[stream.action] = stream.last
+            yield feed_id, owner, dict(state)
+            item = stream.peek()
+            if item:
+                heappush(heap, (get_key(stream, item), i))
+
+    def rows(self, user_id, items):
+        # the user feeds of the items, the items without the user feeds are left after the deleted feeds
+        # and are removed from the timelines
+        feed_ids = [feed_id for feed_id, _, _ in items]
+        qs = UserFeed.objects.filter(Q(user_id=user_id) | Q(user_id__isnull=True), feed_id__in=feed_ids, hidden=False)
+        user_feeds = {(user_feed.user_id or SHARED, user_feed.feed_id): user_feed for user_feed in qs}
+        rows = []
+        missing = []
+        for feed_id, owner, state in items:
+            user_feed = user_feeds.get((owner, feed_id))
+            if not user_feed:
+                missing.append((owner, feed_id))
+                continue
+            user_feed.timeline_state = state
+            rows.append(user_feed)
+        if missing:
+            self.refresh(missing)
+        return rows
+
+    def page(self, user_id, actions, languages, ordering, state=None, offset=0, limit=10):
+        items = self.items(user_id, actions, languages, ordering, state)
+        for _ in islice(items, offset):
+            pass
+        rows = []
+        while len(rows) < limit:
+            chunk = list(islice(items, limit - len(rows)))
+            if not chunk:
+                break
+            rows += self.rows(user_id, chunk)
+        return rows
+
+
+timeline = Timeline('timeline')
@@ -195,6 +195,7 @@ class PlatformParentListByPlatform(Job):
 
 class PlatformList(Job):
     lifetime = 60 * 60
+    local_lifetime = 60 * 5
     is_warm = True
 
     def fetch(self):
@@ -229,6 +230,7 @@ class PlatformListMain(Job):
 
 class StoreList(Job):
     lifetime = 60 * 60
+    local_lifetime = 60 * 5
     is_warm = True
 
     def fetch(self):
@@ -238,6 +240,7 @@ class StoreList(Job):
 
 class GenreList(Job):
     lifetime = 60 * 60
+    local_lifetime = 60 * 5
     is_warm = True
 
     def fetch(self, language=None):
@@ -0,0 +1,9 @@
+from apps.utils.counters import CounterBuffer
+
+
+class PlaysBuffer(CounterBuffer):
+    def get_queryset(self):
+        return self.get_model().objects.playable()
+
+
+plays = PlaysBuffer('games.plays', 'games.Game', 'plays')
@@ -12,10 +12,11 @@ from apps.external.tasks import (
 )
 from apps.games import models
 from apps.games.tasks import (
-    update_collection, update_collection_feed, update_game_item, update_game_json_field, update_game_seo_fields,
-    update_game_totals, update_last_modified, update_likes_totals,
+    denormalize_game, update_collection, update_collection_feed, update_game_item, update_game_seo_fields,
+    update_last_modified, update_likes_totals,
 )
 from apps.merger.tasks import remove_game_cached
+from apps.users import statistics
 from apps.users.tasks import update_user_statistics
 from apps.utils.cache import warm_cache
 from apps.utils.tasks import detect_language, get_versions_and_send_slack, send_slack
@@ -58,7 +59,7 @@ def game_post_save(sender, instance, created, **kwargs):
             instance.is_init_was_changed('esrb_rating_id', custom_created)
             and not settings.DISABLE_GAME_UPDATE_SIGNALS
         ):
-            update_game_json_field.delay(instance.id, 'esrb_rating')
+            denormalize_game(instance.id, fields=['esrb_rating'])
         if (
             instance.is_init_was_changed(('image', 'image_background', 'name'), created)
             and not settings.DISABLE_GAME_UPDATE_SIGNALS
@@ -75,6 +76,8 @@ def game_post_save(sender, instance, created, **kwargs):
                     instance.id, instance.name, instance.slug, CommonContentType().get(instance).id, only_prod=True
                 )
         if instance.is_init_was_changed(('released', 'tba'), created):
+            if not created:
+                statistics.mark_games([instance.id])
             if not settings.DISABLE_GAME_UPDATE_SIGNALS:
                 update_last_modified.delay(instance.id)
                 update_game_seo_fields.delay(instance.id)
@@ -111,12 +114,14 @@ def game_item_changed(sender, instance, action, **kwargs):
     }
     if action in ('post_add', 'post_remove', 'post_clear'):
         def on_commit():
+            if sender in person_senders:
+                statistics.mark_games(list(kwargs['pk_set'] or []) if kwargs.get('reverse') else [instance.id])
             if not settings.DISABLE_GAME_UPDATE_SIGNALS:
                 games = models.Game.objects.filter(id__in=kwargs['pk_set']) if kwargs.get('reverse') else [instance]
                 for game in games:
                     if sender in person_senders:
                         game.update_persons([person_senders[sender]])
-                    update_game_json_field.delay(game.id, senders_map[sender])
+                    denormalize_game(game.id, fields=[senders_map[sender]])
                     if senders_map[sender] != 'tags':
                         update_last_modified.delay(game.id)
                     update_game_seo_fields.delay(game.id,)
@@ -130,9 +135,9 @@ def game_item_changed(sender, instance, action, **kwargs):
 def game_series_changed(sender, instance, action, **kwargs):
     if not settings.DISABLE_GAME_UPDATE_SIGNALS and action in ('post_add', 'post_remove', 'post_clear'):
         def on_commit():
-            update_game_totals.delay(instance.id, 'linked')
+            denormalize_game(instance.id, totals=['linked'])
             for pk in kwargs['pk_set'] or []:
-                update_game_totals.delay(pk, 'linked')
+                denormalize_game(pk, totals=['linked'])
         transaction.on_commit(on_commit)
 
 
@@ -156,7 +161,7 @@ def game_store_post_save(sender, instance, created, **kwargs):
                 models.Store._meta.model_name,
                 [instance.store_id],
             )
-            update_game_json_field.delay(instance.game_id, 'stores')
+            denormalize_game(instance.game_id, fields=['stores'])
             update_last_modified.delay(instance.game_id)
             update_game_seo_fields.delay(instance.game_id)
     transaction.on_commit(on_commit)
@@ -171,7 +176,7 @@ def game_store_post_delete(instance, **kwargs):
                 models.Store._meta.model_name,
                 [instance.store_id],
             )
-            update_game_json_field.delay(instance.game_id, 'stores')
+            denormalize_game(instance.game_id, fields=['stores'])
             update_game_seo_fields.delay(instance.game_id)
             update_last_modified.delay(instance.game_id)
     transaction.on_commit(on_commit)
@@ -180,6 +185,7 @@ def game_store_post_delete(instance, **kwargs):
 @receiver(post_save, sender=models.GamePlatform)
 def game_platform_post_save(sender, instance, created, **kwargs):
     def on_commit():
+        statistics.mark_games([instance.game_id])
         if created:
             if not settings.DISABLE_GAME_UPDATE_SIGNALS:
                 instance.game.update_persons(['platforms'])
@@ -200,7 +206,7 @@ def game_platform_post_save(sender, instance, created, **kwargs):
                 models.Platform._meta.model_name,
                 [instance.platform_id],
             )
-            update_game_json_field.delay(instance.game_id, 'platforms')
+            denormalize_game(instance.game_id, fields=['platforms'])
             update_game_seo_fields.delay(instance.game_id)
             update_last_modified.delay(instance.game_id)
     transaction.on_commit(on_commit)
@@ -209,6 +215,7 @@ def game_platform_post_save(sender, instance, created, **kwargs):
 @receiver(post_delete, sender=models.GamePlatform)
 def game_platform_post_delete(instance, **kwargs):
     def on_commit():
+        statistics.mark_games([instance.game_id])
         if not settings.DISABLE_GAME_UPDATE_SIGNALS:
             try:
                 instance.game.update_persons(['platforms'])
@@ -219,7 +226,7 @@ def game_platform_post_delete(instance, **kwargs):
                 models.Platform._meta.model_name,
                 [instance.platform_id],
             )
-            update_game_json_field.delay(instance.game_id, 'platforms')
+            denormalize_game(instance.game_id, fields=['platforms'])
             update_game_seo_fields.delay(instance.game_id)
             update_last_modified.delay(instance.game_id)
     transaction.on_commit(on_commit)
@@ -255,7 +262,7 @@ def collection_game_post_save(sender, instance, created, **kwargs):
         if created:
             update_collection.delay(instance.collection_id)
             if not settings.DISABLE_GAME_UPDATE_SIGNALS:
-                update_game_totals.delay(instance.game_id, 'collections')
+                denormalize_game(instance.game_id, totals=['collections'])
                 # update_last_modified.delay(instance.game_id)
             if not instance.skip_auto_feed:
                 params = {
@@ -271,8 +278,8 @@ def collection_game_post_save(sender, instance, created, **kwargs):
                 update_collection.delay(instance.collection_id)
             if instance.is_init_was_changed('game_id', False):
                 if not settings.DISABLE_GAME_UPDATE_SIGNALS:
-                    update_game_totals.delay(instance.initial_game_id, 'collections')
-                    update_game_totals.delay(instance.game_id, 'collections')
+                    denormalize_game(instance.initial_game_id, totals=['collections'])
+                    denormalize_game(instance.game_id, totals=['collections'])
     transaction.on_commit(on_commit)
 
 
@@ -284,7 +291,7 @@ def collection_game_post_delete(instance, **kwargs):
     def on_commit():
         update_collection.delay(instance.collection_id)
         if not settings.DISABLE_GAME_UPDATE_SIGNALS:
-            update_game_totals.delay(instance.game_id, 'collections')
+            denormalize_game(instance.game_id, totals=['collections'])
             # update_last_modified.delay(instance.game_id)
         models.CollectionFeed.objects \
             .filter(collection_id=instance.collection_id, content_type=content_type, object_id=pk) \
@@ -369,8 +376,7 @@ def screenshot_post_save(sender, instance, created, **kwargs):
     if instance.is_init_was_changed('hidden', created):
         def on_commit():
             if not settings.DISABLE_GAME_UPDATE_SIGNALS:
-                update_game_totals.delay(instance.game_id, 'screenshots')
-                update_game_json_field.delay(instance.game_id, 'screenshots')
+                denormalize_game(instance.game_id, totals=['screenshots'], fields=['screenshots'])
         transaction.on_commit(on_commit)
 
 
@@ -379,8 +385,7 @@ def screenshot_post_delete(instance, **kwargs):
     def on_commit():
         if not settings.DISABLE_GAME_UPDATE_SIGNALS:
             try:
-                update_game_totals.delay(instance.game_id, 'screenshots')
-                update_game_json_field.delay(instance.game_id, 'screenshots')
+                denormalize_game(instance.game_id, totals=['screenshots'], fields=['screenshots'])
             except models.ScreenShot.DoesNotExist:
                 pass
     transaction.on_commit(on_commit)
@@ -389,20 +394,20 @@ def screenshot_post_delete(instance, **kwargs):
 @receiver(post_save, sender=models.Movie)
 def movie_post_save(sender, instance, created, **kwargs):
     if created and not settings.DISABLE_GAME_UPDATE_SIGNALS:
-        transaction.on_commit(lambda: update_game_totals.delay(instance.game_id, 'movies'))
+        transaction.on_commit(lambda: denormalize_game(instance.game_id, totals=['movies']))
 
 
 @receiver(post_delete, sender=models.Movie)
 def movie_post_delete(instance, **kwargs):
     if not settings.DISABLE_GAME_UPDATE_SIGNALS:
-        transaction.on_commit(lambda: update_game_totals.delay(instance.game_id, 'movies'))
+        transaction.on_commit(lambda: denormalize_game(instance.game_id, totals=['movies']))
 
 
 @receiver(post_save, sender=models.Addition)
 def addition_post_save(sender, instance, created, **kwargs):
     def on_commit():
-        update_game_totals.delay(instance.game_id, 'linked')
-        update_game_totals.delay(instance.parent_game_id, 'linked')
+        denormalize_game(instance.game_id, totals=['linked'])
+        denormalize_game(instance.parent_game_id, totals=['linked'])
     if created and not settings.DISABLE_GAME_UPDATE_SIGNALS:
         transaction.on_commit(on_commit)
 
@@ -410,7 +415,7 @@ def addition_post_save(sender, instance, created, **kwargs):
 @receiver(post_delete, sender=models.Addition)
 def addition_post_delete(instance, **kwargs):
     def on_commit():
-        update_game_totals.delay(instance.game_id, 'linked')
-        update_game_totals.delay(instance.parent_game_id, 'linked')
+        denormalize_game(instance.game_id, totals=['linked'])
+        denormalize_game(instance.parent_game_id, totals=['linked'])
     if not settings.DISABLE_GAME_UPDATE_SIGNALS:
         transaction.on_commit(on_commit)
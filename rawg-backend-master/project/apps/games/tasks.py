@@ -1,4 +1,5 @@
 import contextlib
+import json
 import os
 from datetime import timedelta
 from math import ceil
@@ -10,65 +11,121 @@ from celery_haystack.utils import enqueue_task
 from django.apps import apps
 from django.conf import settings
 from django.core.files.storage import default_storage
-from django.db import IntegrityError, transaction
-from django.db.models import Count, F
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count
 from django.utils.dateparse import parse_datetime as parse
 from django.utils.timezone import now
 from psycopg2 import errorcodes
+from redis import Redis
 
 from apps.celery import app as celery
 from apps.common.cache import CommonContentType
-from apps.games.models import Game
+from apps.games import counters
 from apps.games.seo import get_last_modified, get_seo_fields
 from apps.recommendations.models import ClassificationQueue
 from apps.users.models import PlayerBase
 from apps.utils.celery import lock
 from apps.utils.game_session import PlayHistory
+from apps.utils.list import split
 from apps.utils.storage import default_storage_chunks_save
 
 
-@celery.task(soft_time_limit=60, bind=True, ignore_result=True, acks_late=True, reject_on_worker_lost=True,
-             max_retries=5, default_retry_delay=20)
-def update_game(self, game_id, update_playtime=False):
-    from apps.games.models import Game
-    from apps.games.signals import game_fields_updated
+def get_games_users(game_ids, playtime_game_ids=()):
+    # the counts and the last users of every status, the total row of a game has the median playtime,
+    # all the games are aggregated in one query
     from apps.users.models import UserGame
 
-    try:
-        added_qs = UserGame.objects.visible().filter(game_id=game_id)
-        count = added_qs.count()
-        users = {'added': {
-            'count': count,
-            'last': list(added_qs.order_by('-added').values_list('user_id', flat=True)[0:5])
-        }}
+    result = {}
+    for game_id in game_ids:
+        users = {'added': {'count': 0, 'last': []}}
         for status, _ in UserGame.STATUSES:
-            qs = UserGame.objects.visible().filter(game_id=game_id, status=status)
-            users[status] = {
-                'count': qs.count(),
-                'last': list(qs.order_by('-added').values_list('user_id', flat=True)[0:5])
-            }
-        kwargs = {
-            'added': count,
-            'added_by_status': dict(added_qs.values_list('status').annotate(count=Count('status')).order_by('-count')),
-            'users': users,
-        }
-        if update_playtime:
-            qs = UserGame.objects.filter(game_id=game_id, playtime__gt=0)
-            try:
-                playtime = qs.values_list('playtime', flat=True).order_by('playtime')[int(round(qs.count() / 2))]
-            except IndexError:
-                playtime = 0
-            kwargs['playtime'] = ceil(playtime / 60 / 60)
-        try:
-            game = Game.objects.only('id', 'added').get(id=game_id)
-        except Game.DoesNotExist:
-            return
-        Game.objects.filter(id=game_id).update(**kwargs)
+            users[status] = {'count': 0, 'last': []}
+        # a game without the user games has no rows, its playtime is reset too
+        playtime = 0 if game_id in playtime_game_ids else None
+        result[game_id] = {'added': 0, 'added_by_status': {}, 'users': users, 'playtime': playtime}
+    if not result:
+        return result
+    with connection.cursor() as cursor:
+        sql = '''
+            SELECT
+                game_id, status, GROUPING(status),
+                count(*) FILTER (WHERE NOT hidden),
+                (array_agg(user_id ORDER BY added DESC) FILTER (WHERE NOT hidden))[1:5],
+                percentile_disc(0.5) WITHIN GROUP (ORDER BY playtime)
+                    FILTER (WHERE playtime > 0 AND game_id = ANY(%s))
+            FROM {table}
+            WHERE game_id = ANY(%s)
+            GROUP BY GROUPING SETS ((game_id, status), (game_id))
+        '''.format(table=UserGame._meta.db_table)
+        cursor.execute(sql, [list(playtime_game_ids), list(result)])
+        for game_id, status, total, count, last, playtime in cursor.fetchall():
+            values = result[game_id]
+            if total:
+                values['added'] = count
+                values['users']['added'] = {'count': count, 'last': last or []}
+                if game_id in playtime_game_ids:
+                    values['playtime'] = ceil((playtime or 0) / 60 / 60)
+                continue
+            if count:
+                values['added_by_status'][status] = count
+            if status in values['users']:
+                values['users'][status] = {'count': count, 'last': last or []}
+    for values in result.values():
+        values['added_by_status'] = dict(sorted(values['added_by_status'].items(), key=lambda x: -x[1]))
+    return result
+
+
+def update_games_users(game_ids, playtime_game_ids=()):
+    from apps.games.models import Game
+    from apps.games.signals import game_fields_updated
+
+    playtime_game_ids = set(playtime_game_ids)
+    games = list(Game.objects.only('id', 'added').filter(id__in=game_ids))
+    if not games:
+        return
+    values = get_games_users([game.id for game in games], playtime_game_ids)
+    with connection.cursor() as cursor:
+        sql = '''
+            UPDATE {table} SET
+                added = data.added,
+                added_by_status = data.added_by_status::jsonb,
+                users = data.users::jsonb,
+                playtime = COALESCE(data.playtime, {table}.playtime)
+            FROM unnest(%s::integer[], %s::integer[], %s::text[], %s::text[], %s::integer[])
+                AS data (id, added, added_by_status, users, playtime)
+            WHERE {table}.id = data.id
+        '''.format(table=Game._meta.db_table)
+        cursor.execute(sql, [
+            [game.id for game in games],
+            [values[game.id]['added'] for game in games],
+            [json.dumps(values[game.id]['added_by_status']) for game in games],
+            [json.dumps(values[game.id]['users']) for game in games],
+            [values[game.id]['playtime'] for game in games],
+        ])
+    for game in games:
         enqueue_task('update', game)
         game_fields_updated.send(
-            sender=game.__class__, pk=game_id,
-            fields_was={'added': game.added}, fields={'added': kwargs['added']}
+            sender=game.__class__, pk=game.id,
+            fields_was={'added': game.added}, fields={'added': values[game.id]['added']}
         )
+
+
+@celery.task(soft_time_limit=60, bind=True, ignore_result=True, acks_late=True, reject_on_worker_lost=True,
+             max_retries=5, default_retry_delay=20)
+def update_game(self, game_id, update_playtime=False):
+    try:
+        update_games_users([game_id], [game_id] if update_playtime else [])
+    except SoftTimeLimitExceeded:
+        self.retry()
+
+
+@celery.task(soft_time_limit=600, bind=True, ignore_result=True, acks_late=True, reject_on_worker_lost=True,
+             max_retries=5, default_retry_delay=20)
+def update_games(self, game_ids, playtime_game_ids=()):
+    # the counters of many games, for example the games added by one import
+    try:
+        for chunk in split(game_ids, 1000):
+            update_games_users(chunk, playtime_game_ids)
     except SoftTimeLimitExceeded:
         self.retry()
 
@@ -217,6 +274,76 @@ def update_game_json_field(game_id, field_name, run_index_update=True):
         enqueue_task('update', game)
 
 
+DENORMALIZE_KEY = 'games.denormalize.{}'
+DENORMALIZE_PENDING_KEY = 'games.denormalize.pending.{}'
+DENORMALIZE_STATS_KEY = 'games.denormalize.stats'
+DENORMALIZE_ALL = '*'
+DENORMALIZE_EXPIRE = 60 * 60 * 24
+denormalize_redis = None
+
+
+def get_denormalize_redis():
+    global denormalize_redis
+    if not denormalize_redis:
+        denormalize_redis = Redis.from_url(settings.REDIS_LOCATION)
+    return denormalize_redis
+
+
+def denormalize_game(game_id, totals=(), fields=()):
+    # marks the targets of update_game_totals and update_game_json_field as dirty and schedules
+    # one update_game_denormalized for all of them, None means all the targets
+    targets = ['totals:{}'.format(DENORMALIZE_ALL if target is None else target) for target in totals]
+    targets += ['fields:{}'.format(DENORMALIZE_ALL if field is None else field) for field in fields]
+    if not game_id or not targets:
+        return
+    delay = settings.GAME_DENORMALIZE_DELAY
+    with get_denormalize_redis().pipeline() as pipe:
+        pipe.sadd(DENORMALIZE_KEY.format(game_id), *targets)
+        pipe.expire(DENORMALIZE_KEY.format(game_id), DENORMALIZE_EXPIRE)
+        # the pending flag expires by itself if the scheduled task is lost
+        pipe.set(DENORMALIZE_PENDING_KEY.format(game_id), 1, nx=True, ex=delay * 10 + 60)
+        pipe.hincrby(DENORMALIZE_STATS_KEY, 'marked', len(targets))
+        _, _, is_new, _ = pipe.execute()
+    if is_new:
+        get_denormalize_redis().hincrby(DENORMALIZE_STATS_KEY, 'scheduled')
+        update_game_denormalized.apply_async((game_id,), countdown=delay)
+
+
+def denormalize_stats():
+    stats = get_denormalize_redis().hgetall(DENORMALIZE_STATS_KEY)
+    return {key.decode(): int(value) for key, value in stats.items()}
+
+
+@celery.task(time_limit=300, ignore_result=True, acks_late=True, reject_on_worker_lost=True)
+def update_game_denormalized(game_id):
+    from apps.games.models import Game
+
+    with get_denormalize_redis().pipeline() as pipe:
+        pipe.smembers(DENORMALIZE_KEY.format(game_id))
+        pipe.delete(DENORMALIZE_KEY.format(game_id), DENORMALIZE_PENDING_KEY.format(game_id))
+        targets, _ = pipe.execute()
+    totals, fields = set(), set()
+    for target in targets:
+        kind, name = target.decode().split(':', 1)
+        (totals if kind == 'totals' else fields).add(None if name == DENORMALIZE_ALL else name)
+    if not totals and not fields:
+        return
+    try:
+        game = Game.objects.only('id').get(id=game_id)
+    except Game.DoesNotExist:
+        return
+    try:
+        for target in [None] if None in totals else sorted(totals):
+            update_game_totals(game_id, target, run_index_update=False)
+        for field_name in [None] if None in fields else sorted(fields):
+            update_game_json_field(game_id, field_name, run_index_update=False)
+    except Exception:
+        # return the targets back to be processed by the next update of the game
+        get_denormalize_redis().sadd(DENORMALIZE_KEY.format(game_id), *targets)
+        raise
+    enqueue_task('update', game)
+
+
 @celery.task(time_limit=60, ignore_result=True, acks_late=True, reject_on_worker_lost=True)
 def update_game_seo_fields(game_id):
     from apps.games.models import Game
@@ -454,4 +581,4 @@ def touch_game_visit(game_id, player_id, expiry_date):
 
 @celery.task(time_limit=10)
 def increment_plays(game_id):
-    Game.objects.playable().filter(id=game_id).update(plays=F('plays') + 1)
+    counters.plays.incr(game_id)
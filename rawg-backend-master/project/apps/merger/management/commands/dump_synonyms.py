@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.merger.synonyms import SynonymIndex
+
+
+class Command(BaseCommand):
+    help = 'Save a snapshot of the synonym index for the load_from_mongo processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str)
+
+    def handle(self, *args, **options):
+        SynonymIndex().load().dump(options['path'])
+        self.stdout.write(self.style.SUCCESS('Synonyms are saved to {}'.format(options['path'])))
@@ -10,6 +10,7 @@ from django.utils import translation
 
 from apps.credits.tasks import update_person
 from apps.games import models, tasks
+from apps.merger import synonyms
 from apps.merger.merger import create_store, find_game, update
 from apps.merger.models import DeletedGame, SimilarGame
 from apps.utils.exceptions import capture_exception
@@ -57,6 +58,7 @@ class Command(BaseCommand):
         parser.add_argument('-l', '--len', action='store', dest='len', default=1, type=int)
         parser.add_argument('-c', '--limit', action='store', dest='limit', default=0, type=int)
         parser.add_argument('-f', '--fields', action='store', dest='fields', default='', type=str)
+        parser.add_argument('-s', '--synonyms', action='store', dest='synonyms', default='', type=str)
 
     def handle(self, *args, **options):
         try:
@@ -68,7 +70,13 @@ class Command(BaseCommand):
                 self.limit = options['limit']
                 crawlers = [c for c in options['crawlers'].split(',') if c in self.crawlers.keys()]
             self.fields = options['fields'].split(',') if options['fields'] else None
-            self.process(crawlers)
+            # processes of a multi-process run share the snapshot made by the dump_synonyms command
+            if options['synonyms']:
+                index = synonyms.SynonymIndex(options['synonyms'])
+            else:
+                index = synonyms.SynonymIndex().load()
+            with synonyms.use(index):
+                self.process(crawlers)
         except Exception as e:
             capture_exception(e, raise_on_debug=False, raise_on_tests=False)
             raise
@@ -16,7 +16,9 @@ from apps.games import models
 from apps.games.esrb import ESRBConverter
 from apps.games.models import GameStore
 from apps.games.tasks import update_game_totals
-from apps.merger.models import MergedSlug, SimilarGame, StoreAdd
+from apps.merger import synonyms
+from apps.merger.models import MAX_SIMILARITY, MergedSlug, SimilarGame, StoreAdd
+from apps.merger.similar import SimilarIndex
 from apps.reviews.models import Review
 from apps.reviews.tasks import update_reviews_totals
 from apps.utils.dicts import find
@@ -58,7 +60,7 @@ def get_related(data, model, defaults=None):
     for name in data:
         check_names[name] = False
     for name in data:
-        for e in model.find_by_synonyms(name):
+        for e in synonyms.find_by_synonyms(model, name):
             all_elements.add(e)
             check_names[name] = True
     for name, value in check_names.items():
@@ -102,7 +104,7 @@ def similar(store=None):
     exclude = models.Game.objects
     if store:
         exclude = exclude.exclude(stores__in=[store.id])
-    return exclude.values_list('id', 'name')
+    return SimilarIndex(exclude.values_list('id', 'name').iterator(), MAX_SIMILARITY)
 
 
 def get_released(item):
@@ -131,7 +133,7 @@ def find_game(item, similar_list, collection='', merge_by_date=True, store=None,
             return game, False, False
 
     # find a game by synonyms
-    results = models.Game.find_by_synonyms(name)
+    results = synonyms.find_by_synonyms(models.Game, name)
     for result in results:
         # cases for some crawlers with indie and old games
         if result.import_collection != collection:
@@ -163,10 +165,14 @@ def find_game(item, similar_list, collection='', merge_by_date=True, store=None,
 
     add_similar = []
     if similar_list:
-        for pk, name in similar_list:
+        is_index = isinstance(similar_list, SimilarIndex)
+        for pk, name in similar_list.candidates(game.name) if is_index else similar_list:
             result = SimilarGame.check_games(pk, name, game.id, game.name)
             if result:
                 add_similar.append(result)
+        if is_index and store and item.get('url'):
+            # the game is going to be in the store which is excluded from the list
+            similar_list.discard(game.id)
 
     return game, created, add_similar
 
@@ -0,0 +1,93 @@
+from array import array
+from collections import defaultdict
+
+import numpy
+
+EMPTY = array('i')
+
+
+def grams(name):
+    # padded bigrams numbered by their occurrence, so the multiset overlap becomes a set overlap
+    name = '\x02{}\x03'.format(name)
+    counts = defaultdict(int)
+    result = []
+    for i in range(len(name) - 1):
+        gram = name[i:i + 2]
+        counts[gram] += 1
+        result.append((gram, counts[gram]))
+    return result
+
+
+class SimilarIndex:
+    # bigram index of game names, it returns only the names which may have SequenceMatcher.ratio() > threshold:
+    # the ratio is 2 * M / (len(a) + len(b)) and M is not greater than the longest common subsequence,
+    # so the names differ in less than d = (1 - threshold) * (len(a) + len(b)) insertions and deletions,
+    # each of them breaks at most two bigrams and the names share at least max(len(a), len(b)) + 1 - 2 * d
+    # bigrams, the names with less shared bigrams are skipped without false negatives
+
+    def __init__(self, items, threshold):
+        self.items = items
+        self.threshold = threshold
+        self.rows = None
+        self.pks = None
+        self.names = None
+        self.sizes = None
+        self.postings = None
+
+    def __bool__(self):
+        return True
+
+    def __iter__(self):
+        self.build()
+        return ((pk, self.names[row]) for pk, row in list(self.rows.items()))
+
+    def __len__(self):
+        self.build()
+        return len(self.rows)
+
+    def build(self):
+        if self.rows is not None:
+            return
+        self.rows = {}
+        self.pks = []
+        self.names = []
+        self.sizes = array('i')
+        self.postings = defaultdict(lambda: array('i'))
+        for pk, name in self.items:
+            self.add(pk, name)
+        self.items = None
+
+    def add(self, pk, name):
+        self.build()
+        self.discard(pk)
+        name_grams = grams(name.lower())
+        row = len(self.pks)
+        self.rows[pk] = row
+        self.pks.append(pk)
+        self.names.append(name)
+        self.sizes.append(len(name_grams) - 1)
+        for gram in name_grams:
+            self.postings[gram].append(row)
+
+    def discard(self, pk):
+        # postings are cleaned lazily, rows of removed ids just don't match any size
+        self.build()
+        row = self.rows.pop(pk, None)
+        if row is not None:
+            self.sizes[row] = -1
+
+    def candidates(self, name):
+        self.build()
+        name = name.lower()
+        length = len(name)
+        sizes = numpy.frombuffer(self.sizes, dtype=numpy.int32)
+        mask = (
+            (2 * numpy.minimum(sizes, length) > self.threshold * (sizes + length))
+            | ((sizes == 0) & (length == 0))
+        )
+        overlap = numpy.maximum(sizes, length) + 1 - 2 * numpy.floor((1 - self.threshold) * (sizes + length))
+        parts = [numpy.frombuffer(self.postings.get(gram, EMPTY), dtype=numpy.int32) for gram in grams(name)]
+        counts = numpy.bincount(numpy.concatenate(parts), minlength=len(sizes))
+        mask &= (counts >= overlap) | (overlap < 1)
+        for row in numpy.flatnonzero(mask):
+            yield self.pks[row], self.names[row]
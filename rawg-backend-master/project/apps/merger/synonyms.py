@@ -0,0 +1,133 @@
+import hashlib
+import os
+from contextlib import contextmanager
+
+import numpy
+from django.db.models.signals import post_save
+
+from apps.games import models
+
+MODELS = (models.Game, models.Developer, models.Publisher, models.Genre, models.Tag)
+current = None
+
+
+def add_pk(pks, pk):
+    # most of the synonyms have one id, it is kept without a container to save the memory
+    if pks is None or pks == pk:
+        return pk
+    if isinstance(pks, int):
+        return pks, pk
+    return pks if pk in pks else pks + (pk,)
+
+
+def get_pks(pks):
+    if pks is None:
+        return set()
+    if isinstance(pks, int):
+        return {pks}
+    return set(pks)
+
+
+def synonym_hash(synonym):
+    return int.from_bytes(hashlib.blake2b(synonym.encode(), digest_size=8).digest(), 'little', signed=True)
+
+
+class SynonymIndex:
+    # synonym -> ids of the synonym models for an import, it is loaded once by one query per model and
+    # replaces the synonyms__contains queries; the snapshot is a pair of sorted numpy arrays of synonym hashes
+    # and ids per model which processes of a multi-process import open with mmap instead of loading
+    # the whole index, their own changes are kept in the local dicts
+
+    def __init__(self, snapshot=None):
+        self.local = {model: {} for model in MODELS}
+        self.snapshot = {}
+        self.instances = {model: {} for model in MODELS if model is not models.Game}
+        if snapshot:
+            for model in MODELS:
+                hashes, pks = self.snapshot_paths(snapshot, model)
+                self.snapshot[model] = numpy.load(hashes, mmap_mode='r'), numpy.load(pks, mmap_mode='r')
+
+    @staticmethod
+    def snapshot_paths(path, model):
+        name = model._meta.model_name
+        return os.path.join(path, '{}.hashes.npy'.format(name)), os.path.join(path, '{}.ids.npy'.format(name))
+
+    def load(self):
+        for model in MODELS:
+            synonyms = self.local[model]
+            for pk, values in model.objects.values_list('id', 'synonyms').iterator():
+                for synonym in values:
+                    synonyms[synonym] = add_pk(synonyms.get(synonym), pk)
+        return self
+
+    def dump(self, path):
+        os.makedirs(path, exist_ok=True)
+        for model in MODELS:
+            rows = [
+                (synonym_hash(synonym), pk) for synonym, pks in self.local[model].items() for pk in get_pks(pks)
+            ]
+            rows.sort()
+            hashes, pks = self.snapshot_paths(path, model)
+            numpy.save(hashes, numpy.array([row[0] for row in rows], dtype=numpy.int64))
+            numpy.save(pks, numpy.array([row[1] for row in rows], dtype=numpy.int64))
+
+    def add(self, instance):
+        model = type(instance)
+        synonyms = self.local[model]
+        for synonym in instance.synonyms:
+            synonyms[synonym] = add_pk(synonyms.get(synonym), instance.pk)
+        if model in self.instances:
+            self.instances[model][instance.pk] = instance
+
+    def pks(self, model, name):
+        name = name.lower()
+        pks = get_pks(self.local[model].get(name))
+        if model in self.snapshot:
+            hashes, snapshot_pks = self.snapshot[model]
+            value = synonym_hash(name)
+            left = numpy.searchsorted(hashes, value, side='left')
+            right = numpy.searchsorted(hashes, value, side='right')
+            pks.update(int(pk) for pk in snapshot_pks[left:right])
+        return pks
+
+    def find(self, model, name):
+        pks = self.pks(model, name)
+        if model is models.Game:
+            # games are too big to be kept, the query by the primary keys keeps the original ordering
+            if not pks:
+                return model.objects.none()
+            return model.find_by_synonyms(name).filter(id__in=pks)
+        instances = self.instances[model]
+        missed = [pk for pk in pks if pk not in instances]
+        if missed:
+            instances.update(model.objects.in_bulk(missed))
+        name = name.lower()
+        # the instances are checked, the snapshot may be outdated or have a hash collision
+        return [instances[pk] for pk in pks if pk in instances and name in instances[pk].synonyms]
+
+
+def find_by_synonyms(model, name):
+    if current:
+        return current.find(model, name)
+    return model.find_by_synonyms(name)
+
+
+@contextmanager
+def use(index):
+    global current
+    previous, current = current, index
+    try:
+        yield index
+    finally:
+        current = previous
+
+
+def synonym_post_save(sender, instance, **kwargs):
+    if current and 'synonyms' not in instance.get_deferred_fields():
+        current.add(instance)
+
+
+for synonym_model in MODELS:
+    post_save.connect(synonym_post_save, sender=synonym_model, dispatch_uid='merger_synonyms_{}'.format(
+        synonym_model._meta.model_name
+    ))
@@ -1,21 +1,19 @@
 import sys
 from collections import namedtuple
 from hashlib import sha1
-from random import shuffle
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.db import IntegrityError
 from django.db.models.signals import post_save
 from django.utils.timezone import now
-from psycopg2 import errorcodes
 from rest_framework.fields import DateTimeField
 
 from apps.games.models import Game, GameStore
 from apps.merger.tasks.mocks import sync_mocks
 from apps.users.signals import user_game_post_save, user_game_post_save_base
 from apps.utils.api import get_object_or_none
+from apps.utils.list import split
 from apps.utils.strings import normalize_apostrophes
 
 Param = namedtuple('Param', (
@@ -53,26 +51,6 @@ def fill(container, fields, user):
         container[f] = DateTimeField().to_representation(user.get(f)) if 'date' in f else user.get(f)
 
 
-def save_game(user, game, platforms, store, is_sync=False):
-    from apps.users.models import UserGame
-
-    game_instance, name = get_game_cached(game.get('appid'), game['name'], store.slug)
-    if game_instance:
-        local_platforms = game['set_platforms'] if game.get('set_platforms') else platforms
-        playtime = 0
-        if game.get('playtime_forever'):
-            playtime = game.get('playtime_forever') * 60
-        elif game.get('playtime'):
-            playtime = game.get('playtime')
-        return UserGame.create_user_game(
-            game_instance, user, local_platforms, playtime, True, is_sync,
-            # game.get('raptr'),
-            game.get('last_played'), store.slug,
-        )
-
-    return None
-
-
 def save_games(games, user_id, attr, account_id, is_sync=False, is_fast=False, is_achievements=True, started=None):
     from apps.games.models import Store
     from apps.users.models import UserGame
@@ -83,30 +61,30 @@ def save_games(games, user_id, attr, account_id, is_sync=False, is_fast=False, i
         return {}
 
     store_params = FIELDS_STORES.get(attr)
-
-    user_games = []
-    user_games_objects = []
     store = Store.objects.get(slug=store_params.store_slug)
     post_save.disconnect(user_game_post_save, UserGame)
 
-    if len(games) > 3000:
-        # shuffle to write every time different games in cases of big user libraries and timeouts
-        shuffle(games)
-
-    for game in sync_mocks(games, user_id):
-        try:
-            user_game = save_game(user, game, store_params.platforms, store, is_sync)
-        except IntegrityError as e:
-            if e.__cause__.pgcode != errorcodes.UNIQUE_VIOLATION:
-                raise
-            # retry one time
-            user_game = save_game(user, game, store_params.platforms, store, is_sync)
-        if user_game:
-            user_games_objects.append(user_game)
-            user_games.append({
-                'status': user_game.status,
-                'game_id': user_game.game_id,
-            })
+    games = sync_mocks(games, user_id)
+    rows = []
+    for game, game_instance in zip(games, get_games_cached(games, store.slug)):
+        if not game_instance:
+            continue
+        playtime = 0
+        if game.get('playtime_forever'):
+            playtime = game.get('playtime_forever') * 60
+        elif game.get('playtime'):
+            playtime = game.get('playtime')
+        rows.append((
+            game_instance.id,
+            game['set_platforms'] if game.get('set_platforms') else store_params.platforms,
+            playtime,
+            game.get('last_played'),
+        ))
+    user_games_objects = UserGame.create_user_games(user, rows, is_sync, store.slug)
+    user_games = [
+        {'status': user_game.status, 'game_id': user_game.game_id}
+        for user_game in user_games_objects
+    ]
 
     user_game_post_save_base(user_games_objects, from_import=True)
 
@@ -130,7 +108,8 @@ def save_games(games, user_id, attr, account_id, is_sync=False, is_fast=False, i
 
 
 def clear_name(name, store):
-    sys.path.append(settings.BASE_DIR)
+    if settings.BASE_DIR not in sys.path:
+        sys.path.append(settings.BASE_DIR)
     from crawlers.utils.clear import clear_name as _clear
     store = {
         'xbox-store': 'xbox',
@@ -149,8 +128,12 @@ def filter_by_store(game):
     return True
 
 
+def get_game_cache_key(app_id, name, store_slug, custom_store_kwargs=None):
+    return sha1(f'{app_id}.{name}.{store_slug}.{custom_store_kwargs}'.encode('utf-8')).hexdigest()
+
+
 def get_game_cached(app_id, name, store_slug, custom_store_kwargs=None):
-    cache_key = sha1(f'{app_id}.{name}.{store_slug}.{custom_store_kwargs}'.encode('utf-8')).hexdigest()
+    cache_key = get_game_cache_key(app_id, name, store_slug, custom_store_kwargs)
     result = cache.get(cache_key)
     if not result:
         game, name = get_game(app_id, name, store_slug, custom_store_kwargs)
@@ -161,6 +144,35 @@ def get_game_cached(app_id, name, store_slug, custom_store_kwargs=None):
     return result
 
 
+def get_games_cached(games, store_slug, batch_size=1000):
+    # the batch version of get_game_cached for the library imports, the games are returned in the same order
+    keys = [get_game_cache_key(game.get('appid'), game['name'], store_slug) for game in games]
+    found = {}
+    for chunk in split(list(set(keys)), batch_size):
+        found.update(cache.get_many(chunk))
+    missed = {key: game for key, game in zip(keys, games) if key not in found}
+    by_store = {}
+    app_ids = {str(game.get('appid')) for game in missed.values() if game.get('appid')}
+    for chunk in split(list(app_ids), batch_size):
+        qs = GameStore.objects.filter(store__slug=store_slug, store_internal_id__in=chunk).select_related('game')
+        for game_store in qs.order_by('-id'):
+            by_store[game_store.store_internal_id] = game_store.game
+    resolved = {}
+    for key, game in missed.items():
+        name = clear_name(game['name'], store_slug)
+        game_instance = by_store.get(str(game.get('appid'))) if game.get('appid') else None
+        if not game_instance:
+            game_instance = find_game_by_name(name)
+        if game_instance:
+            resolved[key] = (game_instance, name)
+    if resolved:
+        for chunk in split(list(resolved.items()), batch_size):
+            cache.set_many(dict(chunk), 60 * 60 * 3)
+        save_games_cached_tags({key: game_instance.id for key, (game_instance, _) in resolved.items()})
+    found.update(resolved)
+    return [found[key][0] if key in found else None for key in keys]
+
+
 def save_game_cached_tag(game_id, cache_key):
     tag_key = f'get_game_cached_{game_id}'
     keys = cache.get(tag_key)
@@ -173,6 +185,19 @@ def save_game_cached_tag(game_id, cache_key):
     cache.set(tag_key, ','.join(keys), 60 * 60 * 3)
 
 
+def save_games_cached_tags(keys):
+    tags = {}
+    for cache_key, game_id in keys.items():
+        tags.setdefault(f'get_game_cached_{game_id}', []).append(cache_key)
+    current = cache.get_many(list(tags))
+    data = {}
+    for tag_key, cache_keys in tags.items():
+        tag_keys = current[tag_key].split(',') if current.get(tag_key) else []
+        tag_keys.extend(cache_key for cache_key in cache_keys if cache_key not in tag_keys)
+        data[tag_key] = ','.join(tag_keys)
+    cache.set_many(data, 60 * 60 * 3)
+
+
 def remove_game_cached(game_id):
     tag_key = f'get_game_cached_{game_id}'
     keys = cache.get(tag_key)
@@ -194,12 +219,16 @@ def get_game(app_id, name, store_slug, custom_store_kwargs=None):
     store = get_object_or_none(GameStore, **kwargs)
     if store:
         return store.game, name
+    return find_game_by_name(name), name
+
+
+def find_game_by_name(name):
     # find by synonyms
     results = Game.find_by_synonyms(name)
     for result in results:
         if result.released > now().date() or filter_by_store(result):
             continue
-        return result, name
+        return result
     # find by a name
     game = get_object_or_none(Game, name=name)
     if game and filter_by_store(game):
@@ -209,4 +238,4 @@ def get_game(app_id, name, store_slug, custom_store_kwargs=None):
         game = get_object_or_none(Game, name_ru=name)
         if game and filter_by_store(game):
             game = None
-    return game, name
+    return game
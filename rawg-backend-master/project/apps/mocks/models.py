@@ -11,7 +11,7 @@ from apps.feed.feed import game_is_released, most_rated_games, offer_change_play
 from apps.feed.models import Feed as FeedModel
 from apps.games.models import Game, GamePlatform, PlatformParent
 from apps.merger.tasks import sync_user
-from apps.token.models import Cycle
+from apps.token.models import Cycle, leaderboard
 from apps.token.signals import user_joined, user_out
 from apps.token.tasks import update_progress
 from apps.users.models import UserGame
@@ -223,6 +223,8 @@ class Token(models.Model):
         elif self.action == self.ACTIONS_CLEAR_CYCLE:
             cycle = Cycle.objects.active()
             cycle.user_cycles.all().delete()
+            # the bulk delete doesn't send the signals, the leaderboard is loaded again on the next read
+            transaction.on_commit(lambda: leaderboard.drop(cycle.id))
             cycle.cycle_karma.all().delete()
         elif self.action == self.ACTIONS_FINISH_CYCLE:
             cycle = Cycle.objects.active()
@@ -0,0 +1,121 @@
+import logging
+import random
+from contextlib import contextmanager
+from time import monotonic, time
+from urllib.parse import urlparse
+
+import newrelic.agent
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.exceptions import RequestException
+
+logger = logging.getLogger('payment')
+
+TIMEOUT = 10
+POOL_SIZE = 10
+HOSTS = 100
+SLOT_KEY = 'payments.delivery.slot.{}.{}'
+SLOT_TIMEOUT = TIMEOUT * 3
+SLOT_WAIT = 5
+FAILURES_KEY = 'payments.delivery.failures.{}'
+OPEN_KEY = 'payments.delivery.open.{}'
+PROBE_KEY = 'payments.delivery.probe.{}'
+PROBE_TIMEOUT = TIMEOUT * 2
+
+
+class Parked(Exception):
+    # the delivery is postponed without a request to the game
+    def __init__(self, countdown: float, reason: str):
+        self.countdown = countdown
+        self.reason = reason
+
+
+def get_host(url: str) -> str:
+    return urlparse(url).netloc
+
+
+@contextmanager
+def slot(game_id: int, oid: str):
+    # the number of the simultaneous deliveries to one game is limited for all the workers
+    for number in range(settings.PAYMENTS_DELIVERY_CONCURRENCY):
+        key = SLOT_KEY.format(game_id, number)
+        if cache.add(key, oid, SLOT_TIMEOUT):
+            try:
+                yield
+            finally:
+                cache.delete(key)
+            return
+    record('Parked')
+    raise Parked(SLOT_WAIT, 'all the slots of the game are busy')
+
+
+def park(countdown: float, reason: str) -> None:
+    # the parked deliveries come back at different times, so they don't hit the endpoint together
+    record('Parked')
+    raise Parked(max(countdown, 1) + random.uniform(0, settings.PAYMENTS_DELIVERY_BREAKER_TIMEOUT), reason)
+
+
+def check_circuit(host: str) -> None:
+    # the endpoint which failed a number of times in a row is not requested until the breaker timeout ends,
+    # then one probe delivery tries it and the other ones are parked until the probe succeeds
+    keys = [OPEN_KEY.format(host), FAILURES_KEY.format(host)]
+    values = cache.get_many(keys)
+    opened_until = values.get(keys[0])
+    if opened_until:
+        park(opened_until - time(), f'the circuit of {host} is open')
+    if values.get(keys[1], 0) >= settings.PAYMENTS_DELIVERY_BREAKER_FAILURES:
+        if not cache.add(PROBE_KEY.format(host), 1, PROBE_TIMEOUT):
+            park(PROBE_TIMEOUT, f'the circuit of {host} is half-open, a probe delivery is in flight')
+
+
+def success(host: str) -> None:
+    cache.delete_many([FAILURES_KEY.format(host), PROBE_KEY.format(host)])
+
+
+def failure(host: str) -> None:
+    key = FAILURES_KEY.format(host)
+    timeout = settings.PAYMENTS_DELIVERY_BREAKER_TIMEOUT * 6
+    cache.add(key, 0, timeout)
+    try:
+        failures = cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout)
+        failures = 1
+    if failures >= settings.PAYMENTS_DELIVERY_BREAKER_FAILURES:
+        timeout = settings.PAYMENTS_DELIVERY_BREAKER_TIMEOUT
+        cache.set(OPEN_KEY.format(host), time() + timeout, timeout)
+        cache.delete(PROBE_KEY.format(host))
+        logger.warning(f'The circuit of the payments delivery to {host} is open after {failures} failures')
+
+
+def record(outcome: str, duration: float = None) -> None:
+    newrelic.agent.record_custom_metric(f'Custom/Payments/Delivery/{outcome}', 1)
+    if duration is not None:
+        newrelic.agent.record_custom_metric('Custom/Payments/Delivery/Latency', duration)
+
+
+def get_session() -> requests.Session:
+    from apps.utils.payments.tools import get_session
+
+    return get_session('games', POOL_SIZE, HOSTS)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    host = get_host(url)
+    check_circuit(host)
+    start = monotonic()
+    try:
+        response = get_session().post(url, timeout=TIMEOUT, **kwargs)
+        response.raise_for_status()
+    except RequestException:
+        duration = monotonic() - start
+        failure(host)
+        record('Error', duration)
+        logger.info(f'Payment delivery to {host} failed in {duration:.3f} sec')
+        raise
+    duration = monotonic() - start
+    success(host)
+    record('Success', duration)
+    logger.info(f'Payment delivery to {host} succeeded in {duration:.3f} sec')
+    return response
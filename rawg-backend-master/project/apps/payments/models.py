@@ -16,7 +16,7 @@ from django.utils.functional import cached_property
 from apps.games.models import Game, Game, PlayerGameSession, PlayerGameSession
 from apps.stat.models import Visit
 from apps.users.models import Balance
-from .tasks import send_payment_to_game
+from .tasks import get_delivery_deadline, send_payment_to_game
 from .utils import Constants, PaymentException, PaymentStateMachineMixin
 
 logger = logging.getLogger('payment')
@@ -103,7 +103,7 @@ class PaidEvent(PaymentEvent):
         proxy = True
 
     def send_event_to_game(self):
-        send_payment_to_game.delay(self.payment_id)
+        send_payment_to_game.delay(self.payment_id, deadline=get_delivery_deadline())
 
     def on_exception(self, event):
         logger.warning(
@@ -128,7 +128,7 @@ class RefundedEvent(PaymentEvent):
         proxy = True
 
     def send_event_to_game(self):
-        send_payment_to_game.delay(self.payment_id)
+        send_payment_to_game.delay(self.payment_id, deadline=get_delivery_deadline())
 
     def on_exception(self, event):
         logger.warning(
@@ -1,23 +1,39 @@
 import json
 import logging
+from time import time
 
-import requests
 from django.db import models
 from requests.exceptions import RequestException
 
 from apps.celery import app as celery
 from apps.games.models import Game
+from apps.payments import delivery
 from apps.utils.crypto import generate_signature
 
 logger = logging.getLogger('payment')
 
+DELIVERY_TIME = 24 * 60 * 60
+
+
+def get_delivery_deadline() -> float:
+    return time() + DELIVERY_TIME
+
 
 @celery.task(bind=True, max_retries=72, retry_backoff=5, retry_jitter=True, retry_backoff_max=20*60,
              autoretry_for=(RequestException,))
-def send_payment_to_game(self, payment_id):
+def send_payment_to_game(self, payment_id, deadline=None):
     # retries timeouts: 5, 10, 20, 40, 80, 160, 320, 640, 1200, 1200, 1200 ... ends after 24 hours.
+    # the deadline is set when the delivery is enqueued, the retries and the parked deliveries which are sent
+    # again as new tasks keep it
     from api.payments.serializers import PaymentReadSerializer
     from apps.payments.models import Payment
+    if deadline is None:
+        # the autoretries repeat the arguments, so a delivery without a deadline is enqueued again with one
+        self.apply_async((payment_id,), {'deadline': get_delivery_deadline()})
+        return
+    if time() > deadline:
+        logger.error(f'Failed to send payment data to game before the deadline. Payment id: {payment_id}')
+        return
     try:
         payment = Payment.objects.client_data_annotated() \
             .annotate(url=models.F('game__webhook_url'), secret=models.F('game__secret_key')) \
@@ -35,16 +51,28 @@ def send_payment_to_game(self, payment_id):
     else:
         if payment.url:
             try:
-                _send_data_to_game(payment.url, payment.secret, PaymentReadSerializer(payment).data)
+                with delivery.slot(payment.game_id, self.request.id):
+                    _send_data_to_game(payment.url, payment.secret, PaymentReadSerializer(payment).data)
+            except delivery.Parked as parked:
+                if time() + parked.countdown > deadline:
+                    logger.error(
+                        f'Failed to send payment data to game before the deadline, {parked.reason}. '
+                        f'Payment id: {payment_id}'
+                    )
+                    return
+                self.apply_async((payment_id,), {'deadline': deadline}, countdown=parked.countdown)
             except RequestException as error:
                 logger.error(
                     f'Error while sending payment data to game developer. Payment id: {payment_id}. Error: {error}'
                 )
+                if time() > deadline:
+                    logger.error(f'Failed to send payment data to game before the deadline. Payment id: {payment_id}')
+                    return
                 raise error
 
 
 def _send_data_to_game(url: str, secret_key: str, data: dict) -> None:
     signature = generate_signature([json.dumps(data)], secret_key, '')
     headers = {'Authorization': f'Signature {signature}'}
-    response = requests.post(url, json=data, headers=headers)
+    response = delivery.post(url, json=data, headers=headers)
     response.raise_for_status()
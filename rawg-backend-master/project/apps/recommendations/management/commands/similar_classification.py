@@ -1,4 +1,5 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 import numpy
@@ -6,16 +7,19 @@ import requests
 from django.core.files.base import ContentFile
 from django.core.files.temp import NamedTemporaryFile
 from django.core.management.base import BaseCommand
-from django.db import IntegrityError, transaction
+from django.db import transaction
 from django.db.models import ExpressionWrapper, F, IntegerField, Prefetch
-from psycopg2 import errorcodes
+from django.utils.timezone import now
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
 from apps.games.models import Game, ScreenShot
 from apps.recommendations.models import Classification, ClassificationQueue, NeighborQueue
 from apps.recommendations.networks import NETWORKS
 from apps.utils.backend_storages import FileSystemStorage
+from apps.utils.db import copy_from_conflict
 from apps.utils.exceptions import capture_exception
+from apps.utils.list import split
 
 
 class Command(BaseCommand):
@@ -25,6 +29,11 @@ class Command(BaseCommand):
     image_prefix = 'recommendations/image_420/'
     image_path = f'/app/media/{image_prefix}{{}}'
     batch_size = 2000
+    inference_batch_size = 32
+    threads = 16
+    timeout = 30
+    session = None
+    nets = {}
 
     def add_arguments(self, parser):
         parser.add_argument('-n', '--num', action='store', dest='num', default=0, type=int)
@@ -35,6 +44,8 @@ class Command(BaseCommand):
         parser.add_argument('-r', '--revert', action='store_true', dest='revert', default=False)
         parser.add_argument('-f', '--force-replace', action='store_true', dest='force_replace', default=False)
         parser.add_argument('-d', '--download-only', action='store_true', dest='download_only', default=False)
+        parser.add_argument('-b', '--batch', action='store', dest='batch', default=32, type=int)
+        parser.add_argument('-t', '--threads', action='store', dest='threads', default=16, type=int)
 
     def handle(self, *args, **options):
         self.process_num = options['num']
@@ -44,6 +55,13 @@ class Command(BaseCommand):
         self.queue = options['queue']
         self.force_replace = options['force_replace']
         self.download_only = options['download_only']
+        self.inference_batch_size = options['batch']
+        self.threads = options['threads']
+        if not self.session:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.threads)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
         self.qs = Game.objects.only('id').order_by('added' if options['revert'] else '-added').prefetch_related(
             Prefetch('screenshots', queryset=ScreenShot.objects.visible().only('id', 'image', 'game_id'))
         )
@@ -71,16 +89,12 @@ class Command(BaseCommand):
                 self.screens.append(screen)
             if len(self.screens) > self.batch_size:
                 self.retrieve_data()
-                self.load_images()
-                if not self.download_only:
-                    self.classify()
-                    self.classifications = []
+                self.process()
+                self.classifications = []
                 self.screens = []
         if self.screens:
             self.retrieve_data()
-            self.load_images()
-            if not self.download_only:
-                self.classify()
+            self.process()
         if self.queue:
             self.clear_queue()
         self.clear_fields()
@@ -93,82 +107,148 @@ class Command(BaseCommand):
         self.screens = None
 
     def retrieve_data(self):
+        now_date = now()
+        with transaction.atomic():
+            copy_from_conflict(
+                Classification, ['screenshot_id', 'created', 'updated'],
+                [(screen.id, now_date, now_date) for screen in self.screens],
+                '(screenshot_id) DO NOTHING',
+                'temp_recommendations_classification',
+                join=f'JOIN {ScreenShot._meta.db_table} ON {ScreenShot._meta.db_table}.id = screenshot_id'
+            )
         self.classifications = Classification.objects.in_bulk(
             [screen.id for screen in self.screens], field_name='screenshot_id'
         )
-        create_classifications = []
-        for screen in self.screens:
-            if self.classifications.get(screen.id):
-                continue
-            classification = Classification(screenshot=screen)
-            create_classifications.append(classification)
-            self.classifications[screen.id] = classification
-        Classification.objects.bulk_create(create_classifications, batch_size=self.batch_size)
+        self.screens = [screen for screen in self.screens if screen.id in self.classifications]
 
-    def load_images(self):
-        skip = 0
-        errors = 0
-        bar = tqdm(self.screens)
-        bar.set_description(f'Load images. Skipped: {skip}. Errors: {errors}')
-        for screen in bar:
-            name = screen.image.name
-            classification = self.classifications.get(screen.id)
-            if (
-                (classification.image_420 and not self.download_only)
-                or FileSystemStorage().exists(f'{self.image_prefix}{name}')
-            ):
-                skip += 1
-                bar.set_description(f'Load images. Skipped: {skip}. Errors: {errors}')
+    def get_net(self, network):
+        # networks are loaded once per process
+        if network.slug not in self.nets:
+            net = cv2.dnn.readNetFromCaffe(network.proto_path, network.model_path)
+            layer_names = net.getLayerNames()
+            before_last_layer = net.getLayer(net.getLayerId(layer_names[-2]))
+            self.nets[network.slug] = net, before_last_layer.name
+        return self.nets[network.slug]
+
+    def get_networks(self, classification):
+        if self.download_only:
+            return []
+        networks = []
+        for network in NETWORKS:
+            attr = getattr(classification, network.slug)
+            if (attr and not self.force_replace) or (attr.name and FileSystemStorage().exists(attr.name)):
                 continue
+            networks.append(network)
+        return networks
+
+    def load_image(self, screen):
+        # runs in the threads: downloads an image if it is missed and decodes it if it should be classified,
+        # returns the screen, the image, whether the image is downloaded and whether there is an error
+        name = screen.image.name
+        classification = self.classifications[screen.id]
+        content = None
+        if not (
+            (classification.image_420 and not self.download_only)
+            or FileSystemStorage().exists(f'{self.image_prefix}{name}')
+        ):
             try:
-                response = requests.get(self.image.format(name))
+                response = self.session.get(self.image.format(name), timeout=self.timeout)
                 if response.status_code != 200:
                     raise Exception(f'{response.url} - status code {response.status_code}')
             except Exception as e:
                 capture_exception(e, raise_on_debug=True, raise_on_tests=True)
-                errors += 1
-                bar.set_description(f'Load images. Skipped: {skip}. Errors: {errors}')
-                continue
-            classification.image_420.save(name, ContentFile(response.content))
+                return screen, None, False, True
+            content = response.content
+            classification.image_420.save(name, ContentFile(content), save=False)
+        if not self.get_networks(classification):
+            return screen, None, content is not None, False
+        if content is not None:
+            image = cv2.imdecode(numpy.frombuffer(content, numpy.uint8), cv2.IMREAD_COLOR)
+        else:
+            image = cv2.imread(self.image_path.format(name))
+        if image is None:
+            capture_exception(
+                Exception(f'{self.image_path.format(name)} - the image is not readable'),
+                raise_on_debug=True, raise_on_tests=True
+            )
+            return screen, None, content is not None, True
+        return screen, image, content is not None, False
 
-    def classify(self):
+    def load_images(self, executor):
+        # the next batch is downloaded by the threads while the current one is classified
+        pending = None
+        for batch in split(self.screens, self.inference_batch_size):
+            futures = [executor.submit(self.load_image, screen) for screen in batch]
+            if pending:
+                yield [future.result() for future in pending]
+            pending = futures
+        if pending:
+            yield [future.result() for future in pending]
+
+    def save_vector(self, image_name, attr, vector):
+        fp = NamedTemporaryFile(suffix='.txt.gz')
+        numpy.savetxt(fp.name, vector)
+        attr.save(f'{image_name}.txt.gz', fp, save=False)
+
+    def classify(self, batch, executor):
+        classified = []
         for network in NETWORKS:
-            skip = 0
-            errors = 0
-            net = cv2.dnn.readNetFromCaffe(network.proto_path, network.model_path)
-            layer_names = net.getLayerNames()
-            before_last_layer_id = net.getLayerId(layer_names[-2])
-            before_last_layer = net.getLayer(before_last_layer_id)
-            bar = tqdm(self.screens)
-            bar.set_description(f'Classify images {network.name}. Skipped: {skip}. Errors: {errors}')
-            for screen in bar:
-                image_name = screen.image.name
-                classification = self.classifications.get(screen.id)
+            items = [
+                (screen, image) for screen, image, _, _ in batch
+                if image is not None and network in self.get_networks(self.classifications[screen.id])
+            ]
+            if not items:
+                continue
+            net, layer_name = self.get_net(network)
+            net.setInput(cv2.dnn.blobFromImages([image for _, image in items], *network.image_params))
+            vectors = net.forward(layer_name).reshape(len(items), -1)
+            futures = []
+            for (screen, _), vector in zip(items, vectors):
+                classification = self.classifications[screen.id]
                 attr = getattr(classification, network.slug)
-                if (attr and not self.force_replace) or (attr.name and FileSystemStorage().exists(attr.name)):
-                    skip += 1
-                    bar.set_description(f'Classify images {network.name}. Skipped: {skip}. Errors: {errors}')
-                    continue
-                try:
-                    net.setInput(cv2.dnn.blobFromImage(
-                        cv2.imread(self.image_path.format(image_name)),
-                        *network.image_params
-                    ))
-                except Exception as e:
-                    capture_exception(e, raise_on_debug=True, raise_on_tests=True)
-                    errors += 1
-                    bar.set_description(f'Classify images {network.name}. Skipped: {skip}. Errors: {errors}')
-                    continue
-                fp = NamedTemporaryFile(suffix='.txt.gz')
-                numpy.savetxt(fp.name, numpy.squeeze(net.forward(before_last_layer.name)))
-                with transaction.atomic():
-                    attr.save(f'{image_name}.txt.gz', fp)
-                    if self.queue:
-                        try:
-                            NeighborQueue.objects.get_or_create(classification=classification, network=network.slug)
-                        except IntegrityError as e:
-                            if e.__cause__.pgcode != errorcodes.UNIQUE_VIOLATION:
-                                raise
+                futures.append(executor.submit(self.save_vector, screen.image.name, attr, vector))
+                classified.append((classification, network.slug))
+            for future in futures:
+                future.result()
+        return classified
+
+    def process(self):
+        now_date = now()
+        loaded = 0
+        errors = 0
+        classified = 0
+        bar = tqdm(total=len(self.screens))
+        bar.set_description('Images')
+        with ThreadPoolExecutor(self.threads) as executor:
+            for batch in self.load_images(executor):
+                updated = {}
+                fields = set()
+                for screen, _, is_loaded, is_error in batch:
+                    if is_loaded:
+                        loaded += 1
+                        updated[screen.id] = self.classifications[screen.id]
+                        fields.add('image_420')
+                    errors += is_error
+                batch_classified = [] if self.download_only else self.classify(batch, executor)
+                for classification, slug in batch_classified:
+                    updated[classification.screenshot_id] = classification
+                    fields.add(slug)
+                classified += len(batch_classified)
+                if updated:
+                    for classification in updated.values():
+                        classification.updated = now_date
+                    with transaction.atomic():
+                        Classification.objects.bulk_update(updated.values(), ['updated', *fields])
+                        if self.queue and batch_classified:
+                            copy_from_conflict(
+                                NeighborQueue, ['classification_id', 'network', 'created'],
+                                [(classification.id, slug, now_date) for classification, slug in batch_classified],
+                                '(classification_id, network) DO NOTHING',
+                                'temp_recommendations_classification_neighbors_queue'
+                            )
+                bar.update(len(batch))
+                bar.set_description(f'Images. Loaded: {loaded}. Classified: {classified}. Errors: {errors}')
+        bar.close()
 
     def clear_queue(self):
         if not self.queue_ids:
@@ -27,9 +27,17 @@ class Command(BaseCommand):
     find_elements = 61
     index_path = '/app/indexes/{}.hnsw'
     batch_size = 2000
+    reserve_elements = 10000
+    snapshot_interval = 0
     queue_ids = None
     classify_after = None
     date = now()
+    network = None
+    index = None
+    labels = None
+    changed = False
+    saved_at = 0
+    index_signature = None
 
     def add_arguments(self, parser):
         parser.add_argument('network', type=str)
@@ -39,12 +47,17 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.rebuild = options['rebuild']
         self.keep_index = options['keep_index']
-        self.network = None
-        for network in NETWORKS:
-            if network.slug == options['network']:
-                self.network = network
+        self.date = now()
+        network = None
+        for item in NETWORKS:
+            if item.slug == options['network']:
+                network = item
                 break
-        assert self.network
+        assert network
+        if network != self.network or self.rebuild:
+            # the index stays in the memory between the runs of the daemon
+            self.index = None
+        self.network = network
         self.index_name = self.index_path.format(self.network.slug)
 
         if self.rebuild:
@@ -58,25 +71,29 @@ class Command(BaseCommand):
             self.queue_ids = self.qs.values_list('id', flat=True)
 
         if not self.qs.count():
+            self.snapshot()
             self.stdout.write(self.style.SUCCESS('Queue is empty'))
             return
 
         self.load_index()
         if self.add_data():
             self.search()
-            self.save_index()
+            if self.rebuild:
+                self.save_index()
             self.copy_new_index()
             self.write_data()
             self.finish_rebuild()
         if not self.rebuild:
             self.clear_queue()
-            self.clear_fields()
+            self.snapshot()
+        self.clear_fields()
 
         return 'ok'
 
     def clear_fields(self):
-        self.index = None
-        self.labels = None
+        if self.rebuild:
+            self.index = None
+            self.labels = None
         self.qs = None
         self.queue_ids = None
         self.results = None
@@ -84,26 +101,44 @@ class Command(BaseCommand):
         self.results_screens = None
         self.screens = None
 
+    def get_index_signature(self):
+        # a rebuild by another process replaces the file, so its inode and modification time are changed
+        try:
+            stat = Path(self.index_name).stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def is_index_replaced(self):
+        return self.index is not None and self.get_index_signature() != self.index_signature
+
     def load_index(self, add_to_max_elements=100):
+        if self.is_index_replaced():
+            self.stdout.write(self.style.WARNING('Index was replaced'))
+            self.index = None
+            self.changed = False
+        if self.index is not None:
+            return
         self.stdout.write(self.style.WARNING('Index'))
         max_elements = (
             Classification.objects.count()
             + NeighborQueue.objects.filter(network=self.network.slug).count()
             + add_to_max_elements
         )
+        self.index = hnswlib.Index(space=self.network.space, dim=self.network.dimension)
         if Path(self.index_name).exists():
-            self.index = hnswlib.Index(space=self.network.space, dim=self.network.dimension)
             self.index.load_index(self.index_name, max_elements=max_elements)
         else:
-            self.index = hnswlib.Index(space=self.network.space, dim=self.network.dimension)
             self.index.init_index(max_elements=max_elements, ef_construction=self.ef_construction, M=self.index_m)
         self.index.set_ef(self.ef)
-        self.labels = self.index.get_ids_list()
+        self.labels = set(self.index.get_ids_list())
+        self.saved_at = time.monotonic()
+        self.index_signature = self.get_index_signature()
         self.stdout.write(self.style.SUCCESS('OK'))
 
     def add_data(self):
         if self.keep_index:
-            self.screens = self.labels
+            self.screens = list(self.labels)
             return True
 
         self.stdout.write(self.style.WARNING('Retrieve data'))
@@ -140,15 +175,49 @@ class Command(BaseCommand):
 
         return True
 
-    def add_data_in_index(self, data, max_elements=0):
-        if max_elements:
-            # reload index with new max_elements count
-            self.load_index(max_elements)
-        try:
-            self.index.add_items(numpy.float32(data), numpy.uint64(self.screens))
-        except RuntimeError:
-            max_elements += 1000
-            self.add_data_in_index(data, max_elements=max_elements)
+    def add_data_in_index(self, data):
+        count = self.index.get_current_count() + len(data)
+        if count > self.index.get_max_elements():
+            # the index grows in place, with a reserve for the next runs
+            self.index.resize_index(count + self.reserve_elements)
+        self.index.add_items(numpy.float32(data), numpy.uint64(self.screens))
+        self.labels.update(self.screens)
+        self.changed = True
+
+    def delete_data_in_index(self, screens):
+        # deleted elements are skipped by the queries and their labels may be added again
+        for screen_id in screens:
+            if screen_id not in self.labels:
+                continue
+            try:
+                self.index.mark_deleted(screen_id)
+            except RuntimeError:
+                # the element was deleted before the index was saved
+                pass
+            self.labels.discard(screen_id)
+            self.changed = True
+
+    def delete_missed(self):
+        labels = numpy.fromiter(self.labels, dtype=numpy.int64, count=len(self.labels))
+        existing = numpy.fromiter(
+            Classification.objects.values_list('screenshot_id', flat=True).iterator(), dtype=numpy.int64
+        )
+        self.delete_data_in_index(int(screen_id) for screen_id in numpy.setdiff1d(labels, existing))
+
+    def snapshot(self, force=False):
+        if self.index is None or not self.changed:
+            return
+        if not force and time.monotonic() - self.saved_at < self.snapshot_interval:
+            return
+        if self.is_index_replaced():
+            # the new index is loaded by the next run instead of being overwritten by the old one
+            self.index = None
+            self.changed = False
+            return
+        self.delete_missed()
+        self.save_index()
+        self.saved_at = time.monotonic()
+        self.changed = False
 
     def search(self):
         self.stdout.write(self.style.WARNING('Search'))
@@ -164,10 +233,14 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f'OK - {timedelta(seconds=time.monotonic() - start_time)}'))
 
     def save_index(self):
+        # the index is written into a temporary file and renamed, so the readers never see a partial file
         self.stdout.write(self.style.WARNING('Save index'))
         start_time = time.monotonic()
         Path(Path(self.index_name).parent).mkdir(exist_ok=True)
-        self.index.save_index(self.index_name)
+        temp_name = f'{self.index_name}.tmp'
+        self.index.save_index(temp_name)
+        Path(temp_name).replace(self.index_name)
+        self.index_signature = self.get_index_signature()
         self.stdout.write(self.style.SUCCESS(f'OK - {timedelta(seconds=time.monotonic() - start_time)}'))
 
     def copy_new_index(self):
@@ -188,6 +261,7 @@ class Command(BaseCommand):
         start_time = time.monotonic()
 
         games = {}
+        deleted = set()
         for i, screen_id in enumerate(self.screens):
             base_game_id = screens_games.get(screen_id)
             if not base_game_id:
@@ -204,6 +278,7 @@ class Command(BaseCommand):
                         neighbor_game_id = screens_games.get(neighbor_id)
                         if not neighbor_game_id:
                             # screen was deleted
+                            deleted.add(int(neighbor_id))
                             continue
                         if base_game_id == neighbor_game_id:
                             continue
@@ -222,6 +297,8 @@ class Command(BaseCommand):
                     self.create_neighbours(neighbors.items(), result_queue)
                     neighbors = {}
                     bar.update(1)
+        if not self.rebuild:
+            self.delete_data_in_index(deleted)
 
         if result_queue:
             bar = tqdm(split([(game_id, self.date) for game_id in result_queue], self.batch_size))
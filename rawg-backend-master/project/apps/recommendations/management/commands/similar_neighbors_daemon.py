@@ -3,4 +3,8 @@ from apps.utils.daemon import DaemonMixin
 
 
 class Command(DaemonMixin, BaseCommand):
-    pass
+    snapshot_interval = 600
+
+    def exit(self):
+        self.snapshot(force=True)
+        super().exit()
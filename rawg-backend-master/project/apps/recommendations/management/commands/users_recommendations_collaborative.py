@@ -1,8 +1,10 @@
 import itertools
+import shutil
 import timeit
 from collections import Counter, OrderedDict
 from datetime import timedelta
 from math import ceil
+from pathlib import Path
 from typing import Optional
 
 import implicit
@@ -10,9 +12,10 @@ import numpy as np
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields.jsonb import KeyTextTransform
 from django.db import transaction
-from django.db.models import ExpressionWrapper, IntegerField
+from django.db.models import Case, ExpressionWrapper, IntegerField, Value, When
 from django.utils.timezone import now
-from scipy.sparse import csr_matrix
+from implicit.nearest_neighbours import NearestNeighboursScorer
+from scipy.sparse import coo_matrix, csr_matrix, load_npz, save_npz
 from tqdm import tqdm
 
 from apps.discussions.models import Discussion
@@ -35,6 +38,9 @@ TRENDING_GAP = 6
 TRENDING_TAIL = 5
 TRENDING_TAIL_ALT_COUNT = 40
 TRENDING_TAIL_ALT = 40
+# weights by ratings
+REVIEW_WEIGHTS = np.array([0, -40, 0, -30, 30, 40])
+LIKE_WEIGHTS = np.array([0, -15, 0, -15, 15, 15])
 
 
 class Command(BaseCommand):
@@ -46,8 +52,12 @@ class Command(BaseCommand):
         ('BPR', implicit.bpr.BayesianPersonalizedRanking, {'factors': 63, 'verify_negative_samples': True}),
         ('COSINE', implicit.nearest_neighbours.CosineRecommender, {}),
     ]
+    models_path = '/app/indexes/collaborative'
+    chunk_size = 100000
     filter = {}
     compiled_models = None
+    models_version = None
+    games_count = 0
     trending_games = None
 
     def handle(self, *args, **options):
@@ -103,10 +113,14 @@ class Command(BaseCommand):
 
         # calculate models and data
         game_user_data = None
+        if options['queue']:
+            # the daemons use the models saved today and fold the queued users in
+            self.load_models()
         if not self.compiled_models:
             game_user_data = self.prepare_csr()
             if game_user_data is not None:
                 self.compiled_models = self.get_models(game_user_data)
+                self.save_models(game_user_data)
                 game_user_data = game_user_data.T.tocsr()
 
         # get qs
@@ -121,7 +135,7 @@ class Command(BaseCommand):
             if user_ids:
                 qs = qs.filter(id__in=user_ids)
                 self.filter = {'user_id__in': user_ids}
-                game_user_data = self.prepare_csr()
+                game_user_data = self.prepare_csr(shape=(self.games_count, max(user_ids) + 1))
                 if game_user_data is not None:
                     game_user_data = game_user_data.T.tocsr()
             else:
@@ -146,44 +160,26 @@ class Command(BaseCommand):
             start = None
             if self.disable_tqdm:
                 start = timeit.default_timer()
-            if game_user_data is not None:
-                user_id = user.id
+            if game_user_data is not None and user.id < game_user_data.shape[0]:
                 recommendations = {}
                 similar_users = {}
                 for name, model in self.compiled_models:
                     kwargs = {'filter_already_liked_items': True}
+                    trained = name == 'COSINE' or user.id < model.user_factors.shape[0]
                     if options['queue'] and name != 'BPR':
+                        # new data of the user is folded in without the training
                         kwargs['recalculate_user'] = True
-                    try:
-                        user_data = model.recommend(user_id, game_user_data, GAMES_NUM, **kwargs)
-                    except IndexError:
-                        # the user is new
-                        user_id = 0
-                        try:
-                            game_user_data = game_user_data.getrow(user.id)
-                        except IndexError:
-                            # the user is created after game_user_data creation
-                            # this occurs in full recalculating and it's ok
-                            continue
-                        try:
-                            user_data = model.recommend(user_id, game_user_data, GAMES_NUM, **kwargs)
-                        except IndexError:
-                            # user's games are not in train data
-                            self.compiled_models = None
-                            self.print('The games rebuilding is needed', 'ERROR')
-                            return
-                    for game_id, score in user_data:
-                        recommendations.setdefault(name, []).append((game_id, score))
-                    if not user_id or name == 'COSINE':
+                    elif not trained:
+                        # the user is created after the training
                         continue
-                    try:
-                        user_data_users = model.similar_users(user_id, USERS_NUM * 2)
-                    except IndexError:
+                    for game_id, score in model.recommend(user.id, game_user_data, GAMES_NUM, **kwargs):
+                        recommendations.setdefault(name, []).append((game_id, score))
+                    if not trained or name == 'COSINE':
                         continue
-                    for pk, score in user_data_users:
-                        if user_id == pk:
+                    for pk, score in model.similar_users(user.id, USERS_NUM * 2):
+                        if user.id == pk:
                             continue
-                        similar_users.setdefault(user_id, []).append((pk, score))
+                        similar_users.setdefault(user.id, []).append((pk, score))
                 self.process_user_collaborative(user, recommendations, similar_users)
             UserRecommendationQueue.objects.filter(
                 target=UserRecommendationQueue.TARGETS_COLLABORATIVE, user_id=user.id
@@ -195,6 +191,7 @@ class Command(BaseCommand):
         self.print('OK', disable=self.disable_tqdm)
 
     def get_models(self, game_user_data):
+        self.games_count = game_user_data.shape[0]
         data = []
         for name, model, kwargs in self.models:
             self.print(f'Train Model {name}', 'WARNING')
@@ -204,123 +201,136 @@ class Command(BaseCommand):
             self.print('OK')
         return data
 
-    def prepare_csr(self) -> Optional[csr_matrix]:
-        users = {}
+    def prepare_csr(self, shape=None) -> Optional[csr_matrix]:
         last_days = now() - timedelta(days=90)
-
-        qs = UserGame.objects.visible().filter(**self.filter)
-        self.print('UserGame', 'WARNING', disable=self.disable_tqdm)
-        for user_id, game_id, date in tqdm(
-            qs.values_list('user_id', 'game_id', 'added').iterator(),
-            total=qs.count(), disable=self.disable_tqdm
+        games = []
+        users = []
+        values = []
+
+        # the value of a game for a user is the sum of the weights of the user's actions,
+        # every weight is doubled for the last 90 days
+        user_id, game_id, recent = self.fetch(UserGame.objects.visible(), 'game_id', 'added', last_days)
+        games.append(game_id)
+        users.append(user_id)
+        values.append(1 + recent)
+
+        user_id, game_id, recent, rating, is_text = self.fetch(
+            Review.objects.visible(), 'game_id', 'created', last_days, 'rating', 'is_text'
+        )
+        games.append(game_id)
+        users.append(user_id)
+        values.append(REVIEW_WEIGHTS[rating] * (1 + is_text) * (1 + recent))
+
+        user_id, game_id, recent, rating, positive = self.fetch(
+            Like.objects.all(), 'review__game_id', 'added', last_days, 'review__rating', 'positive'
+        )
+        games.append(game_id)
+        users.append(user_id)
+        values.append(LIKE_WEIGHTS[rating] * (2 * positive - 1) * (1 + recent))
+
+        for qs, weight in (
+            (Discussion.objects.visible(), 20),
+            (UserFavoriteGame.objects.all(), 60),
+            (UserRecommendationDislike.objects.all(), -60),
         ):
-            user = users.setdefault(user_id, {})
-            val = user.get(game_id, 0) + 1
-            if date >= last_days:
-                val *= 2
-            user[game_id] = val
-        self.print('OK', disable=self.disable_tqdm)
+            user_id, game_id, recent = self.fetch(qs, 'game_id', 'created', last_days)
+            games.append(game_id)
+            users.append(user_id)
+            values.append(weight * (1 + recent))
 
-        qs = Review.objects.visible().filter(**self.filter)
-        self.print('Review', 'WARNING', disable=self.disable_tqdm)
-        ratings_map = {
-            1: -40,
-            3: -30,
-            4: 30,
-            5: 40,
-        }
-        for user_id, game_id, rating, is_text, date in tqdm(
-            qs.values_list('user_id', 'game_id', 'rating', 'is_text', 'created').iterator(),
-            total=qs.count(), disable=self.disable_tqdm
-        ):
-            user = users.setdefault(user_id, {})
-            val = ratings_map[rating]
-            if is_text:
-                val *= 2
-            if date >= last_days:
-                val *= 2
-            user[game_id] = user.get(game_id, 0) + val
-        self.print('OK', disable=self.disable_tqdm)
+        games = np.concatenate(games)
+        if not games.size:
+            return
+        users = np.concatenate(users)
+        values = np.concatenate(values)
 
-        qs = Like.objects.filter(**self.filter)
-        self.print('Like', 'WARNING', disable=self.disable_tqdm)
-        ratings_map = {
-            -1: 15,
-            -3: 15,
-            -4: -15,
-            -5: -15,
-            1: -15,
-            3: -15,
-            4: 15,
-            5: 15,
-        }
-        for user_id, game_id, positive, rating, date in tqdm(
-            qs.values_list('user_id', 'review__game_id', 'positive', 'review__rating', 'added').iterator(),
-            total=qs.count(), disable=self.disable_tqdm
-        ):
-            user = users.setdefault(user_id, {})
-            rating = rating * (1 if positive else -1)
-            val = ratings_map[rating]
-            if date >= last_days:
-                val *= 2
-            user[game_id] = user.get(game_id, 0) + val
+        self.print('Create CSR', 'WARNING', disable=self.disable_tqdm)
+        if shape:
+            # games which are not in the train data are skipped
+            mask = (games < shape[0]) & (users < shape[1])
+            games, users, values = games[mask], users[mask], values[mask]
+        # duplicates of the same user and game are summed
+        game_user_data = coo_matrix((values.astype(np.float32), (games, users)), shape=shape).tocsr()
         self.print('OK', disable=self.disable_tqdm)
 
-        qs = Discussion.objects.visible().filter(**self.filter)
-        self.print('Discussion', 'WARNING', disable=self.disable_tqdm)
-        for user_id, game_id, date in tqdm(
-            qs.values_list('user_id', 'game_id', 'created').iterator(),
-            total=qs.count(), disable=self.disable_tqdm
-        ):
-            user = users.setdefault(user_id, {})
-            val = 20
-            if date >= last_days:
-                val *= 2
-            user[game_id] = user.get(game_id, 0) + val
-        self.print('OK', disable=self.disable_tqdm)
+        return game_user_data
 
-        qs = UserFavoriteGame.objects.filter(**self.filter)
-        self.print('UserFavoriteGame', 'WARNING', disable=self.disable_tqdm)
-        for user_id, game_id, date in tqdm(
-            qs.values_list('user_id', 'game_id', 'created').iterator(),
-            total=qs.count(), disable=self.disable_tqdm
-        ):
-            user = users.setdefault(user_id, {})
-            val = 60
-            if date >= last_days:
-                val *= 2
-            user[game_id] = user.get(game_id, 0) + val
+    def fetch(self, qs, game_field, date_field, last_days, *fields):
+        # rows are streamed from a server-side cursor and packed into integer arrays by chunks,
+        # the weights are calculated by array operations
+        qs = qs.filter(**self.filter).annotate(
+            recent=Case(
+                When(**{f'{date_field}__gte': last_days}, then=Value(1)), default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+        self.print(qs.model.__name__, 'WARNING', disable=self.disable_tqdm)
+        columns = ('user_id', game_field, 'recent') + fields
+        rows = qs.values_list(*columns).iterator(chunk_size=self.chunk_size)
+        chunks = []
+        with tqdm(total=qs.count(), disable=self.disable_tqdm) as bar:
+            while True:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                chunks.append(np.array(chunk, dtype=np.int64))
+                bar.update(len(chunk))
         self.print('OK', disable=self.disable_tqdm)
-
-        qs = UserRecommendationDislike.objects.filter(**self.filter)
-        self.print('UserRecommendationDislike', 'WARNING', disable=self.disable_tqdm)
-        for user_id, game_id, date in tqdm(
-            qs.values_list('user_id', 'game_id', 'created').iterator(),
-            total=qs.count(), disable=self.disable_tqdm
-        ):
-            user = users.setdefault(user_id, {})
-            val = -60
-            if date >= last_days:
-                val *= 2
-            user[game_id] = user.get(game_id, 0) + val
+        if not chunks:
+            return np.empty((len(columns), 0), dtype=np.int64)
+        return np.concatenate(chunks).T
+
+    def save_models(self, game_user_data):
+        # every version is written in its own directory and the link to it is replaced atomically,
+        # so the daemons don't load a partly written version
+        self.print('Save Models', 'WARNING', disable=self.disable_tqdm)
+        root = Path(self.models_path)
+        version = root / now().strftime('%Y%m%d%H%M%S%f')
+        version.mkdir(parents=True)
+        save_npz(version / 'game_user.npz', game_user_data)
+        for name, model in self.compiled_models:
+            if name == 'COSINE':
+                save_npz(version / f'{name}.npz', model.similarity)
+            else:
+                np.save(version / f'{name}.items.npy', model.item_factors)
+                np.save(version / f'{name}.users.npy', model.user_factors)
+        link = root / 'current.tmp'
+        if link.is_symlink():
+            link.unlink()
+        link.symlink_to(version.name)
+        link.replace(root / 'current')
+        self.models_version = version.name
+        for path in root.iterdir():
+            if path.is_dir() and not path.is_symlink() and path != version:
+                # the old files stay readable for the processes which have mapped them
+                shutil.rmtree(path, ignore_errors=True)
         self.print('OK', disable=self.disable_tqdm)
 
-        if not users:
-            return
-
-        self.print('Create CSR', 'WARNING', disable=self.disable_tqdm)
-        row = []
-        col = []
+    def load_models(self):
+        # the models saved today are loaded instead of the training, the factors are mapped into the memory
+        current = Path(self.models_path) / 'current'
+        if not current.exists():
+            return False
+        version = current.resolve()
+        if version.name == self.models_version or version.stat().st_mtime < midnight().timestamp():
+            return False
+        self.print('Load Models', 'WARNING', disable=self.disable_tqdm)
         data = []
-        for user_id, games in tqdm(users.items(), disable=self.disable_tqdm):
-            for game_id, value in games.items():
-                row.append(game_id)
-                col.append(user_id)
-                data.append(value)
-        game_user_data = csr_matrix((np.array(data), (np.array(row), np.array(col))), dtype=np.float32)
+        for name, model, kwargs in self.models:
+            model = model(**kwargs)
+            if name == 'COSINE':
+                model.similarity = load_npz(version / f'{name}.npz')
+                model.scorer = NearestNeighboursScorer(model.similarity)
+                self.games_count = model.similarity.shape[0]
+            else:
+                model.item_factors = np.load(version / f'{name}.items.npy', mmap_mode='r')
+                model.user_factors = np.load(version / f'{name}.users.npy', mmap_mode='r')
+                self.games_count = model.item_factors.shape[0]
+            data.append((name, model))
+        self.compiled_models = data
+        self.models_version = version.name
         self.print('OK', disable=self.disable_tqdm)
-
-        return game_user_data
+        return True
 
     def process_user_collaborative(self, user, recommendations, similar_users):
         # process recommendations
@@ -417,12 +427,14 @@ class Command(BaseCommand):
         for name, values in similar_users.items():
             for game_id, score in values:
                 similar_users_top[game_id] += score
+        similar_users_top = similar_users_top.most_common(USERS_NUM)
+        similar_games = user.get_similar_games_many([int(user_id) for user_id, _ in similar_users_top])
         similar_users_top = [
             {
                 'percent': min(100, ceil(score * 20)), 'score': score,
-                'user': int(user_id), 'games': user.get_similar_games(user_id)
+                'user': int(user_id), 'games': similar_games[int(user_id)]
             }
-            for user_id, score in similar_users_top.most_common(USERS_NUM)
+            for user_id, score in similar_users_top
         ]
         user.set_statistics(['recommended_users'], recommended_users=similar_users_top, commit=False)
 
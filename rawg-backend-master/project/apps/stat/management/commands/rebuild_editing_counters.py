@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from apps.stat.models import EditingCounter
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly editing counters of the users from the revisions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-m', '--month', action='store', dest='month', default=None, type=parse_date,
+                            help='Any day of the month to rebuild, all the months by default')
+
+    def handle(self, *args, **options):
+        month = options['month']
+        if month:
+            month = month.replace(day=1)
+        records = EditingCounter.rebuild(month)
+        self.stdout.write(self.style.SUCCESS('{} records'.format(records)))
+        self.stdout.write(self.style.SUCCESS('OK'))
@@ -0,0 +1,40 @@
+# Generated by Django 2.2 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('stat', '0011_auto_20230923_1210'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EditingCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(editable=False)),
+                ('count', models.PositiveIntegerField(default=0, editable=False)),
+                (
+                    'user',
+                    models.ForeignKey(
+                        editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                        to=settings.AUTH_USER_MODEL
+                    )
+                ),
+            ],
+            options={
+                'verbose_name': 'Editing Counter',
+                'verbose_name_plural': 'Editing Counters',
+                'ordering': ('-count', 'user_id'),
+                'unique_together': {('month', 'user')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='editingcounter',
+            index=models.Index(fields=['month', '-count'], name='stat_editing_month_count'),
+        ),
+    ]
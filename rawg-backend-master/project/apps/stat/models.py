@@ -1,8 +1,8 @@
 from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.indexes import BrinIndex
-from django.db import models
-from django.utils.timezone import now
+from django.db import connection, models, transaction
+from django.utils.timezone import localtime, now
 
 from apps.games.models import Game, Store
 
@@ -235,3 +235,68 @@ class APIUserCounter(models.Model):
 
     def __str__(self):
         return str(self.id)
+
+
+class EditingCounter(models.Model):
+    # the number of the revisions of a user in a month, see api.leaderboard
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, models.CASCADE, related_name='+', editable=False)
+    month = models.DateField(editable=False)
+    count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        verbose_name = 'Editing Counter'
+        verbose_name_plural = 'Editing Counters'
+        ordering = ('-count', 'user_id')
+        unique_together = ('month', 'user')
+        indexes = [
+            models.Index(fields=['month', '-count'], name='stat_editing_month_count'),
+        ]
+
+    def __str__(self):
+        return str(self.id)
+
+    @staticmethod
+    def get_month(date_created):
+        return localtime(date_created).date().replace(day=1)
+
+    @classmethod
+    def add(cls, user_id, date_created):
+        with connection.cursor() as cursor:
+            sql = '''
+                INSERT INTO {table} (user_id, month, count) VALUES (%s, %s, 1)
+                ON CONFLICT (month, user_id) DO UPDATE SET count = {table}.count + 1
+            '''.format(table=cls._meta.db_table)
+            cursor.execute(sql, [user_id, cls.get_month(date_created)])
+
+    @classmethod
+    def remove(cls, user_id, date_created):
+        cls.objects.filter(user_id=user_id, month=cls.get_month(date_created), count__gt=0).update(
+            count=models.F('count') - 1
+        )
+
+    @classmethod
+    def rebuild(cls, month=None):
+        from reversion.models import Revision
+
+        with transaction.atomic():
+            qs = cls.objects.all()
+            if month:
+                qs = qs.filter(month=month)
+            qs.delete()
+            with connection.cursor() as cursor:
+                sql = '''
+                    INSERT INTO {table} (user_id, month, count)
+                    SELECT user_id, date_trunc('month', date_created AT TIME ZONE %s)::date AS month, count(*)
+                    FROM {revisions}
+                    WHERE user_id IS NOT NULL {where}
+                    GROUP BY 1, 2
+                '''.format(
+                    table=cls._meta.db_table,
+                    revisions=Revision._meta.db_table,
+                    where="AND date_trunc('month', date_created AT TIME ZONE %s)::date = %s" if month else '',
+                )
+                params = [settings.TIME_ZONE]
+                if month:
+                    params += [settings.TIME_ZONE, month]
+                cursor.execute(sql, params)
+                return cursor.rowcount
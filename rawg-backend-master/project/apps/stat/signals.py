@@ -1,11 +1,29 @@
 from django.contrib.auth import get_user_model
 from django.db.models import signals
 from django.dispatch import receiver
+from reversion.models import Revision
+from reversion.signals import post_revision_commit
 
-from .models import Visit
+from .models import EditingCounter, Visit
 
 
 @receiver(signals.post_save, sender=get_user_model())
 def user_logged_in(instance, update_fields, created, **kwargs):
     if created or (update_fields and 'last_visit' in update_fields):
         Visit.objects.create(user_id=instance.id)
+
+
+@receiver(post_revision_commit)
+def editing_counter_post_revision_commit(sender, revision, versions, **kwargs):
+    # the counter is updated in the transaction of the revision
+    if revision.user_id:
+        EditingCounter.add(revision.user_id, revision.date_created)
+
+
+@receiver(signals.post_delete, sender=Revision)
+def editing_counter_revision_post_delete(instance, **kwargs):
+    if instance.get_deferred_fields() & {'user_id', 'date_created'}:
+        # the rebuild_editing_counters command fixes the counters after the deletions of the partial instances
+        return
+    if instance.user_id:
+        EditingCounter.remove(instance.user_id, instance.date_created)
@@ -1,14 +1,14 @@
 from django.db import IntegrityError
-from django.db.models import F
 from django.utils.timezone import now
 from psycopg2 import errorcodes
 
 from apps.celery import app as celery
 from apps.recommendations.models import UserRecommendation
 from apps.stat.models import (
-    APIUserCounter, CarouselRating, RecommendationsVisit, RecommendedGameAdding, RecommendedGameStoreVisit,
+    CarouselRating, RecommendationsVisit, RecommendedGameAdding, RecommendedGameStoreVisit,
     RecommendedGameVisit, Status, Story,
 )
+from apps.utils import api_limits
 from apps.utils.celery import lock_transaction
 
 
@@ -89,6 +89,22 @@ def add_recommended_game_adding(user_id, game_id, status, from_import=False, ref
             raise
 
 
+@celery.task(time_limit=60, ignore_result=True)
+def add_recommended_games_adding(user_id, games, from_import=False, referer=None):
+    # the batch version of add_recommended_game_adding, games are (game_id, status) pairs
+    statuses = dict(games)
+    qs = UserRecommendation.objects.visible().filter(user_id=user_id, game_id__in=list(statuses))
+    if not from_import:
+        RecommendedGameAdding.objects.bulk_create([
+            RecommendedGameAdding(
+                user_id=user_id, game_id=game_id, status=statuses[game_id], sources=sources,
+                referer=(referer or '')[:500]
+            )
+            for game_id, sources in qs.values_list('game_id', 'sources')
+        ])
+    qs.update(hidden=True, position=0, updated=now())
+
+
 @celery.task(time_limit=20, ignore_result=True)
 def add_recommended_game_store_visit(user_id, game_id, store_id):
     user_recommendation = UserRecommendation.objects.only('id', 'sources').filter(
@@ -102,17 +118,6 @@ def add_recommended_game_store_visit(user_id, game_id, store_id):
     )
 
 
-@celery.task(time_limit=30, ignore_result=True)
-def dump_api_stat(counters):
-    for user_id, count in counters.items():
-        try:
-            counter, created = APIUserCounter.objects.get_or_create(user_id=user_id, date=now().date(), defaults={
-                'count': count,
-            })
-        except IntegrityError as e:
-            if e.__cause__.pgcode != errorcodes.FOREIGN_KEY_VIOLATION:
-                raise
-            continue
-        if not created:
-            counter.count = F('count') + count
-            counter.save(update_fields=['count'])
+@celery.task(time_limit=30, ignore_result=True, expires=50)
+def dump_api_stat():
+    api_limits.limiter.flush()
@@ -2,7 +2,7 @@ from django.db import transaction
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from apps.games.tasks import update_game_json_field
+from apps.games.tasks import denormalize_game
 from apps.stories import models
 from apps.stories.tasks import make_clip
 
@@ -37,12 +37,12 @@ def story_post_save(sender, instance, created, **kwargs):
 @receiver(post_save, sender=models.Clip)
 def clip_post_save(sender, instance, created, **kwargs):
     def on_commit():
-        update_game_json_field.delay(instance.game_id, 'clip')
+        denormalize_game(instance.game_id, fields=['clip'])
     transaction.on_commit(on_commit)
 
 
 @receiver(post_delete, sender=models.Clip)
 def clip_post_delete(instance, **kwargs):
     def on_commit():
-        update_game_json_field.delay(instance.game_id, 'clip')
+        denormalize_game(instance.game_id, fields=['clip'])
     transaction.on_commit(on_commit)
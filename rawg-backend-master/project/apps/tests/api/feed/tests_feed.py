@@ -1,11 +1,18 @@
 import json
+from datetime import timedelta
+from unittest.mock import patch
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db.models.signals import post_save
-from django.test import Client, TestCase, TransactionTestCase
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.utils.timezone import now
+from redis import Redis
 from rest_framework.authtoken.models import Token
 
-from apps.feed.models import Feed
+from apps.feed.feed import delete_feeds
+from apps.feed.models import Feed, UserFeed
+from apps.feed.timeline import MemoryStorage, RedisStorage, timeline
 from apps.games.models import Collection, Game
 from apps.games.signals import collection_post_save
 from apps.users.models import UserGame
@@ -196,3 +203,123 @@ class UserReactionTransactionTestCase(FeedBaseTestCase, TransactionTestCase):
         self.assertEqual(feed['reactions'][2]['id'], self.reactions[3]['id'])
         self.assertEqual(feed['reactions'][2]['count'], 1)
         self.assertFalse(feed['reactions'][2]['selected'])
+
+
+class FeedTimelineTransactionTestCase(FeedBaseTestCase, TransactionTestCase):
+    def get_storage(self):
+        return MemoryStorage('timeline')
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch.object(timeline, 'storage', self.get_storage())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        actions = (Feed.ACTIONS_FOLLOW_USER, Feed.ACTIONS_POPULAR_GAMES, Feed.ACTIONS_MOST_RATED_GAMES)
+        languages = ('eng', 'rus', '-')
+        time = now()
+        self.feeds = Feed.objects.bulk_create([
+            Feed(
+                action=actions[i % 3], language=languages[i % 3], created=time - timedelta(days=i * 5),
+                data={'users': [self.user_1.id]},
+            )
+            for i in range(15)
+        ])
+        user_feeds = []
+        for i, feed in enumerate(self.feeds):
+            if i < 10:
+                user_feeds.append(UserFeed(user=self.user, feed=feed, created=feed.created, sources=['user']))
+            if i >= 6:
+                user_feeds.append(UserFeed(feed=feed, created=feed.created, sources=[UserFeed.SOURCES_COMMON]))
+        UserFeed.objects.bulk_create(user_feeds)
+
+    def get_explore(self, params, enabled=True):
+        with override_settings(FEED_TIMELINE=enabled):
+            return self.client_auth.get(self.explore, params).json()
+
+    def test_explore(self):
+        for params in (
+            {},
+            {'ordering': 'created'},
+            {'ordering': '-created'},
+            {'actions': '{},{}'.format(Feed.ACTIONS_FOLLOW_USER, Feed.ACTIONS_POPULAR_GAMES)},
+            {'actions': '{0},{0},unknown'.format(Feed.ACTIONS_POPULAR_GAMES)},
+            {'page': 2, 'page_size': 4},
+        ):
+            legacy = self.get_explore(params, False)
+            result = self.get_explore(params)
+            self.assertEqual(result['count'], legacy['count'])
+            self.assertEqual([item['id'] for item in result['results']], [item['id'] for item in legacy['results']])
+
+    def test_explore_cursor(self):
+        legacy = self.get_explore({'page_size': 20}, False)
+        result = self.get_explore({'cursor': '', 'page_size': 4})
+        self.assertEqual(result['count'], legacy['count'])
+        ids = [item['id'] for item in result['results']]
+        while result['next']:
+            with override_settings(FEED_TIMELINE=True):
+                result = self.client_auth.get(result['next']).json()
+            self.assertEqual(result['count'], legacy['count'])
+            ids += [item['id'] for item in result['results']]
+        self.assertEqual(ids, [item['id'] for item in legacy['results']])
+
+        with override_settings(FEED_TIMELINE=True):
+            self.assertEqual(self.client_auth.get(self.explore, {'cursor': 'invalid'}).status_code, 404)
+
+    def test_explore_user_feed(self):
+        # the user feed is shown instead of the shared one of the same feed even if it is older
+        UserFeed.objects.filter(user=None, feed__in=self.feeds[6:8]).update(created=now())
+        for params in ({'page_size': 20}, {'page_size': 20, 'ordering': '-created'}):
+            legacy = self.get_explore(params, False)
+            self.assertEqual(self.get_explore(params)['results'], legacy['results'])
+            result = self.get_explore(dict(params, cursor='', page_size=3))
+            results = result['results']
+            while result['next']:
+                with override_settings(FEED_TIMELINE=True):
+                    result = self.client_auth.get(result['next']).json()
+                results += result['results']
+            self.assertEqual(results, legacy['results'])
+
+    def test_explore_changes(self):
+        count = self.get_explore({})['count']
+
+        with override_settings(FEED_TIMELINE=True):
+            self.client_auth.post('/api/feed/{}/hide'.format(self.feeds[0].id))
+        result = self.get_explore({'page_size': 20})
+        self.assertEqual(result['count'], count - 1)
+        self.assertNotIn(self.feeds[0].id, [item['id'] for item in result['results']])
+
+        # the user feeds of the deleted feeds are removed from the timelines on the next read
+        self.feeds[1].delete()
+        self.assertNotIn(self.feeds[1].id, [item['id'] for item in self.get_explore({'page_size': 20})['results']])
+        self.assertEqual(self.get_explore({})['count'], count - 2)
+
+        # the deleted user feeds are removed from the timelines after the commit
+        with override_settings(FEED_TIMELINE=True):
+            UserFeed.objects.delete_source(UserFeed.SOURCES_USER, user=self.user, feed=self.feeds[2])
+        self.assertEqual(self.get_explore({})['count'], count - 3)
+
+        # the shared user feeds which are in the user timeline are counted once
+        with override_settings(FEED_TIMELINE=True):
+            UserFeed.objects.delete_source(UserFeed.SOURCES_COMMON, user=None, feed=self.feeds[7])
+            UserFeed.objects.delete_source(UserFeed.SOURCES_COMMON, user=None, feed=self.feeds[14])
+        self.assertEqual(self.get_explore({})['count'], count - 4)
+        self.assertEqual(self.get_explore({})['count'], self.get_explore({}, False)['count'])
+
+        # the user feeds of the feeds deleted in bulk are removed by their keys
+        with override_settings(FEED_TIMELINE=True):
+            delete_feeds(Feed.objects.filter(id=self.feeds[3].id))
+        self.assertEqual(self.get_explore({})['count'], count - 5)
+
+
+class FeedTimelineRedisTransactionTestCase(FeedTimelineTransactionTestCase):
+    # the same tests with the lua scripts of the redis storage
+    def get_storage(self):
+        self.redis_client = Redis.from_url(settings.REDIS_LOCATION)
+        return RedisStorage('tests.timeline', self.redis_client)
+
+    def tearDown(self):
+        keys = list(self.redis_client.scan_iter('feed.tests.timeline.*'))
+        if keys:
+            self.redis_client.delete(*keys)
+        super().tearDown()
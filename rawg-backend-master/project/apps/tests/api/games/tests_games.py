@@ -1,6 +1,7 @@
 import os
 from datetime import timedelta
 from random import shuffle
+from unittest.mock import patch
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 from django.apps import apps
@@ -10,9 +11,11 @@ from django.contrib.auth.models import AnonymousUser
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.core.management import call_command
+from django.db.models import F
 from django.test import Client, TestCase, TransactionTestCase
 from django.test.client import encode_multipart
 from django.utils.timezone import now
+from elasticsearch import Elasticsearch
 from haystack import connections as haystack_connections
 from modeltranslation.utils import get_language
 from rest_framework import status
@@ -25,6 +28,7 @@ from apps.achievements.models import Achievement, ParentAchievement
 from apps.common.models import CatalogFilter
 from apps.credits.models import GamePerson, Person, Position
 from apps.discussions.models import Discussion
+from apps.games import counters
 from apps.games.models import (Addition, Collection, CollectionGame, Featured, Game, GamePlatform, GameStore, Genre,
                                Platform, Recommended, ScreenShot, ScreenShotCount, Store, Tag)
 from apps.games.seo import games_auto_description
@@ -50,6 +54,31 @@ class GamesTestCase(GamesBaseTestCase, TestCase):
         with self.assertNumQueries(4):
             self.assertEqual(self.client.get('/api/games').status_code, 200)
 
+    def test_games_cursor(self):
+        # the dates differ only in microseconds, so the cursor must keep them
+        time = now().replace(microsecond=0)
+        for i, game in enumerate(Game.objects.order_by('?')):
+            Game.objects.filter(id=game.id).update(
+                created=time + timedelta(microseconds=i % 4), updated=time + timedelta(microseconds=i % 3 * 10)
+            )
+        for ordering in ('-added', 'released', '-rating', 'name', 'created', '-created', '-updated'):
+            field = ordering.lstrip('-')
+            expected = list(Game.objects.order_by(
+                F(field).desc(nulls_first=True) if ordering[0] == '-' else F(field).asc(nulls_last=True), '-id'
+            ).values_list('id', flat=True))
+            ids = []
+            url = '/api/games?{}'.format(urlencode({'ordering': ordering, 'page_size': 3, 'cursor': ''}))
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                self.assertIsNone(data['previous'])
+                ids += [game['id'] for game in data['results']]
+                url = data['next']
+            self.assertEqual(ids, expected)
+
+        self.assertEqual(self.client.get('/api/games', {'cursor': 'wrong'}).status_code, 404)
+
     def test_games_filter(self):
         games = Game.objects.all()[0:10]
         for i in range(0, 3):
@@ -102,6 +131,31 @@ class GamesTestCase(GamesBaseTestCase, TestCase):
             self.assertEqual(response_data_4['seo_description'], catalog_filter.description)
             self.assertEqual(response_data_4['seo_h1'], catalog_filter.name)
 
+    def test_games_filter_dates(self):
+        games = Game.objects.all()[0:4]
+        for i, game in enumerate(games):
+            game.released = now().replace(year=2018 if i % 2 else 2010)
+            game.save(update_fields=['released'])
+            GamePlatform.objects.create(game=game, platform_id=4)
+
+        with self.settings(**haystack_test_config(self.id())):
+            haystack_connections.reload('default')
+            call_command('update_index', 'games.game', remove=True, verbosity=0)
+
+            filter_by = {'platforms': 4, 'dates': '2018-01-01,2018-12-31', 'filter': 'true'}
+            with patch.object(Elasticsearch, 'search', autospec=True, side_effect=Elasticsearch.search) as search:
+                response = self.client.get('/api/games', filter_by)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['count'], 2)
+                self.assertEqual(search.call_count, 1)
+
+            with self.settings(GAMES_SEARCH_CACHE_TIMEOUT=60):
+                self.client.get('/api/games', dict(filter_by, ordering='-released'))
+                with patch.object(Elasticsearch, 'search', autospec=True, side_effect=Elasticsearch.search) as search:
+                    response = self.client.get('/api/games', dict(filter_by, ordering='-released'))
+                    self.assertEqual(response.json()['count'], 2)
+                    self.assertEqual(search.call_count, 0)
+
     def test_games_filter_persons(self):
         game = Game.objects.first()
         game.released = now()
@@ -1452,7 +1506,12 @@ class PlaysTestCase(APITestCase):
             response = self.client.post(self.increment_plays_url)
             self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.game.refresh_from_db()
+        self.assertEqual(self.game.plays, plays)
+        self.assertEqual(self.client.get(self.get_game_url).json()['plays'], plays + 10)
+        counters.plays.flush()
+        self.game.refresh_from_db()
         self.assertEqual(self.game.plays, plays + 10)
+        self.assertEqual(self.client.get(self.get_game_url).json()['plays'], plays + 10)
 
     def test_auth(self):
         plays = self.game.plays
@@ -1460,6 +1519,7 @@ class PlaysTestCase(APITestCase):
         for i in range(10):
             response = self.client.post(self.increment_plays_url)
             self.assertEqual(response.status_code, status.HTTP_200_OK)
+        counters.plays.flush()
         self.game.refresh_from_db()
         self.assertEqual(self.game.plays, plays + 10)
 
@@ -1468,3 +1528,4 @@ class PlaysTestCase(APITestCase):
         url = reverse('api:game_plays', kwargs={'game_id': pk})
         response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(counters.plays.flush(), 0)
@@ -26,6 +26,7 @@ from apps.merger.tasks import STORES
 from apps.reviews.models import Review
 from apps.stat.models import APIUserCounter
 from apps.users.models import UserGame, PlayerBase, AuthenticatedPlayer, AnonymousPlayer
+from apps.utils import api_limits
 from apps.utils.tests import APITestCase, APITransactionTestCase
 
 
@@ -1329,10 +1330,12 @@ class UserTestCase(UsersBaseTestCase, APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()['count'], settings.API_LIMITS[settings.API_GROUP_FREE] - 123)
 
-        # db counter + local counter
+        # db counter + pending counter
 
-        from apps.utils.middlewares import _api_counter
-        _api_counter[self.user.id] = 2
+        date_from = self.user.api_dates[0]
+        limit = settings.API_LIMITS[settings.API_GROUP_FREE]
+        api_limits.limiter.hit(self.user.id, limit, date_from)
+        api_limits.limiter.hit(self.user.id, limit, date_from)
         response = self.client_auth.get(action_url)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()['count'], settings.API_LIMITS[settings.API_GROUP_FREE] - 123)
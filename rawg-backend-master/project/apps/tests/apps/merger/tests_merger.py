@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from shutil import copyfile
 
@@ -12,9 +13,11 @@ from django.utils.timezone import now
 from apps.achievements.models import Achievement, ParentAchievement, UserAchievement
 from apps.feed.models import Feed
 from apps.games.models import (
-    Collection, CollectionGame, CollectionOffer, ESRBRating, Game, GameStore, Platform, ScreenShot, Store, Tag,
+    Collection, CollectionGame, CollectionOffer, Developer, ESRBRating, Game, GameStore, Platform, ScreenShot, Store,
+    Tag,
 )
-from apps.merger.merger import create_store, find_game, generate_tags, merge, update
+from apps.merger import synonyms
+from apps.merger.merger import create_store, find_game, generate_tags, get_related, merge, update
 from apps.merger.models import MergedSlug, Network, SimilarGame
 from apps.reviews.models import Review
 from apps.users.models import UserGame
@@ -48,6 +51,23 @@ class MergerTestCase(MergerBaseTestCase, TestCase):
         self.assertTrue(created)
         self.assertEqual(add_similar, [])
 
+    def test_find_game_similar_index(self):
+        first = Game.objects.create(name='The Witcher 3: Wild Hunt', synonyms=['the witcher 3: wild hunt'])
+        second = Game.objects.create(name='Another game', synonyms=['another game'])
+        store, similar_list = create_store('steam', ['pc'])
+        self.assertEqual(
+            {pk for pk, _ in similar_list.candidates('The Witcher 3 - Wild Hunt')},
+            {pk for pk, name in similar_list if SimilarGame.check_games(pk, name, 0, 'The Witcher 3 - Wild Hunt')},
+        )
+
+        game, created, add_similar = find_game(
+            {'name': 'The Witcher 3 - Wild Hunt', 'url': 'http://example.com'}, similar_list, store=store
+        )
+        self.assertTrue(created)
+        self.assertEqual(add_similar, [(first.id, game.id)])
+        self.assertNotIn(game.id, dict(similar_list))
+        self.assertIn(second.id, dict(similar_list))
+
     def test_find_game_years(self):
         released = now()
         base_game = Game.objects.create(name='My game', synonyms=['my game'], released=released)
@@ -68,6 +88,27 @@ class MergerTestCase(MergerBaseTestCase, TestCase):
         self.assertNotEqual(game.name, 'My game 3 ({})'.format(released.year))
         self.assertFalse(created)
 
+    def test_synonym_index(self):
+        game = Game.objects.create(name='My game', synonyms=['my game'])
+        developer = Developer.objects.create(name='Valve', synonyms=['valve'])
+
+        with synonyms.use(synonyms.SynonymIndex().load()) as index:
+            with self.assertNumQueries(1):
+                self.assertEqual(find_game({'name': 'My Game'}, [])[0], game)
+            with self.assertNumQueries(1):
+                self.assertEqual(set(get_related(['VALVE'], Developer)), {developer})
+            with self.assertNumQueries(0):
+                self.assertEqual(set(get_related(['valve'], Developer)), {developer})
+            new_developer, = get_related(['Valve Corporation'], Developer)
+            self.assertEqual(index.find(Developer, 'valve corporation'), [new_developer])
+
+            with tempfile.TemporaryDirectory() as path:
+                index.dump(path)
+                snapshot = synonyms.SynonymIndex(path)
+                self.assertEqual(snapshot.pks(Game, 'my game'), {game.id})
+                self.assertEqual(snapshot.find(Developer, 'Valve Corporation'), [new_developer])
+                self.assertEqual(snapshot.pks(Developer, 'unknown'), set())
+
     def test_find_game_years_empty(self):
         base_game = Game.objects.create(name='My game', synonyms=['my game'])
         game, created, _ = find_game({'name': 'My game'}, [])
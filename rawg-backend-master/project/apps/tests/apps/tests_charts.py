@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.timezone import now, timedelta
+
+from apps.charts.models import GameGenre, GameToPlay
+from apps.games.models import Game, Genre
+from apps.users.models import UserGame
+from apps.utils.dates import monday
+
+
+class ChartsTestCase(TestCase):
+    def setUp(self):
+        self.week = monday(now())
+        self.users = [
+            get_user_model().objects.create(username='user{}'.format(i), email='user{}@test.org'.format(i))
+            for i in range(3)
+        ]
+        self.genre = Genre.objects.create(name='Action', hidden=False)
+        self.games = [Game.objects.create(name='Game {}'.format(i)) for i in range(3)]
+        for game in self.games:
+            game.genres.add(self.genre)
+
+    def add(self, user, game, weeks_ago):
+        user_game = UserGame.objects.create(user=user, game=game, status=UserGame.STATUS_TOPLAY)
+        date = self.week - timedelta(days=7 * weeks_ago - 1)
+        UserGame.objects.filter(id=user_game.id).update(added=date, created=date)
+
+    def test_rebuild(self):
+        self.add(self.users[0], self.games[0], 2)
+        self.add(self.users[0], self.games[1], 1)
+        self.add(self.users[1], self.games[1], 1)
+        self.add(self.users[2], self.games[2], 0)
+
+        self.assertEqual(GameToPlay.rebuild(), 3)
+
+        weeks = dict(GameToPlay.objects.values_list('week', 'game_id').filter(position=0))
+        self.assertEqual(weeks[self.week - timedelta(days=7)], self.games[0].id)
+        self.assertEqual(weeks[self.week], self.games[1].id)
+        self.assertEqual(
+            list(GameToPlay.objects.filter(week=self.week).values_list('game_id', 'count').order_by('position')),
+            [(self.games[1].id, 2), (self.games[0].id, 1)],
+        )
+        self.assertEqual(Game.objects.get(id=self.games[0].id).charts, {'toplay': 1})
+
+    def test_update_charts(self):
+        self.add(self.users[0], self.games[0], 1)
+        self.add(self.users[0], self.games[1], 1)
+        self.add(self.users[1], self.games[1], 0)
+        Game.objects.filter(id=self.games[1].id).update(charts={'genre': {str(self.genre.id): [1, 'new']}})
+
+        call_command('update_charts')
+
+        self.assertEqual(GameGenre.objects.filter(week=self.week, genre=self.genre).count(), 2)
+        self.assertEqual(Game.objects.get(id=self.games[0].id).charts['genre'], {str(self.genre.id): [1, 'new']})
+        charts = Game.objects.get(id=self.games[1].id).charts
+        self.assertEqual(charts['genre'], {str(self.genre.id): [0, 'up']})
+        self.assertEqual(charts['toplay'], 0)
@@ -1,11 +1,12 @@
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
 from django.db import transaction
 from django.test import TransactionTestCase
 
 from apps.common.cache import CommonContentType
 from apps.feed.feed import followed_user
-from apps.feed.models import Feed, FeedQueue, UserNotifyFeed
+from apps.feed.models import Feed, FeedQueue, UserFeed, UserNotifyFeed
 from apps.games.models import Collection, CollectionFeed, CollectionGame, Game
 from apps.users.models import UserFollowElement, UserGame
 
@@ -166,3 +167,71 @@ class TasksTestCase(TransactionTestCase):
 
         self.assertRaises(CollectionFeed.DoesNotExist, lambda: CollectionFeed.objects.get(id=collection_feed_1))
         self.assertRaises(Feed.DoesNotExist, lambda: Feed.objects.get(id=feed1))
+
+    def test_feed_batch(self):
+        languages = [
+            FeedQueue.objects.create(
+                object_id=0, content_type=CommonContentType().get(Feed),
+                action=FeedQueue.LANGUAGE, data={'id': 0, 'language': 'eng'}
+            ).id
+            for _ in range(3)
+        ]
+        missed = FeedQueue.objects.create(
+            object_id=0, content_type=CommonContentType().get(UserGame),
+            action=FeedQueue.ADDITION, data={}
+        ).id
+
+        call_command('feed', batch=10, workers=2)
+
+        self.assertEqual(
+            list(FeedQueue.objects.filter(id__in=languages).values_list('status', flat=True)),
+            [FeedQueue.EMPTY] * 3
+        )
+        self.assertFalse(FeedQueue.objects.filter(id=missed).exists())
+
+    def test_create_user_feeds(self):
+        user = get_user_model().objects.get_or_create(username='curt', email='curt@test.org')[0]
+        follower = get_user_model().objects.get_or_create(username='nick', email='nick@test.org')[0]
+        follow = get_user_model().objects.get_or_create(username='warren', email='warren@test.org')[0]
+        for follower_id in (follower.id, follow.id):
+            UserFollowElement.objects.create(
+                user_id=follower_id, object_id=user.id, content_type=CommonContentType().get(get_user_model())
+            )
+        queue = FeedQueue.objects.create(object_id=user.id,
+                                         content_type=ContentType.objects.get_for_model(user),
+                                         action=FeedQueue.ADDITION, data={})
+        with transaction.atomic():
+            feed = Feed.objects.create_followed_user(user.id, follow.id, queue)
+
+        UserFeed.objects.create_from_feed(feed)
+        UserFeed.objects.create_user_feeds(feed, [(UserFeed.SOURCES_COLLECTION, [follower.id, follow.id])])
+
+        self.assertEqual(
+            sorted(UserFeed.objects.get(user=follower, feed=feed).sources),
+            [UserFeed.SOURCES_COLLECTION, UserFeed.SOURCES_USER]
+        )
+        self.assertEqual(UserFeed.objects.get(user=user, feed=feed).sources, [UserFeed.SOURCES_USER])
+        self.assertFalse(UserFeed.objects.filter(user=follow, feed=feed).exists())
+
+    def test_delete_source(self):
+        user = get_user_model().objects.get_or_create(username='curt', email='curt@test.org')[0]
+        follow = get_user_model().objects.get_or_create(username='nick', email='nick@test.org')[0]
+        feed1 = Feed.objects.create(user=follow, action=Feed.ACTIONS_CREATE_COLLECTION, data={'collections': [0]})
+        feed2 = Feed.objects.create(user=follow, action=Feed.ACTIONS_CREATE_COLLECTION, data={'collections': [1]})
+        feed3 = Feed.objects.create(user=user, action=Feed.ACTIONS_CREATE_COLLECTION, data={'collections': [2]})
+        UserFeed.objects.filter(user=user).delete()
+        UserFeed.objects.create(
+            user=user, feed=feed1, sources=[UserFeed.SOURCES_USER, UserFeed.SOURCES_GAME], created=feed1.created
+        )
+        UserFeed.objects.create(user=user, feed=feed2, sources=[UserFeed.SOURCES_USER], created=feed2.created)
+        UserFeed.objects.create(user=user, feed=feed3, sources=[UserFeed.SOURCES_USER], created=feed3.created)
+        feed4 = Feed.objects.create(user=follow, action=Feed.ACTIONS_CREATE_COLLECTION, data={'collections': [3]})
+        UserFeed.objects.filter(user=user, feed=feed4).delete()
+        UserFeed.objects.create(user=user, feed=feed4, sources=[], created=feed4.created)
+
+        UserFeed.objects.delete_source(UserFeed.SOURCES_USER, user_id=user.id, feed__user_id=follow.id)
+
+        self.assertEqual(UserFeed.objects.get(user=user, feed=feed1).sources, [UserFeed.SOURCES_GAME])
+        self.assertFalse(UserFeed.objects.filter(user=user, feed=feed2).exists())
+        self.assertEqual(UserFeed.objects.get(user=user, feed=feed3).sources, [UserFeed.SOURCES_USER])
+        self.assertEqual(UserFeed.objects.get(user=user, feed=feed4).sources, [])
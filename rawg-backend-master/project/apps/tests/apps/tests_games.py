@@ -9,7 +9,10 @@ from django.db.models import Model
 from django.test import TestCase, TransactionTestCase
 
 from apps.games.esrb import ESRBConverter
-from apps.games.models import Collection, CollectionFeed, CollectionGame, ESRBRating, Game, InGameNewsBase, MadWorldNews
+from apps.games.models import (
+    Collection, CollectionFeed, CollectionGame, ESRBRating, Game, InGameNewsBase, MadWorldNews, ScreenShot,
+)
+from apps.games.tasks import denormalize_game, update_game, update_game_denormalized, update_games
 from apps.users.models import UserGame
 
 
@@ -35,13 +38,97 @@ class GameTransactionTestCase(TransactionTestCase):
         UserGame.objects.create(game=game, user=user_2, playtime=7256)
         UserGame.objects.create(game=game, user=user_3, playtime=120340)
 
-        self.assertEqual(Game.objects.get(id=game.id).playtime, 34)
+        self.assertEqual(Game.objects.get(id=game.id).playtime, 3)
 
         self.assertIsNotNone(Game.objects.get(id=game.id).synonyms)
 
         UserGame.objects.create(game=game, user=user_4, playtime=85241)
 
-        self.assertEqual(Game.objects.get(id=game.id).playtime, 24)
+        self.assertEqual(Game.objects.get(id=game.id).playtime, 3)
+
+    def test_playtime_median(self):
+        # the median is the lower one of the two middle values for an even count, the zero playtimes are skipped
+        game = Game.objects.create(name='Game')
+        users = [
+            get_user_model().objects.create(username='test{}'.format(i), email='test{}@test.io'.format(i))
+            for i in range(5)
+        ]
+        UserGame.objects.create(game=game, user=users[0], playtime=3600)
+        UserGame.objects.create(game=game, user=users[1], playtime=0)
+        UserGame.objects.create(game=game, user=users[2], playtime=36000)
+
+        self.assertEqual(Game.objects.get(id=game.id).playtime, 1)
+
+        UserGame.objects.create(game=game, user=users[3], playtime=18000)
+
+        self.assertEqual(Game.objects.get(id=game.id).playtime, 5)
+
+        UserGame.objects.create(game=game, user=users[4], playtime=7200)
+
+        self.assertEqual(Game.objects.get(id=game.id).playtime, 2)
+
+    def test_playtime_without_user_games(self):
+        game = Game.objects.create(name='Game')
+        user = get_user_model().objects.create(username='test', email='test@test.io')
+        UserGame.objects.create(game=game, user=user, playtime=7200)
+
+        self.assertEqual(Game.objects.get(id=game.id).playtime, 2)
+
+        UserGame.objects.filter(game=game).delete()
+        update_game(game.id, True)
+
+        game = Game.objects.get(id=game.id)
+        self.assertEqual(game.playtime, 0)
+        self.assertEqual(game.added, 0)
+
+    def test_update_games(self):
+        games = [Game.objects.create(name='Game {}'.format(i)) for i in range(2)]
+        users = [
+            get_user_model().objects.create(username='test{}'.format(i), email='test{}@test.io'.format(i))
+            for i in range(7)
+        ]
+        for user in users:
+            UserGame.objects.create(game=games[0], user=user, status=UserGame.STATUS_BEATEN, playtime=3600)
+        UserGame.objects.create(game=games[1], user=users[0], status=UserGame.STATUS_TOPLAY, playtime=7200)
+        UserGame.objects.create(game=games[1], user=users[1], hidden=True)
+        Game.objects.filter(id__in=[game.id for game in games]).update(
+            added=0, added_by_status=None, users=None, playtime=0
+        )
+
+        update_games([game.id for game in games], [games[1].id])
+
+        game = Game.objects.get(id=games[0].id)
+        self.assertEqual(game.added, 7)
+        self.assertEqual(game.added_by_status, {UserGame.STATUS_BEATEN: 7})
+        self.assertEqual(game.users['added']['count'], 7)
+        self.assertEqual(game.users['added']['last'], [user.id for user in reversed(users)][0:5])
+        self.assertEqual(game.users[UserGame.STATUS_BEATEN]['count'], 7)
+        self.assertEqual(game.users[UserGame.STATUS_OWNED], {'count': 0, 'last': []})
+        self.assertEqual(game.playtime, 0)
+        game = Game.objects.get(id=games[1].id)
+        self.assertEqual(game.added, 1)
+        self.assertEqual(game.added_by_status, {UserGame.STATUS_TOPLAY: 1})
+        self.assertEqual(game.users[UserGame.STATUS_TOPLAY], {'count': 1, 'last': [users[0].id]})
+        self.assertEqual(game.playtime, 2)
+
+    def test_denormalize_game(self):
+        game = Game.objects.create(name='Game')
+        ScreenShot.objects.create(game=game, source='http://example.com/1.jpg')
+        ScreenShot.objects.create(game=game, source='http://example.com/2.jpg')
+
+        self.assertEqual(Game.objects.get(id=game.id).screenshots_count, 2)
+
+        Game.objects.filter(id=game.id).update(screenshots_count=0, screenshots_json=None)
+        with mock.patch.object(update_game_denormalized, 'apply_async') as mocked_apply_async:
+            denormalize_game(game.id, totals=['screenshots'])
+            denormalize_game(game.id, fields=['screenshots'])
+            denormalize_game(game.id, totals=['movies'], fields=['screenshots'])
+        self.assertEqual(mocked_apply_async.call_count, 1)
+
+        update_game_denormalized(game.id)
+        game = Game.objects.get(id=game.id)
+        self.assertEqual(game.screenshots_count, 2)
+        self.assertIsNotNone(game.screenshots_json)
 
 
 class CollectionFeedTestCase(TestCase):
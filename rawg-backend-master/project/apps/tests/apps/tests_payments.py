@@ -1,21 +1,28 @@
 import datetime
-from collections import OrderedDict, namedtuple
+from collections import Counter, OrderedDict, namedtuple
 from datetime import date, datetime as dt
 from functools import reduce
+from time import time
 from unittest.mock import patch
 
+import responses
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.utils.timezone import make_aware
+from requests.exceptions import RequestException
 from transitions.core import MachineError
 
 from apps.games.models import Game, PlayerGameSession
+from apps.payments import delivery
+from apps.payments.tasks import send_payment_to_game
 from apps.payments.models import CanceledEvent, CreatedEvent, ErrorEvent, LLPConfig, LoginsLoyaltyProgram, PaidEvent, \
     Payment, PaymentConfirmedEvent, PaymentProject, PendingEvent, RefundConfirmedEvent, RefundedEvent
 from apps.payments.utils import Constants
 from apps.stat.models import Visit
 from apps.users.models import Balance
-from apps.utils.tests import changed_date
+from apps.utils.payments import UkassaPaymentSynchronizer
+from apps.utils.tests import changed_date, fake_http_server
 
 LOGINS_VARIATION = namedtuple('logins_variation', ['logins', 'full_bonus', 'hot_streak_days', 'saved_days'])
 
@@ -130,6 +137,112 @@ class PaymentEventTestCase(TestCase):
                         patched_on_exception.assert_called_once()
 
 
+class SynchronizerTestCase(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create(username='gamer', email='gamer@test.com')
+        game = Game.objects.create(name='Worms 3D')
+        session = PlayerGameSession.objects.create(player=user, game=game)
+        PaymentProject.objects.create(game=game, id=200, secret_key='key', payment_system_name=Payment.UKASSA)
+        for i in range(3):
+            payment = Payment.objects.create(game_session=session, game=game, player=user)
+            CreatedEvent.objects.create(payment=payment, data={})
+            PendingEvent.objects.create(payment=payment, data={'payment_system_name': Payment.UKASSA, 'id': f'tx-{i}'})
+        self.requests = Counter()
+
+    def handle(self, path, query):
+        self.requests[path] += 1
+        transaction_id = path.split('/')[-1]
+        if transaction_id == 'tx-0' and self.requests[path] == 1:
+            return 429, {'Retry-After': '0'}, {}
+        if transaction_id == 'tx-2':
+            return 500, {}, {}
+        return 200, {}, {'id': transaction_id, 'status': 'succeeded', 'payment_method': {'type': 'bank_card'}}
+
+    def test_sync(self):
+        with fake_http_server(self.handle) as url:
+            synchronizer = type('Synchronizer', (UkassaPaymentSynchronizer,), {'BASE_URL': f'{url}payments/'})()
+            payments = list(Payment.objects.order_by('id'))
+
+            results = synchronizer.sync(payments)
+            self.assertEqual(
+                [tuple(results[payment]) for payment in payments],
+                [(True, None), (True, None), (False, 'Unknown error from ukassa')],
+            )
+            self.assertEqual(self.requests['/payments/tx-0'], 2)
+            self.assertEqual(PaidEvent.objects.filter(payment__in=payments).count(), 2)
+
+            results = synchronizer.sync(payments, concurrent=False)
+            self.assertEqual(list(results), [payments[2]])
+            self.assertEqual(tuple(results[payments[2]]), (False, 'Unknown error from ukassa'))
+
+    def test_session_pool_size(self):
+        adapter = UkassaPaymentSynchronizer(max_workers=32).session.get_adapter('https://')
+        self.assertEqual(adapter._pool_maxsize, 32)
+        adapter = UkassaPaymentSynchronizer().session.get_adapter('https://')
+        self.assertEqual(adapter._pool_maxsize, UkassaPaymentSynchronizer.MAX_WORKERS)
+
+
+class DeliveryTestCase(TestCase):
+    url = 'https://game-delivery.test/payments'
+    host = 'game-delivery.test'
+
+    def setUp(self):
+        cache.delete_many([
+            delivery.FAILURES_KEY.format(self.host), delivery.OPEN_KEY.format(self.host),
+            delivery.PROBE_KEY.format(self.host),
+        ])
+
+    @responses.activate
+    @override_settings(PAYMENTS_DELIVERY_BREAKER_FAILURES=2)
+    def test_circuit_breaker(self):
+        responses.post(self.url, status=500)
+        for _ in range(2):
+            with self.assertRaises(RequestException):
+                delivery.post(self.url, json={})
+        with self.assertRaises(delivery.Parked):
+            delivery.post(self.url, json={})
+        responses.assert_call_count(self.url, 2)
+
+        # the breaker timeout is over, one probe delivery is let through and it fails again
+        cache.delete(delivery.OPEN_KEY.format(self.host))
+        cache.add(delivery.PROBE_KEY.format(self.host), 1)
+        with self.assertRaises(delivery.Parked) as parked:
+            delivery.post(self.url, json={})
+        self.assertGreaterEqual(parked.exception.countdown, delivery.PROBE_TIMEOUT)
+        cache.delete(delivery.PROBE_KEY.format(self.host))
+        with self.assertRaises(RequestException):
+            delivery.post(self.url, json={})
+        self.assertIsNotNone(cache.get(delivery.OPEN_KEY.format(self.host)))
+        responses.assert_call_count(self.url, 3)
+
+        cache.delete(delivery.OPEN_KEY.format(self.host))
+        responses.replace(responses.POST, self.url, status=200)
+        delivery.post(self.url, json={})
+        self.assertIsNone(cache.get(delivery.FAILURES_KEY.format(self.host)))
+        self.assertIsNone(cache.get(delivery.PROBE_KEY.format(self.host)))
+
+    @override_settings(PAYMENTS_DELIVERY_CONCURRENCY=1)
+    def test_slot(self):
+        with delivery.slot(1, 'first'):
+            with self.assertRaises(delivery.Parked):
+                with delivery.slot(1, 'second'):
+                    pass
+            with delivery.slot(2, 'another game'):
+                pass
+        with delivery.slot(1, 'third'):
+            pass
+
+    def test_deadline(self):
+        # the deadline is set once, the autoretries repeat the arguments of the first task
+        with patch.object(send_payment_to_game, 'apply_async') as apply_async:
+            send_payment_to_game(1)
+        deadline = apply_async.call_args[0][1]['deadline']
+        self.assertAlmostEqual(deadline, time() + 24 * 60 * 60, delta=60)
+
+        with self.assertNumQueries(0):
+            send_payment_to_game(1, deadline=time() - 1)
+
+
 class LoginLoyaltyProgramTestCase(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -1,6 +1,13 @@
+import reversion
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase
 from django.urls import reverse
+from django.utils.timezone import now
+from reversion.models import Revision
+
+from apps.games.models import Game
+from apps.stat.models import EditingCounter
+from apps.utils.dates import first_day_of_month
 
 
 class ViewsTestCase(TestCase):
@@ -85,3 +92,38 @@ class ViewsTestCase(TestCase):
     def test_api_user(self):
         get = self.client.get(reverse('stat:api_user'))
         self.assertEqual(get.status_code, 200)
+
+
+class EditingCounterTestCase(TestCase):
+    def test_counters(self):
+        users = [
+            get_user_model().objects.create(username='test{}'.format(i), email='test{}@test.io'.format(i))
+            for i in range(2)
+        ]
+        game = Game.objects.create(name='Game')
+        for i, user in enumerate(users * 2 + users[0:1]):
+            with reversion.create_revision():
+                game.name = 'Game {}'.format(i)
+                game.save()
+                reversion.set_user(user)
+        month = first_day_of_month(now()).date()
+        self.assertEqual(
+            list(EditingCounter.objects.filter(month=month).values_list('user_id', 'count')),
+            [(users[0].id, 3), (users[1].id, 2)],
+        )
+
+        Revision.objects.filter(user=users[0]).first().delete()
+        self.assertEqual(EditingCounter.objects.get(user=users[0], month=month).count, 2)
+
+        EditingCounter.objects.all().delete()
+        EditingCounter.rebuild()
+        self.assertEqual(
+            list(EditingCounter.objects.filter(month=month).values_list('user_id', 'count')),
+            [(users[0].id, 2), (users[1].id, 2)],
+        )
+
+        self.client.force_login(users[1])
+        response = self.client.get(reverse('api:leaderboard-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['user']['id'] for row in response.json()['results']], [users[0].id, users[1].id])
+        self.assertEqual([row['position'] for row in response.json()['results']], [1, 2])
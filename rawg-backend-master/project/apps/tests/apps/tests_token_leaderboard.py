@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase
+from django.utils.timezone import now
+
+from apps.token.models import Cycle, CycleUser, leaderboard
+from apps.token.tasks import update_yesterday_position
+
+
+class LeaderboardTestCase(TransactionTestCase):
+    def setUp(self):
+        self.cycle = Cycle.objects.create(start=now() - timedelta(days=1), end=now() + timedelta(weeks=2))
+        Cycle.objects.filter(id=self.cycle.id).update(status=Cycle.STATUS_ACTIVE)
+        leaderboard.drop(self.cycle.id)
+        self.users = [
+            get_user_model().objects.create(username='user{}'.format(i), email='user{}@test.io'.format(i))
+            for i in range(4)
+        ]
+        super().setUp()
+
+    def tearDown(self):
+        leaderboard.drop(self.cycle.id)
+        super().tearDown()
+
+    def test_cycle_user_changes(self):
+        CycleUser.objects.create(cycle=self.cycle, user=self.users[0], karma=5)
+        CycleUser.objects.create(cycle=self.cycle, user=self.users[1], karma=10)
+        self.assertEqual(leaderboard.count(self.cycle.id), 2)
+
+        cycle_user = CycleUser.objects.create(cycle=self.cycle, user=self.users[2], karma=7)
+        self.assertEqual(leaderboard.position(self.cycle.id, self.users[2].id), 2)
+        self.assertEqual(CycleUser.objects.get(id=cycle_user.id).position, 2)
+
+        cycle_user.karma = 20
+        cycle_user.save()
+        self.assertEqual(leaderboard.position(self.cycle.id, self.users[2].id), 1)
+        self.assertEqual(leaderboard.sum(self.cycle.id), 35)
+
+        # the deletes are bulk ones, the board is dropped and is loaded again on the next read
+        CycleUser.objects.filter(id=cycle_user.id).delete()
+        leaderboard.drop(self.cycle.id)
+        self.assertIsNone(leaderboard.position(self.cycle.id, self.users[2].id))
+        self.assertEqual(CycleUser.objects.get(user=self.users[0]).position, 2)
+
+    def test_update_yesterday_position(self):
+        for user, karma in zip(self.users, (5, 10, 0, 10)):
+            CycleUser.objects.create(cycle=self.cycle, user=user, karma=karma)
+        self.assertEqual(leaderboard.total(self.cycle.id), 3)
+
+        update_yesterday_position()
+
+        # the users with the same karma are ordered by the id
+        positions = {self.users[1].id: 1, self.users[3].id: 2, self.users[0].id: 3, self.users[2].id: 4}
+        self.assertEqual(
+            dict(CycleUser.objects.filter(cycle=self.cycle).values_list('user_id', 'position_yesterday')),
+            positions,
+        )
+        for cycle_user in CycleUser.objects.filter(cycle=self.cycle):
+            self.assertEqual(cycle_user.position, positions[cycle_user.user_id])
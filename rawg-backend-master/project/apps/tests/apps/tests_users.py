@@ -10,7 +10,8 @@ from django.core.exceptions import ValidationError
 from django.test import TestCase, tag
 
 from apps.common.cache import CommonContentType
-from apps.games.models import Collection, Game, GamePlatform, Platform
+from apps.games.models import Collection, Game, GamePlatform, Genre, Platform
+from apps.users import statistics
 from apps.users.adapter import CustomAccountAdapter
 from apps.users.models import AuthenticatedPlayer, UserFollowElement, UserGame
 from apps.utils.lang import fake_request_by_language
@@ -130,6 +131,105 @@ class ModelsTestCase(TestCase):
 
         self.assertEqual(len(user.get_sitemap_paths(get_user_model().get_sitemap_additional_data(), lang)), 4)
 
+    def test_statistics_counters(self):
+        user = get_user_model().objects.create(username='kan', email='kan@test.org')
+        platform = Platform.objects.get(slug='macos')
+        games = [Game.objects.create(name='Game {}'.format(i)) for i in range(3)]
+        for game in games:
+            GamePlatform.objects.create(game=game, platform=platform)
+            UserGame.objects.create(user=user, game=game, status=UserGame.STATUS_BEATEN).platforms.add(platform)
+
+        user.set_statistics(['game'])
+        self.assertEqual(user.games_count, 3)
+        self.assertEqual(user.statistics['games_statuses'][UserGame.STATUS_BEATEN], 3)
+        self.assertEqual(user.statistics['games_platforms'][0]['count'], 3)
+
+        UserGame.objects.filter(user=user, game=games[0]).update(status=UserGame.STATUS_TOPLAY)
+        UserGame.objects.filter(user=user, game=games[1]).delete()
+        statistics.mark(user.id, [games[0].id, games[1].id])
+        user.set_statistics(['game'])
+        self.assertEqual(user.games_count, 2)
+        self.assertEqual(user.statistics['games_statuses'][UserGame.STATUS_BEATEN], 1)
+        self.assertEqual(user.statistics['games_statuses'][UserGame.STATUS_TOPLAY], 1)
+        self.assertEqual(user.statistics['games_platforms'][0]['count'], 1)
+        self.assertEqual(user.statistics['games_platforms_to_play'][0]['count'], 1)
+
+        counters = statistics.counters(user.id)
+        statistics.rebuild(user.id)
+        self.assertEqual(statistics.counters(user.id), counters)
+
+    def test_statistics_game_changes(self):
+        users = [
+            get_user_model().objects.create(username='user{}'.format(i), email='user{}@test.org'.format(i))
+            for i in range(2)
+        ]
+        game = Game.objects.create(name='Game')
+        for user in users:
+            UserGame.objects.create(user=user, game=game, status=UserGame.STATUS_BEATEN)
+            statistics.update(user.id)
+        genre = Genre.objects.create(name='Arcade')
+
+        game.genres.add(genre)
+        statistics.mark_games([game.id])
+        for user in users:
+            self.assertEqual(statistics.update(user.id)['genre'], {genre.id: 1})
+
+    def test_game_sets(self):
+        users = [
+            get_user_model().objects.create(username='user{}'.format(i), email='user{}@test.org'.format(i))
+            for i in range(3)
+        ]
+        games = [Game.objects.create(name='Game {}'.format(i)) for i in range(4)]
+        for game in games:
+            UserGame.objects.create(user=users[0], game=game)
+        UserGame.objects.create(user=users[1], game=games[0])
+        UserGame.objects.create(user=users[1], game=games[1])
+        UserGame.objects.create(user=users[2], game=games[3])
+
+        compatibility = users[0].get_compatibility_many([users[1].id, users[2].id])
+        self.assertEqual(compatibility[users[1].id], {'percent': 50, 'label': 'middle'})
+        self.assertEqual(compatibility[users[2].id], {'percent': 25, 'label': 'low'})
+        similar = users[0].get_similar_games_many([users[1].id, users[2].id], count=1)
+        self.assertEqual(len(similar[users[1].id]), 1)
+        self.assertIn(similar[users[1].id][0]['id'], (games[0].id, games[1].id))
+        self.assertEqual(similar[users[2].id], [{'id': games[3].id, 'slug': games[3].slug, 'name': games[3].name}])
+
+        UserGame.objects.filter(user=users[2]).delete()
+        self.assertEqual(users[0].get_compatibility(users[2].id)['percent'], 0)
+        self.assertEqual(users[0].get_similar_games(users[2].id), [])
+
+    def test_create_user_games(self):
+        user = get_user_model().objects.create(username='user', email='user@test.org')
+        pc = Platform.objects.create(name='PC')
+        mac = Platform.objects.create(name='macOS')
+        games = [Game.objects.create(name='Game {}'.format(i)) for i in range(3)]
+        for game in games:
+            GamePlatform.objects.create(game=game, platform=pc)
+            GamePlatform.objects.create(game=game, platform=mac)
+        UserGame.objects.create(user=user, game=games[0])
+
+        user_games = UserGame.create_user_games(user, [
+            (games[0].id, [mac.slug], 60, None),
+            (games[1].id, [mac.slug, pc.slug], 120, None),
+            (games[2].id, ['unknown', pc.slug], 0, None),
+        ], store_slug='steam')
+        self.assertEqual(len(user_games), 3)
+        self.assertEqual(UserGame.objects.filter(user=user).count(), 3)
+        self.assertEqual(UserGame.objects.filter(user=user, is_imported=True).count(), 2)
+        self.assertEqual(UserGame.objects.get(user=user, game=games[1]).playtime, 120)
+        self.assertEqual(
+            list(UserGame.objects.get(user=user, game=games[1]).platforms.values_list('id', flat=True)),
+            [mac.id],
+        )
+        self.assertEqual(
+            list(UserGame.objects.get(user=user, game=games[2]).platforms.values_list('id', flat=True)),
+            [pc.id],
+        )
+
+        user_games = UserGame.create_user_games(user, [(games[1].id, [mac.slug], 180, None)], True, 'steam')
+        self.assertEqual(user_games, [])
+        self.assertEqual(UserGame.objects.get(user=user, game=games[1]).playtime, 120)
+
 
 class PlayerTestCase(TestCase):
     def test_player_get_by_id(self):
@@ -13,10 +13,14 @@ from redis import Redis
 from rest_framework.reverse import reverse
 
 from apps.games.models import Game, Platform, Tag, generate_game_sid
+from apps.stat.models import APIUserCounter
 from apps.users.models import AuthenticatedPlayer, PlayerBase
+from apps.utils.api_limits import ApiLimiter, MemoryStorage
+from apps.utils.cache import Job, LocalCache, local_cache
 from apps.utils.game_session import CommonPlayerGameSessionData, DatabaseStorage, PlayerGameSessionController, \
     RedisStorage
 from apps.utils.images import DEFAULT_COLOR, calculate_dominant_color, calculate_saturated_color
+from apps.utils.leaderboard import Leaderboard, MemoryStorage as LeaderboardMemoryStorage
 from apps.utils.strings import get_int_from_string_or_none, keep_tags, markdown
 from apps.utils.tasks import merge_items
 
@@ -106,6 +110,124 @@ class StringsTestCase(TestCase):
         self.assertEqual(get_int_from_string_or_none(input_), output)
 
 
+class CacheTestCase(TestCase):
+    def test_local_cache(self):
+        with self.settings(CACHEBACK_LOCAL_MAX_SIZE=2):
+            data = LocalCache()
+            data.set('a', 1, 60)
+            data.set('b', 2, 60)
+            self.assertEqual(data.get('a'), (True, 1))
+            data.set('c', 3, 60)
+            self.assertEqual(data.get('b'), (False, None))
+            data.set('d', 4, -1)
+            self.assertEqual(data.get('d'), (False, None))
+            self.assertEqual(data.stats(), {'size': 1, 'hits': 1, 'misses': 2, 'evictions': 2})
+
+    def test_local_cache_copies(self):
+        with self.settings(CACHEBACK_LOCAL_MAX_SIZE=2):
+            data = LocalCache()
+            value = {'items': [1]}
+            data.set('a', value, 60)
+            value['items'].append(2)
+            data.get('a')[1]['items'].append(3)
+            self.assertEqual(data.get('a'), (True, {'items': [1]}))
+
+    def test_job_local_tier(self):
+        class Counter(Job):
+            local_lifetime = 60
+            calls = 0
+
+            def fetch(self):
+                Counter.calls += 1
+                return Counter.calls
+
+        with self.settings(CACHEBACK_LOCAL_MAX_SIZE=100):
+            local_cache.clear()
+            Counter().delete()
+            self.assertEqual(Counter().get(), 1)
+            with patch.object(Counter().cache, 'get') as cache_get:
+                self.assertEqual(Counter().get(), 1)
+                cache_get.assert_not_called()
+            Counter().set(5)
+            self.assertEqual(Counter().get(), 5)
+            local_cache.clear()
+
+    def test_job_local_tier_pending_refresh(self):
+        class Counter(Job):
+            local_lifetime = 60
+            local_version_interval = 0
+            calls = 0
+
+            def fetch(self):
+                Counter.calls += 1
+                return Counter.calls
+
+        with self.settings(CACHEBACK_LOCAL_MAX_SIZE=100), patch.object(Counter, 'async_refresh'):
+            local_cache.clear()
+            Counter().delete()
+            self.assertEqual(Counter().get(), 1)
+            Counter().invalidate()
+            # another process reads the old shared value while the refresh is pending
+            local_cache.clear()
+            self.assertEqual(Counter().get(), 1)
+            Counter().refresh()
+            self.assertEqual(Counter().get(), 2)
+            local_cache.clear()
+
+
+class ApiLimitsTestCase(TestCase):
+    def test_limiter(self):
+        user = get_user_model().objects.create(username='test', email='test@test.org')
+        today = timezone.now().date()
+        APIUserCounter.objects.create(user=user, date=today, count=8)
+        limiter = ApiLimiter('tests', MemoryStorage('tests'))
+
+        self.assertEqual([limiter.hit(user.id, 10, today) for _ in range(3)], [True, True, False])
+        self.assertEqual(limiter.pending(user.id), 2)
+        self.assertEqual(limiter.flush(), 1)
+        self.assertEqual(APIUserCounter.objects.get(user=user).count, 10)
+        self.assertEqual(limiter.pending(user.id), 0)
+        self.assertFalse(limiter.hit(user.id, 10, today))
+
+        # the usage is loaded again from the database after a reset
+        APIUserCounter.objects.filter(user=user).update(count=9)
+        limiter.reset(user.id)
+        self.assertEqual([limiter.hit(user.id, 10, today) for _ in range(2)], [True, False])
+
+        # the requests of the deleted users are not stored
+        limiter.hit(0, 10, today)
+        self.assertEqual(limiter.flush(), 2)
+        self.assertFalse(APIUserCounter.objects.filter(user_id=0).exists())
+
+
+class LeaderboardTestCase(TestCase):
+    def test_leaderboard(self):
+        scores = {1: 5, 2: 3, 3: 5, 4: 0, 5: 1, 6: 3}
+        leaderboard = Leaderboard('tests', lambda board_id: scores.items(), LeaderboardMemoryStorage('tests'))
+
+        def check():
+            ordered = sorted(scores, key=lambda pk: (-scores[pk], pk))
+            positive = [scores[pk] for pk in ordered if scores[pk] > 0]
+            self.assertEqual([leaderboard.position(1, pk) for pk in ordered], list(range(1, len(ordered) + 1)))
+            self.assertEqual(leaderboard.count(1), len(scores))
+            self.assertEqual(leaderboard.total(1), len(positive))
+            for start, end in ((0, 1), (1, 4), (2, None), (0, None), (5, 10)):
+                self.assertEqual(leaderboard.sum(1, start, end), sum(positive[start:end]))
+
+        # the changes before the first read are loaded from the loader
+        self.assertFalse(leaderboard.set(1, 7, 2))
+        check()
+
+        scores[7] = 2
+        self.assertTrue(leaderboard.set(1, 7, 2))
+        scores[1] = 0
+        leaderboard.set(1, 1, 0)
+        del scores[3]
+        leaderboard.remove(1, 3)
+        check()
+        self.assertIsNone(leaderboard.position(1, 3))
+
+
 class TasksTestCase(TransactionTestCase):
     def test_merge_items(self):
         game1 = Game.objects.create(name='Tom Yorke')
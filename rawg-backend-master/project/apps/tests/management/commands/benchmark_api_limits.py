@@ -0,0 +1,77 @@
+from multiprocessing import Pool
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils.timezone import now
+
+from apps.utils.api_limits import ApiLimiter, RedisStorage
+
+# the user without the api counters in the database
+USER_ID = 0
+
+
+def legacy(count, limit):
+    # the previous middleware: the database is checked by the first request of a process,
+    # the next requests are counted in the process memory only
+    limiter = ApiLimiter('benchmark')
+    date_api = now().date()
+    counter = 0
+    allowed = 0
+    start = monotonic()
+    try:
+        for _ in range(count):
+            if not counter and limiter.used_db(USER_ID, date_api) >= limit:
+                continue
+            counter += 1
+            allowed += 1
+    finally:
+        connection.close()
+    return allowed, monotonic() - start
+
+
+def shared(count, limit):
+    limiter = ApiLimiter('benchmark', RedisStorage('benchmark'))
+    date_api = now().date()
+    allowed = 0
+    start = monotonic()
+    try:
+        for _ in range(count):
+            if limiter.hit(USER_ID, limit, date_api):
+                allowed += 1
+    finally:
+        connection.close()
+    return allowed, monotonic() - start
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', action='store', dest='processes', default=8, type=int)
+        parser.add_argument('--count', action='store', dest='count', default=5000, type=int)
+        parser.add_argument('--limit', action='store', dest='limit', default=10000, type=int)
+
+    def handle(self, *args, **options):
+        processes, count, limit = options['processes'], options['count'], options['limit']
+        total = processes * count
+        self.stdout.write(self.style.SUCCESS('{} processes, {} requests, the limit is {}'.format(
+            processes, total, limit
+        )))
+        storage = RedisStorage('benchmark')
+        for title, method in (('per process counter', legacy), ('shared limiter', shared)):
+            storage.reset(USER_ID)
+            # the workers open their own database and redis connections
+            connection.close()
+            with Pool(processes) as pool:
+                results = pool.starmap(method, [(count, limit)] * processes)
+            allowed = sum(result[0] for result in results)
+            duration = max(result[1] for result in results)
+            self.stdout.write(self.style.SUCCESS(
+                '{}: {} allowed, {} over the limit, {:.1f} us per request, {:.0f} requests/sec'.format(
+                    title, allowed, max(allowed - limit, 0),
+                    sum(result[1] for result in results) / total * 1000000, total / duration,
+                )
+            ))
+        storage.reset(USER_ID)
+        # the benchmark requests are not stored
+        storage.take()
+        storage.done()
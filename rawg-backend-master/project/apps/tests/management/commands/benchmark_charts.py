@@ -0,0 +1,71 @@
+from datetime import timedelta
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from apps.charts import models
+from apps.games.models import Game
+from apps.users.models import UserGame
+from apps.utils.dates import monday
+
+
+class Command(BaseCommand):
+    charts = {
+        'toplay': models.GameToPlay,
+        'upcoming': models.GameUpcoming,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-c', '--chart', action='store', dest='chart', default='toplay', type=str, choices=list(self.charts)
+        )
+
+    def legacy_rebuild(self, model):
+        # the previous rebuild: an aggregate query for every week and a read-modify-write of every game
+        model.objects.all().delete()
+        delta = timedelta(days=7)
+        start = monday(UserGame.objects.values_list('created', flat=True).earliest('created'))
+        while start <= now():
+            last = start + delta > now()
+            game_count = model.chart_qs().filter(date__lt=start).values_list('game_id') \
+                .annotate(count=Count('game_id')).values_list('game_id', 'count').order_by('-count', '-game_id')
+            objects = []
+            for position, (game_id, count) in enumerate(game_count):
+                objects.append(model(game_id=game_id, position=position, count=count, week=start))
+                if last:
+                    with transaction.atomic():
+                        charts = Game.objects.values_list('charts', flat=True).get(id=game_id) or {}
+                        charts[model.chart_name] = position
+                        Game.objects.filter(id=game_id).update(charts=charts)
+            model.objects.bulk_create(objects)
+            start += delta
+
+    def measure(self, title, model, function):
+        # the changes are rolled back, the chart tables and the games are left as they were
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            start = monotonic()
+            function()
+            duration = monotonic() - start
+            rows = set(model.objects.values_list('week', 'game_id', 'position', 'count'))
+            charts = dict(Game.objects.exclude(charts=None).values_list('id', 'charts'))
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('{}: {:.2f} sec, {} queries, {} records'.format(
+            title, duration, len(queries), len(rows)
+        )))
+        return rows, charts
+
+    def handle(self, *args, **options):
+        model = self.charts[options['chart']]
+        if not UserGame.objects.exists():
+            self.stdout.write(self.style.ERROR('there is no data'))
+            return
+        legacy = self.measure('legacy rebuild', model, lambda: self.legacy_rebuild(model))
+        vectorized = self.measure('vectorized rebuild', model, lambda: model.rebuild(save_previous=False))
+        self.measure('newest week', model, lambda: model.calculate_and_write(monday(now()), save_game=True))
+        self.stdout.write(self.style.SUCCESS('same records: {}, same game charts: {}'.format(
+            legacy[0] == vectorized[0], legacy[1] == vectorized[1]
+        )))
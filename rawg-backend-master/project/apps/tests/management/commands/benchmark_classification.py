@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+import cv2
+import numpy
+from django.core.management.base import BaseCommand
+
+from apps.recommendations.management.commands.similar_classification import Command as ClassificationCommand
+from apps.recommendations.networks import NETWORKS
+from apps.utils.list import split
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--count', action='store', dest='count', default=512, type=int)
+        parser.add_argument('--batch', action='store', dest='batch', default=32, type=int)
+        parser.add_argument('--threads', action='store', dest='threads', default=16, type=int)
+
+    def images(self, count):
+        # jpeg screenshots of the downloaded size, the decoding is a part of the measured work
+        random = numpy.random.RandomState(0)
+        return [
+            cv2.imencode('.jpg', random.randint(0, 255, (236, 420, 3), dtype=numpy.uint8))[1].tobytes()
+            for _ in range(count)
+        ]
+
+    def decode(self, content):
+        return cv2.imdecode(numpy.frombuffer(content, numpy.uint8), cv2.IMREAD_COLOR)
+
+    def sequential(self, contents):
+        # the previous way: a network is read for every run and every image is passed separately
+        for network in NETWORKS:
+            net = cv2.dnn.readNetFromCaffe(network.proto_path, network.model_path)
+            layer_name = net.getLayer(net.getLayerId(net.getLayerNames()[-2])).name
+            for content in contents:
+                net.setInput(cv2.dnn.blobFromImage(self.decode(content), *network.image_params))
+                numpy.squeeze(net.forward(layer_name))
+
+    def batched(self, contents, batch_size, threads):
+        command = ClassificationCommand()
+        with ThreadPoolExecutor(threads) as executor:
+            for batch in split(contents, batch_size):
+                images = list(executor.map(self.decode, batch))
+                for network in NETWORKS:
+                    net, layer_name = command.get_net(network)
+                    net.setInput(cv2.dnn.blobFromImages(images, *network.image_params))
+                    net.forward(layer_name).reshape(len(images), -1)
+
+    def handle(self, *args, **options):
+        contents = self.images(options['count'])
+
+        start = monotonic()
+        self.sequential(contents)
+        sequential_duration = monotonic() - start
+
+        # the first batch loads the networks
+        self.batched(contents[0:1], 1, 1)
+        start = monotonic()
+        self.batched(contents, options['batch'], options['threads'])
+        batched_duration = monotonic() - start
+
+        count = len(contents)
+        self.stdout.write(self.style.SUCCESS('sequential: {:.1f} images/sec'.format(count / sequential_duration)))
+        self.stdout.write(self.style.SUCCESS('batched by {} with {} threads: {:.1f} images/sec ({:.1f}x)'.format(
+            options['batch'], options['threads'], count / batched_duration, sequential_duration / batched_duration
+        )))
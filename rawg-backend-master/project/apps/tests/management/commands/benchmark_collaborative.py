@@ -0,0 +1,97 @@
+import tempfile
+import tracemalloc
+from datetime import timedelta
+from time import monotonic
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from scipy.sparse import csr_matrix
+
+from apps.discussions.models import Discussion
+from apps.recommendations.management.commands.users_recommendations_collaborative import (
+    Command as CollaborativeCommand,
+)
+from apps.recommendations.models import UserRecommendationDislike
+from apps.reviews.models import Like, Review
+from apps.users.models import UserFavoriteGame, UserGame
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--train', action='store_true', dest='train', default=False)
+
+    def legacy_csr(self):
+        # the previous loader: rows are accumulated in nested dicts of python objects
+        users = {}
+        last_days = now() - timedelta(days=90)
+        for user_id, game_id, date in UserGame.objects.visible().values_list('user_id', 'game_id', 'added').iterator():
+            user = users.setdefault(user_id, {})
+            user[game_id] = (user.get(game_id, 0) + 1) * (2 if date >= last_days else 1)
+        ratings_map = {1: -40, 3: -30, 4: 30, 5: 40}
+        for user_id, game_id, rating, is_text, date in Review.objects.visible().values_list(
+            'user_id', 'game_id', 'rating', 'is_text', 'created'
+        ).iterator():
+            user = users.setdefault(user_id, {})
+            value = ratings_map[rating] * (2 if is_text else 1) * (2 if date >= last_days else 1)
+            user[game_id] = user.get(game_id, 0) + value
+        ratings_map = {-1: 15, -3: 15, -4: -15, -5: -15, 1: -15, 3: -15, 4: 15, 5: 15}
+        for user_id, game_id, positive, rating, date in Like.objects.values_list(
+            'user_id', 'review__game_id', 'positive', 'review__rating', 'added'
+        ).iterator():
+            user = users.setdefault(user_id, {})
+            value = ratings_map[rating * (1 if positive else -1)] * (2 if date >= last_days else 1)
+            user[game_id] = user.get(game_id, 0) + value
+        for qs, weight in (
+            (Discussion.objects.visible(), 20),
+            (UserFavoriteGame.objects.all(), 60),
+            (UserRecommendationDislike.objects.all(), -60),
+        ):
+            for user_id, game_id, date in qs.values_list('user_id', 'game_id', 'created').iterator():
+                user = users.setdefault(user_id, {})
+                user[game_id] = user.get(game_id, 0) + weight * (2 if date >= last_days else 1)
+        row, col, data = [], [], []
+        for user_id, games in users.items():
+            for game_id, value in games.items():
+                row.append(game_id)
+                col.append(user_id)
+                data.append(value)
+        return csr_matrix((np.array(data), (np.array(row), np.array(col))), dtype=np.float32)
+
+    def measure(self, title, function):
+        tracemalloc.start()
+        start = monotonic()
+        result = function()
+        duration = monotonic() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(self.style.SUCCESS('{}: {:.2f} sec, peak memory {:.1f} MB'.format(
+            title, duration, peak / 1024 / 1024
+        )))
+        return result
+
+    def handle(self, *args, **options):
+        command = CollaborativeCommand()
+        command.disable_tqdm = True
+
+        legacy = self.measure('legacy loader', self.legacy_csr)
+        matrix = self.measure('vectorized loader', command.prepare_csr)
+        if legacy is None or matrix is None:
+            self.stdout.write(self.style.ERROR('there is no data'))
+            return
+        rows = max(legacy.shape[0], matrix.shape[0])
+        cols = max(legacy.shape[1], matrix.shape[1])
+        legacy.resize((rows, cols))
+        matrix.resize((rows, cols))
+        self.stdout.write(self.style.SUCCESS('{}x{} matrix, {} values, difference: {}'.format(
+            rows, cols, matrix.nnz, abs(legacy - matrix).max()
+        )))
+
+        if not options['train']:
+            return
+        with tempfile.TemporaryDirectory() as path:
+            command.models_path = path
+            command.compiled_models = self.measure('training', lambda: command.get_models(matrix))
+            self.measure('saving', lambda: command.save_models(matrix))
+            command.models_version = None
+            self.measure('loading', command.load_models)
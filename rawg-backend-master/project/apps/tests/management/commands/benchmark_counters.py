@@ -0,0 +1,53 @@
+from multiprocessing.pool import ThreadPool
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F
+
+from apps.games.counters import PlaysBuffer
+from apps.games.models import Game
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', action='store', dest='threads', default=16, type=int)
+        parser.add_argument('--count', action='store', dest='count', default=500, type=int)
+
+    def direct(self, game_id, count):
+        try:
+            for _ in range(count):
+                Game.objects.playable().filter(id=game_id).update(plays=F('plays') + 1)
+        finally:
+            connection.close()
+
+    def buffered(self, game_id, count):
+        for _ in range(count):
+            self.plays.incr(game_id)
+
+    def handle(self, *args, **options):
+        threads, count = options['threads'], options['count']
+        total = threads * count
+        # the threads update the game over their own connections, so a game in a transaction which is rolled back
+        # is not visible to them: a throwaway game is created and deleted at the end, and the buffer has its own
+        # storage, so the flush doesn't take the pending plays of the real games
+        self.plays = PlaysBuffer('benchmark.plays', 'games.Game', 'plays')
+        game = Game.objects.create(name='benchmark-counters', can_play=True, iframe='https://example.org')
+        try:
+            for title, method in (('update per play', self.direct), ('write-behind buffer', self.buffered)):
+                plays = Game.objects.get(id=game.id).plays
+                start = monotonic()
+                with ThreadPool(threads) as pool:
+                    pool.starmap(method, [(game.id, count)] * threads)
+                self.plays.flush()
+                duration = monotonic() - start
+                added = Game.objects.get(id=game.id).plays - plays
+                self.stdout.write(self.style.SUCCESS(
+                    '{}: {} plays in {:.2f} sec, {:.0f} plays/sec, stored {}'.format(
+                        title, total, duration, total / duration, added
+                    )
+                ))
+        finally:
+            self.plays.storage.take()
+            self.plays.storage.done()
+            game.delete()
@@ -0,0 +1,68 @@
+from time import monotonic
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from apps.games import models
+from apps.games.tasks import (
+    DENORMALIZE_KEY, DENORMALIZE_PENDING_KEY, denormalize_stats, get_denormalize_redis, update_game_denormalized,
+)
+from apps.merger.merger import update
+
+
+class Command(BaseCommand):
+    prefix = 'benchmark-denormalize'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', action='store', dest='count', default=100, type=int)
+
+    def item(self, i):
+        return {
+            'id': '{}-{}'.format(self.prefix, i),
+            'url': 'http://example.com/{}/{}'.format(self.prefix, i),
+            'platforms': {'pc': {'name': 'PC'}, 'macos': {'name': 'macOS'}, 'linux': {'name': 'Linux'}},
+            'developers': ['{} developer {}'.format(self.prefix, i % 10)],
+            'publishers': ['{} publisher {}'.format(self.prefix, i % 10)],
+            'genres': ['{} genre {}'.format(self.prefix, n) for n in range(3)],
+            'tags': ['{} tag {}'.format(self.prefix, n) for n in range(10)],
+            'screenshots': ['http://example.com/{}/{}/{}.jpg'.format(self.prefix, i, n) for n in range(5)],
+        }
+
+    def handle(self, *args, **options):
+        count = options['count']
+        store, _ = models.Store.objects.get_or_create(slug=self.prefix, defaults={'name': self.prefix})
+        stats = denormalize_stats()
+        # flushes are run below by hand instead of the broker to measure them
+        with mock.patch.object(update_game_denormalized, 'apply_async') as mocked_apply_async:
+            start = monotonic()
+            games = [
+                update(models.Game.objects.create(name='{} {}'.format(self.prefix, i)), True, self.item(i), store)
+                for i in range(count)
+            ]
+            import_duration = monotonic() - start
+        new_stats = denormalize_stats()
+        marked = new_stats.get('marked', 0) - stats.get('marked', 0)
+        scheduled = new_stats.get('scheduled', 0) - stats.get('scheduled', 0)
+
+        start = monotonic()
+        for call in mocked_apply_async.call_args_list:
+            update_game_denormalized(*call[0][0])
+        flush_duration = monotonic() - start
+
+        with override_settings(DISABLE_GAME_UPDATE_SIGNALS=True):
+            for game in games:
+                keys = DENORMALIZE_KEY.format(game.id), DENORMALIZE_PENDING_KEY.format(game.id)
+                game.delete()
+                get_denormalize_redis().delete(*keys)
+            for model in (models.Developer, models.Publisher, models.Genre, models.Tag):
+                model.objects.filter(name__startswith=self.prefix).delete()
+            store.delete()
+
+        self.stdout.write(self.style.SUCCESS('import of {} games: {:.2f} sec'.format(count, import_duration)))
+        self.stdout.write(self.style.SUCCESS('tasks before: {}, tasks after: {}, saved: {} ({:.0f}%)'.format(
+            marked, scheduled, marked - scheduled, (marked - scheduled) / (marked or 1) * 100
+        )))
+        self.stdout.write(self.style.SUCCESS('coalesced updates: {:.2f} sec, {:.1f} ms per game'.format(
+            flush_duration, flush_duration / (scheduled or 1) * 1000
+        )))
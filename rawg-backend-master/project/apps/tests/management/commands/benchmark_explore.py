@@ -0,0 +1,82 @@
+from datetime import timedelta
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.timezone import now
+from rest_framework.authtoken.models import Token
+
+from apps.feed.models import Feed, UserFeed
+from apps.feed.timeline import timeline
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--count', action='store', dest='count', default=100000, type=int)
+        parser.add_argument('--repeat', action='store', dest='repeat', default=10, type=int)
+
+    def measure(self, title, function, repeat):
+        durations = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(repeat):
+                start = monotonic()
+                result = function()
+                durations.append(monotonic() - start)
+        durations.sort()
+        self.stdout.write(self.style.SUCCESS('{}: median {:.3f} sec, max {:.3f} sec, {} queries'.format(
+            title, durations[len(durations) // 2], durations[-1], len(queries) // repeat
+        )))
+        return result
+
+    def handle(self, *args, **options):
+        actions = [action for action, _ in Feed.ACTIONS if action not in Feed.ACTIONS_HIDDEN]
+        time = now()
+
+        # the user feeds are created in a transaction which is rolled back at the end
+        with transaction.atomic():
+            user = get_user_model().objects.create(username='benchmark-explore', email='benchmark-explore@test.org')
+            client = Client(
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+                HTTP_TOKEN='Token {}'.format(Token.objects.create(user=user).key),
+            )
+            feeds = Feed.objects.bulk_create([
+                Feed(action=actions[i % len(actions)], created=time - timedelta(minutes=i), data={})
+                for i in range(options['count'])
+            ], batch_size=5000)
+            UserFeed.objects.bulk_create([
+                UserFeed(user=user, feed=feed, created=feed.created, sources=[UserFeed.SOURCES_USER])
+                for feed in feeds
+            ], batch_size=5000)
+            self.stdout.write(self.style.SUCCESS('{} user feeds'.format(len(feeds))))
+
+            pages = [
+                ('first page', {}),
+                ('deep page', {'page': 100}),
+                ('chronological first page', {'ordering': '-created'}),
+            ]
+            ids = {}
+            for enabled, title in ((False, 'legacy'), (True, 'timeline')):
+                with override_settings(FEED_TIMELINE=enabled, ALLOWED_HOSTS=['testserver']):
+                    for name, params in pages:
+                        result = self.measure(
+                            '{} {}'.format(title, name),
+                            lambda: client.get('/api/feed/explore', params).json(),
+                            options['repeat'],
+                        )
+                        ids.setdefault(name, []).append([item['id'] for item in result['results']])
+                    if enabled:
+                        data = client.get('/api/feed/explore', {'cursor': ''}).json()
+                        self.measure(
+                            'timeline cursor page',
+                            lambda: client.get(data['next']).json(),
+                            options['repeat'],
+                        )
+            for name, _ in pages:
+                self.stdout.write(self.style.SUCCESS('the same {}: {}'.format(name, ids[name][0] == ids[name][1])))
+
+            transaction.set_rollback(True)
+        # the id of the benchmark user can be taken by a new user
+        timeline.drop(user.id)
@@ -0,0 +1,51 @@
+import os
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from apps.common.cache import CommonContentType
+from apps.feed.management.commands.feed import Command as FeedCommand
+from apps.feed.models import Feed, FeedQueue
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--count', action='store', dest='count', default=1000, type=int)
+        parser.add_argument('--batch', action='store', dest='batch', default=100, type=int)
+        parser.add_argument('--workers', action='store', dest='workers', default=4, type=int)
+
+    def fill(self, count):
+        # language items don't touch feeds, so only the queue machinery is measured,
+        # the old flag keeps them away from the running workers
+        created = now()
+        FeedQueue.objects.bulk_create([
+            FeedQueue(
+                content_type=CommonContentType().get(Feed), object_id=0, action=FeedQueue.LANGUAGE,
+                data={'id': 0, 'language': 'eng'}, created=created, execute=created, old=True,
+            )
+            for _ in range(count)
+        ], batch_size=1000)
+
+    def run(self, count, batch, workers):
+        self.fill(count)
+        with open(os.devnull, 'w') as f:
+            command = FeedCommand(stdout=f)
+            command.processes = 1
+            command.old = True
+            command.batch = batch
+            command.workers = workers
+            start = monotonic()
+            while command.process_batch() if batch else command.process():
+                pass
+            duration = monotonic() - start
+        FeedQueue.objects.filter(old=True, content_type=CommonContentType().get(Feed), object_id=0).delete()
+        return duration
+
+    def handle(self, *args, **options):
+        count = options['count']
+        for title, batch in (('one-row loop', 0), ('batch mode', options['batch'])):
+            duration = self.run(count, batch, options['workers'])
+            self.stdout.write(self.style.SUCCESS('{}: {} items in {:.2f} sec, {:.1f} items/sec'.format(
+                title, count, duration, count / duration
+            )))
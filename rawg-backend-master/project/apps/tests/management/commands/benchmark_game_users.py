@@ -0,0 +1,75 @@
+from math import ceil
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+from apps.games.models import Game
+from apps.games.tasks import get_games_users, update_games_users
+from apps.users.models import UserGame
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--count', action='store', dest='count', default=1000, type=int)
+
+    def legacy(self, game_id):
+        # the previous update_game: the queries for every status and the offset for the median playtime
+        added_qs = UserGame.objects.visible().filter(game_id=game_id)
+        count = added_qs.count()
+        users = {'added': {
+            'count': count,
+            'last': list(added_qs.order_by('-added').values_list('user_id', flat=True)[0:5])
+        }}
+        for status, _ in UserGame.STATUSES:
+            qs = UserGame.objects.visible().filter(game_id=game_id, status=status)
+            users[status] = {
+                'count': qs.count(),
+                'last': list(qs.order_by('-added').values_list('user_id', flat=True)[0:5])
+            }
+        qs = UserGame.objects.filter(game_id=game_id, playtime__gt=0)
+        try:
+            playtime = qs.values_list('playtime', flat=True).order_by('playtime')[int(round(qs.count() / 2))]
+        except IndexError:
+            playtime = 0
+        return {
+            'added': count,
+            'added_by_status': dict(added_qs.values_list('status').annotate(count=Count('status')).order_by('-count')),
+            'users': users,
+            'playtime': ceil(playtime / 60 / 60),
+        }
+
+    def measure(self, title, function):
+        with CaptureQueriesContext(connection) as queries:
+            start = monotonic()
+            result = function()
+            duration = monotonic() - start
+        self.stdout.write(self.style.SUCCESS('{}: {:.3f} sec, {} queries'.format(title, duration, len(queries))))
+        return result
+
+    def handle(self, *args, **options):
+        game_ids = list(Game.objects.order_by('-added').values_list('id', flat=True)[0:options['count']])
+        if len(game_ids) < options['count']:
+            self.stdout.write(self.style.WARNING('only {} games are found'.format(len(game_ids))))
+        for ids in (game_ids[0:1], game_ids):
+            self.stdout.write(self.style.SUCCESS('{} games'.format(len(ids))))
+            legacy = self.measure('legacy queries', lambda: {game_id: self.legacy(game_id) for game_id in ids})
+            result = self.measure('one aggregation', lambda: get_games_users(ids, ids))
+            # the last users with the same added time and the statuses with the same counts can be in any order,
+            # the median is the lower one instead of the upper one
+            different = [
+                game_id for game_id in ids
+                if legacy[game_id]['added'] != result[game_id]['added']
+                or legacy[game_id]['added_by_status'] != result[game_id]['added_by_status']
+                or any(
+                    value['count'] != result[game_id]['users'][key]['count']
+                    for key, value in legacy[game_id]['users'].items()
+                )
+            ]
+            self.stdout.write(self.style.SUCCESS('different counters: {}'.format(len(different))))
+            # the games are updated in a transaction which is rolled back at the end
+            with transaction.atomic():
+                self.measure('update', lambda: update_games_users(ids, ids))
+                transaction.set_rollback(True)
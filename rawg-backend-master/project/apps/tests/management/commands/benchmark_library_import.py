@@ -0,0 +1,64 @@
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.games.models import Game, GamePlatform
+from apps.users.models import UserGame
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--count', action='store', dest='count', default=10000, type=int)
+
+    def legacy(self, user, games, rows, only_created=False):
+        # the previous import: every game of the library is saved with its own queries
+        result = []
+        for game, row in zip(games, rows):
+            user_game = UserGame.create_user_game(
+                game, user, row[1], row[2], True, only_created, row[3], 'steam'
+            )
+            if user_game:
+                result.append(user_game)
+        return result
+
+    def measure(self, title, function):
+        with CaptureQueriesContext(connection) as queries:
+            start = monotonic()
+            result = function()
+            duration = monotonic() - start
+        self.stdout.write(self.style.SUCCESS('{}: {} user games in {:.3f} sec, {} queries'.format(
+            title, len(result), duration, len(queries)
+        )))
+        return result
+
+    def handle(self, *args, **options):
+        games = list(Game.objects.order_by('-added')[0:options['count']])
+        if len(games) < options['count']:
+            self.stdout.write(self.style.WARNING('only {} games are found'.format(len(games))))
+        platforms = {}
+        qs = GamePlatform.objects.filter(game_id__in=[game.id for game in games]).order_by('id')
+        for game_id, slug in qs.values_list('game_id', 'platform__slug'):
+            platforms.setdefault(game_id, []).append(slug)
+        rows = [(game.id, platforms.get(game.id) or ['pc'], i % 5000, None) for i, game in enumerate(games)]
+
+        # the libraries are created in a transaction which is rolled back at the end
+        with transaction.atomic():
+            users = [
+                get_user_model().objects.create(
+                    username='benchmark-import-{}'.format(i), email='benchmark-import-{}@test.org'.format(i)
+                )
+                for i in range(2)
+            ]
+            self.measure('legacy first import', lambda: self.legacy(users[0], games, rows))
+            self.measure('bulk first import', lambda: UserGame.create_user_games(users[1], rows, False, 'steam'))
+            self.measure('legacy sync', lambda: self.legacy(users[0], games, rows, True))
+            self.measure('bulk sync', lambda: UserGame.create_user_games(users[1], rows, True, 'steam'))
+            self.stdout.write(self.style.SUCCESS('the same libraries: {}'.format(
+                set(UserGame.objects.filter(user=users[0]).values_list('game_id', 'playtime', 'platforms'))
+                == set(UserGame.objects.filter(user=users[1]).values_list('game_id', 'playtime', 'platforms'))
+            )))
+
+            transaction.set_rollback(True)
@@ -0,0 +1,85 @@
+import os
+import tempfile
+from time import monotonic
+
+import hnswlib
+import numpy
+from django.core.management.base import BaseCommand
+
+from apps.recommendations.management.commands.similar_neighbors import Command as NeighborsCommand
+from apps.recommendations.networks import NETWORKS
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--count', action='store', dest='count', default=20000, type=int)
+        parser.add_argument('--added', action='store', dest='added', default=200, type=int)
+        parser.add_argument('--deleted', action='store', dest='deleted', default=50, type=int)
+
+    def new_index(self, command, max_elements):
+        index = hnswlib.Index(space=command.network.space, dim=command.network.dimension)
+        index.init_index(max_elements=max_elements, ef_construction=command.ef_construction, M=command.index_m)
+        index.set_ef(command.ef)
+        return index
+
+    def update(self, command, data, added, deleted):
+        # one run of the queue: new screenshots are added, deleted ones are marked
+        # and only the new screenshots are searched
+        command.screens = list(added)
+        command.add_data_in_index(data)
+        command.delete_data_in_index(int(screen_id) for screen_id in deleted)
+        command.index.knn_query(command.index.get_items(command.screens), k=command.find_elements)
+
+    def handle(self, *args, **options):
+        count, added_count = options['count'], options['added']
+        command = NeighborsCommand()
+        command.network = NETWORKS[0]
+        random = numpy.random.RandomState(0)
+        data = random.rand(count + added_count, command.network.dimension).astype(numpy.float32)
+        labels = numpy.arange(1, count + added_count + 1, dtype=numpy.uint64)
+        added = labels[count:]
+        deleted = random.choice(labels[0:count], options['deleted'], replace=False)
+
+        start = monotonic()
+        index = self.new_index(command, count + added_count)
+        index.add_items(data, labels)
+        index.knn_query(data, k=command.find_elements)
+        rebuild_duration = monotonic() - start
+
+        with tempfile.TemporaryDirectory() as path:
+            command.index_name = os.path.join(path, 'index.hnsw')
+            command.index = self.new_index(command, count)
+            command.index.add_items(data[0:count], labels[0:count])
+            command.labels = set(int(label) for label in labels[0:count])
+            command.save_index()
+
+            # the previous way: the index file is loaded for every run
+            start = monotonic()
+            command.index = hnswlib.Index(space=command.network.space, dim=command.network.dimension)
+            command.index.load_index(command.index_name, max_elements=count)
+            command.index.set_ef(command.ef)
+            self.update(command, data[count:], added, deleted)
+            reload_duration = monotonic() - start
+
+            command.index = hnswlib.Index(space=command.network.space, dim=command.network.dimension)
+            command.index.load_index(command.index_name, max_elements=count)
+            command.index.set_ef(command.ef)
+            command.labels = set(int(label) for label in labels[0:count])
+            start = monotonic()
+            self.update(command, data[count:], added, deleted)
+            resident_duration = monotonic() - start
+
+            start = monotonic()
+            command.save_index()
+            snapshot_duration = monotonic() - start
+
+        self.stdout.write(self.style.SUCCESS('full rebuild of {} screenshots: {:.2f} sec'.format(
+            count + added_count, rebuild_duration
+        )))
+        self.stdout.write(self.style.SUCCESS('update of {} added and {} deleted with reloading: {:.2f} sec'.format(
+            added_count, len(deleted), reload_duration
+        )))
+        self.stdout.write(self.style.SUCCESS('update of {} added and {} deleted in memory: {:.2f} sec'.format(
+            added_count, len(deleted), resident_duration
+        )))
+        self.stdout.write(self.style.SUCCESS('snapshot: {:.2f} sec'.format(snapshot_duration)))
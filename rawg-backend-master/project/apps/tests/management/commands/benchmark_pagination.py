@@ -0,0 +1,46 @@
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from rest_framework.test import APIRequestFactory
+
+from api.games.paginations import GamePagination
+from api.games.views import GameViewSet
+from apps.games.models import Game
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--page', action='store', dest='page', default=5000, type=int)
+        parser.add_argument('--ordering', action='store', dest='ordering', default='-added')
+        parser.add_argument('--repeats', action='store', dest='repeats', default=5, type=int)
+
+    def request(self, params, repeats):
+        view = GameViewSet.as_view({'get': 'list'})
+        durations = []
+        for _ in range(repeats):
+            request = APIRequestFactory().get('/api/games', params)
+            start = monotonic()
+            response = view(request)
+            durations.append(monotonic() - start)
+            assert response.status_code == 200, response.status_code
+        return min(durations)
+
+    def handle(self, *args, **options):
+        page = options['page']
+        ordering = options['ordering']
+        field = ordering.lstrip('-')
+        page_size = GamePagination.page_size
+        order = F(field).desc(nulls_first=True) if ordering[0] == '-' else F(field).asc(nulls_last=True)
+        # the cursor of the page is built from the last row of the previous page
+        last = Game.objects.order_by(order, '-id').only('id', field)[(page - 1) * page_size - 1]
+        cursor = GamePagination().encode_cursor(getattr(last, field), last.id)
+
+        for title, params in (
+            ('offset, page 1', {'ordering': ordering}),
+            ('offset, page {}'.format(page), {'ordering': ordering, 'page': page}),
+            ('cursor, page 1', {'ordering': ordering, 'cursor': ''}),
+            ('cursor, page {}'.format(page), {'ordering': ordering, 'cursor': cursor}),
+        ):
+            duration = self.request(params, options['repeats'])
+            self.stdout.write(self.style.SUCCESS('{}: {:.1f} ms'.format(title, duration * 1000)))
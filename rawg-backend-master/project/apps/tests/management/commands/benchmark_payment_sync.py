@@ -0,0 +1,56 @@
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext
+
+from apps.games.models import Game, PlayerGameSession
+from apps.payments.models import CreatedEvent, Payment, PaymentProject, PendingEvent
+from apps.utils.payments import UkassaPaymentSynchronizer
+from apps.utils.tests import fake_http_server
+
+
+def handle(path, query):
+    # the payments are not paid yet, so only the requests are measured
+    return 200, {}, {'id': path.split('/')[-1], 'status': 'pending', 'payment_method': {'type': 'bank_card'}}
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--count', action='store', dest='count', default=200, type=int)
+        parser.add_argument('--delay', action='store', dest='delay', default=50, type=int)
+        parser.add_argument('--workers', action='store', dest='workers', default=8, type=int)
+
+    def handle(self, *args, **options):
+        # the payments are created in a transaction which is rolled back at the end
+        with transaction.atomic():
+            user = get_user_model().objects.create(username='benchmark-payments', email='benchmark@test.org')
+            game = Game.objects.create(name='Benchmark Payments')
+            session = PlayerGameSession.objects.create(player=user, game=game)
+            PaymentProject.objects.create(
+                id=(PaymentProject.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1,
+                game=game, secret_key='key', payment_system_name=Payment.UKASSA,
+            )
+            for i in range(options['count']):
+                payment = Payment.objects.create(game_session=session, game=game, player=user)
+                CreatedEvent.objects.create(payment=payment, data={})
+                PendingEvent.objects.create(
+                    payment=payment, data={'payment_system_name': Payment.UKASSA, 'id': str(i)}
+                )
+            payments = list(Payment.objects.filter(game=game))
+
+            with fake_http_server(handle, options['delay'] / 1000) as url:
+                attributes = {'BASE_URL': f'{url}payments/'}
+                for title, concurrent in (('sequential', False), ('concurrent', True)):
+                    synchronizer = type('Synchronizer', (UkassaPaymentSynchronizer,), attributes)(options['workers'])
+                    with CaptureQueriesContext(connection) as queries:
+                        start = monotonic()
+                        results = synchronizer.sync(payments, concurrent=concurrent)
+                        duration = monotonic() - start
+                    self.stdout.write(self.style.SUCCESS('{}: {} payments in {:.2f} sec, {} queries'.format(
+                        title, len(results), duration, len(queries)
+                    )))
+
+            transaction.set_rollback(True)
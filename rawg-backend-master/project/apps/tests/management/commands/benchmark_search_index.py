@@ -0,0 +1,68 @@
+import tracemalloc
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from elasticsearch import Elasticsearch, NotFoundError, Transport
+from elasticsearch.helpers import bulk
+from haystack import connections
+
+
+class FakeTransport(Transport):
+    # answers like a cluster without the network, the bulk requests are parsed to count the documents
+    def perform_request(self, method, url, headers=None, params=None, body=None):
+        if url.endswith('/_bulk'):
+            if isinstance(body, bytes):
+                body = body.decode()
+            count = len(body.splitlines()) // 2
+            return {'took': 1, 'errors': False, 'items': [{'index': {'status': 201}} for _ in range(count)]}
+        if method == 'HEAD':
+            return False
+        if method == 'GET' and '/_alias/' in url:
+            raise NotFoundError(404, 'aliases_not_found_exception', {})
+        return {'acknowledged': True}
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--count', action='store', dest='count', default=200000, type=int)
+        parser.add_argument('--threads', action='store', dest='threads', default=4, type=int)
+        parser.add_argument('--reindex', action='store_true', dest='reindex', default=False)
+
+    def documents(self, count):
+        for i in range(count):
+            yield {
+                '_id': 'games.game.{}'.format(i),
+                'id': 'games.game.{}'.format(i),
+                'django_ct': 'games.game',
+                'django_id': str(i),
+                'text': 'Game {} description '.format(i) * 20,
+                'name': 'Game {}'.format(i),
+                'added': i % 1000,
+            }
+
+    def measure(self, title, function):
+        tracemalloc.start()
+        start = monotonic()
+        function()
+        duration = monotonic() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(self.style.SUCCESS('{}: {:.2f} sec, peak memory {:.1f} MB'.format(
+            title, duration, peak / 1024 / 1024
+        )))
+
+    def handle(self, *args, **options):
+        count = options['count']
+        backend = connections['default'].get_backend()
+        backend.conn = Elasticsearch(transport_class=FakeTransport)
+
+        self.measure('collected documents', lambda: bulk(
+            backend.conn, list(self.documents(count)), index='benchmark', doc_type='modelresult'
+        ))
+        self.measure('streaming bulk', lambda: backend.bulk_documents('benchmark', self.documents(count), 1))
+        self.measure('parallel bulk with {} threads'.format(options['threads']), lambda: backend.bulk_documents(
+            'benchmark', self.documents(count), options['threads']
+        ))
+        if options['reindex']:
+            # the database objects are prepared by the process pool, only the main process is traced
+            self.measure('reindex', lambda: backend.reindex(thread_count=options['threads']))
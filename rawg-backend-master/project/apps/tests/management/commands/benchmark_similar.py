@@ -0,0 +1,75 @@
+import random
+import string
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+
+from apps.merger.models import MAX_SIMILARITY, SimilarGame
+from apps.merger.similar import SimilarIndex
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--count', action='store', dest='count', default=200000, type=int)
+        parser.add_argument('--queries', action='store', dest='queries', default=1000, type=int)
+        parser.add_argument('--brute', action='store', dest='brute', default=20, type=int)
+
+    def catalogue(self, count):
+        # titles of several random words with a share of near-duplicates like "Name 2" or typos
+        words = [
+            ''.join(random.choice(string.ascii_lowercase) for _ in range(random.randint(2, 9)))
+            for _ in range(20000)
+        ]
+        names = [
+            ' '.join(random.choice(words) for _ in range(random.randint(1, 5))).title()
+            for _ in range(count * 9 // 10)
+        ]
+        names += [self.mutate(random.choice(names)) for _ in range(count - len(names))]
+        return names
+
+    def mutate(self, name):
+        name = list(name)
+        for _ in range(random.randint(0, 3)):
+            i = random.randrange(len(name) + 1)
+            name.insert(i, random.choice(string.ascii_letters + string.digits + ' :'))
+        return ''.join(name)
+
+    def find(self, pairs, queries):
+        found = []
+        for pk, name in queries:
+            found.append([result for result in (
+                SimilarGame.check_games(similar_pk, similar_name, pk, name) for similar_pk, similar_name in pairs(name)
+            ) if result])
+        return found
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        names = self.catalogue(options['count'])
+        items = list(enumerate(names, 1))
+        queries = [(-i, self.mutate(random.choice(names))) for i in range(1, options['queries'] + 1)]
+
+        start = monotonic()
+        index = SimilarIndex(items, MAX_SIMILARITY)
+        index.build()
+        build_duration = monotonic() - start
+
+        start = monotonic()
+        indexed = self.find(index.candidates, queries)
+        index_duration = monotonic() - start
+
+        brute_queries = queries[0:options['brute']]
+        start = monotonic()
+        brute = self.find(lambda name: items, brute_queries)
+        brute_duration = monotonic() - start
+
+        assert [sorted(r) for r in brute] == [sorted(r) for r in indexed[0:len(brute_queries)]]
+        per_query = brute_duration / len(brute_queries)
+        self.stdout.write(self.style.SUCCESS('catalogue: {} titles, index built in {:.2f} sec'.format(
+            len(items), build_duration
+        )))
+        self.stdout.write(self.style.SUCCESS('full scan: {:.1f} ms per item, {:.0f} sec for {} items'.format(
+            per_query * 1000, per_query * len(queries), len(queries)
+        )))
+        self.stdout.write(self.style.SUCCESS('index: {:.2f} ms per item, {:.2f} sec for {} items, {} pairs'.format(
+            index_duration / len(queries) * 1000, index_duration, len(queries), sum(len(r) for r in indexed)
+        )))
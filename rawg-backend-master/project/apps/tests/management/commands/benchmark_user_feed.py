@@ -0,0 +1,72 @@
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+
+from apps.common.cache import CommonContentType
+from apps.feed.models import Feed, UserFeed
+from apps.users.models import UserFollowElement
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', action='store', dest='followers', default=10000, type=int)
+
+    def handle(self, *args, **options):
+        count = options['followers']
+        # everything is rolled back at the end, bulk_create is used to skip signals
+        with transaction.atomic():
+            prefix = 'benchmark-user-feed-{}'.format(int(now().timestamp()))
+            users = get_user_model().objects.bulk_create([
+                get_user_model()(username='{}-{}'.format(prefix, i), email='{}-{}@test.org'.format(prefix, i))
+                for i in range(count + 1)
+            ], batch_size=1000)
+            author, followers = users[0], users[1:]
+            UserFollowElement.objects.bulk_create([
+                UserFollowElement(
+                    user_id=follower.id, object_id=author.id, content_type=CommonContentType().get(get_user_model())
+                )
+                for follower in followers
+            ], batch_size=1000)
+            feed = Feed.objects.bulk_create([Feed(
+                user_id=author.id, action=Feed.ACTIONS_CREATE_COLLECTION, data={'collections': [0]}, created=now(),
+            )])[0]
+
+            start = monotonic()
+            for user_id in [follower.id for follower in followers] + [author.id]:
+                UserFeed.objects.create_user_feed(user_id, feed)
+            loop = monotonic() - start
+            UserFeed.objects.filter(feed_id=feed.id).delete()
+
+            start = monotonic()
+            UserFeed.objects.create_from_feed(feed)
+            bulk = monotonic() - start
+            created = UserFeed.objects.filter(feed_id=feed.id).count()
+
+            # the row by row removal of a source which was used before the set-based delete_source
+            start = monotonic()
+            for user_feed in UserFeed.objects.filter(sources__contains=[UserFeed.SOURCES_USER], feed_id=feed.id):
+                user_feed.sources = [s for s in user_feed.sources if UserFeed.SOURCES_USER != s]
+                if user_feed.sources:
+                    user_feed.save()
+                else:
+                    user_feed.delete()
+            delete_loop = monotonic() - start
+
+            UserFeed.objects.create_from_feed(feed)
+            start = monotonic()
+            UserFeed.objects.delete_source(UserFeed.SOURCES_USER, feed_id=feed.id)
+            delete_bulk = monotonic() - start
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('per-follower loop: {} followers in {:.2f} sec'.format(count, loop)))
+        self.stdout.write(self.style.SUCCESS('set-based upsert: {} user feeds in {:.2f} sec'.format(created, bulk)))
+        self.stdout.write(self.style.SUCCESS(
+            'per-row delete_source: {} user feeds in {:.2f} sec'.format(created, delete_loop)
+        ))
+        self.stdout.write(self.style.SUCCESS(
+            'set-based delete_source: {} user feeds in {:.2f} sec'.format(created, delete_bulk)
+        ))
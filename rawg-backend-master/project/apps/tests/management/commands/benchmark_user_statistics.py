@@ -0,0 +1,115 @@
+import json
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from api.games import formats as games_formats
+from apps.credits.models import GamePerson
+from apps.games.models import Game
+from apps.users import statistics
+from apps.users.models import UserGame
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--count', action='store', dest='count', default=20000, type=int)
+        parser.add_argument('--changes', action='store', dest='changes', default=10, type=int)
+
+    def legacy_persons(self, qs):
+        counter = {}
+        game_person = set()
+        persons = GamePerson.objects.visible().filter(game_id__in=qs.values_list('game_id', flat=True))
+        for person_id, game_id, person_count in persons.values_list('person_id', 'game_id', 'person__games_count'):
+            value = counter.get(person_id) or {'games': 0, 'positions': 0, 'person': person_count}
+            value['positions'] += 1
+            if (person_id, game_id) not in game_person:
+                value['games'] += 1
+                game_person.add((person_id, game_id))
+            counter[person_id] = value
+        result = sorted(counter.items(), key=lambda x: (-x[1]['games'], -x[1]['person'], -x[1]['positions']))[0:15]
+        return [x[0] for x in result]
+
+    def legacy_statistics(self, user):
+        # the previous game statistics: all the user games are loaded with their relations for every change
+        result = {}
+        qs = UserGame.objects.prefetch_visible().filter(user=user).exclude(status=UserGame.STATUS_TOPLAY)
+        result['years'] = user.get_statistics_years(qs)
+        result['years_top'] = user.get_statistics_years_top(qs)
+        result['games_statuses'] = user.get_user_games_counters()
+        result['games_graph'] = user.get_user_games_graph(qs)
+        result['persons_top'] = self.legacy_persons(qs)
+        games = []
+        user_game_platforms = {}
+        game_platforms = {}
+        for user_game in qs.prefetch_related('game__developers', 'game__genres'):
+            games.append(user_game.game)
+            user_game_platforms[user_game.game.id] = user_game.platforms.all()
+            game_platforms[user_game.game.id] = user_game.game.platforms.all()
+        games_to_play = []
+        game_platforms_to_play = {}
+        for user_game in UserGame.objects.prefetch_visible().filter(user=user, status=UserGame.STATUS_TOPLAY):
+            games_to_play.append(user_game.game)
+            game_platforms_to_play[user_game.game.id] = user_game.game.platforms.all()
+        result['games_platforms'] = games_formats.percents(games, user_game_platforms, 'platform', 'name')
+        result['games_platforms_all'] = games_formats.percents(games, game_platforms, 'platform', 'name')
+        result['games_platforms_to_play'] = games_formats.percents(
+            games_to_play, game_platforms_to_play, 'platform', 'name'
+        )
+        developers = games_formats.percents(games, 'developers', 'developer', 'name', True)
+        result['games_developers'] = developers[0:10]
+        result['games_developers_total'] = len(developers)
+        result['games_genres'] = games_formats.percents(games, 'genres', 'genre', 'name', True)
+        return result
+
+    def normalize(self, value):
+        if type(value) is list:
+            return sorted(json.dumps(item, sort_keys=True, default=str) for item in value)
+        return value
+
+    def measure(self, title, function):
+        with CaptureQueriesContext(connection) as queries:
+            start = monotonic()
+            result = function()
+            duration = monotonic() - start
+        self.stdout.write(self.style.SUCCESS('{}: {:.3f} sec, {} queries'.format(title, duration, len(queries))))
+        return result
+
+    def handle(self, *args, **options):
+        game_ids = list(Game.objects.order_by('-added').values_list('id', flat=True)[0:options['count']])
+        if len(game_ids) < options['count']:
+            self.stdout.write(self.style.WARNING('only {} games are found'.format(len(game_ids))))
+        statuses = [status for status, _ in UserGame.STATUSES]
+
+        # the library is created in a transaction which is rolled back at the end
+        with transaction.atomic():
+            user = get_user_model().objects.create(
+                username='benchmark-statistics', email='benchmark@test.org',
+                settings={'recommendations_users_date': now().isoformat()},
+            )
+            UserGame.objects.bulk_create([
+                UserGame(user=user, game_id=game_id, status=statuses[i % len(statuses)], added=user.date_joined)
+                for i, game_id in enumerate(game_ids)
+            ], batch_size=5000)
+            self.stdout.write(self.style.SUCCESS('{} user games'.format(len(game_ids))))
+
+            legacy = self.measure('legacy full recalculation', lambda: self.legacy_statistics(user))
+            self.measure('counters build', lambda: statistics.rebuild(user.id))
+            self.measure('statistics from counters', lambda: user.set_statistics(['game'], commit=False))
+            # the order of the equal counts and the top of the developers and the persons can differ
+            different = [
+                key for key, value in legacy.items()
+                if key not in ('persons_top', 'games_developers')
+                and self.normalize(value) != self.normalize(user.statistics[key])
+            ]
+            self.stdout.write(self.style.SUCCESS('different statistics: {}'.format(different or 'none')))
+
+            changed = game_ids[0:options['changes']]
+            UserGame.objects.filter(user=user, game_id__in=changed).update(status=UserGame.STATUS_BEATEN)
+            statistics.mark(user.id, changed)
+            self.measure('{} changed games'.format(len(changed)), lambda: user.set_statistics(['game'], commit=False))
+
+            transaction.set_rollback(True)
@@ -11,6 +11,7 @@ from django.utils.timezone import now
 
 from apps.achievements.models import ParentAchievement
 from apps.games.models import Game
+from apps.utils.leaderboard import Leaderboard
 from apps.utils.models import InitialValueMixin
 from apps.utils.unchangeable import UnchangeableQuerySet
 
@@ -213,7 +214,17 @@ class CycleUser(models.Model):
     @cached_property
     def position(self):
         if not self.id:
-            return CycleUser.objects.filter(cycle_id=self.cycle_id).count() + 1
+            return leaderboard.count(self.cycle_id) + 1
+        position = leaderboard.position(self.cycle_id, self.user_id)
+        if position:
+            return position
+        # the record is created after the leaderboard is loaded
+        if leaderboard.set(self.cycle_id, self.user_id, self.karma):
+            return leaderboard.position(self.cycle_id, self.user_id)
+        return self.position_db
+
+    @property
+    def position_db(self):
         with connection.cursor() as cursor:
             cursor.execute(
                 'WITH subquery AS ({}) SELECT position FROM subquery '
@@ -238,7 +249,7 @@ class CycleUser(models.Model):
 
     @cached_property
     def users_total(self):
-        return CycleUser.objects.filter(cycle_id=self.cycle_id, karma__gt=0).count()
+        return leaderboard.total(self.cycle_id)
 
     @cached_property
     def users_count_edges(self):
@@ -253,8 +264,7 @@ class CycleUser(models.Model):
     @cached_property
     def users_group_karma(self):
         edge_0, edge_1 = self.users_count_edges
-        ids = CycleUser.objects.filter(cycle_id=self.cycle_id, karma__gt=0).values_list('id', flat=True)
-        return CycleUser.objects.filter(id__in=ids[edge_0:edge_1]).aggregate(sum=Sum('karma'))['sum'] or 0
+        return leaderboard.sum(self.cycle_id, edge_0, edge_1)
 
     def get_tokens_group(self, all_tokens):
         percent = self.PERCENTS[2]
@@ -293,6 +303,13 @@ class CycleUser(models.Model):
             return tokens_count
 
 
+def load_cycle_users(cycle_id):
+    return CycleUser.objects.filter(cycle_id=cycle_id).order_by().values_list('user_id', 'karma')
+
+
+leaderboard = Leaderboard('token.cycles', load_cycle_users)
+
+
 class CycleKarma(InitialValueMixin, models.Model):
     THRESHOLDS = [5, 20]
 
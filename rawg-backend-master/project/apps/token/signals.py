@@ -5,7 +5,7 @@ from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils.timezone import now
 
-from apps.token.models import Cycle, CycleKarma, GameStatus, Transaction
+from apps.token.models import Cycle, CycleKarma, CycleUser, GameStatus, Transaction, leaderboard
 from apps.token.tasks import achievements_to_active_cycle, notification, update_cycle_progress
 from apps.utils.unchangeable import unchangeable_pre_save
 
@@ -43,6 +43,12 @@ def cycle_karma_post_delete(instance, **kwargs):
     )
 
 
+@receiver(post_save, sender=CycleUser)
+def cycle_user_post_save(instance, **kwargs):
+    cycle_id, user_id, karma = instance.cycle_id, instance.user_id, instance.karma
+    transaction.on_commit(lambda: leaderboard.set(cycle_id, user_id, karma))
+
+
 pre_save.connect(unchangeable_pre_save, GameStatus)
 
 
@@ -3,7 +3,7 @@ from hashlib import sha1
 import dateutil
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
 from django.db.models import Sum
 from django.db.models.signals import post_delete
 from django.utils.timezone import now
@@ -43,7 +43,8 @@ def achievements_to_active_cycle(action, user_id=None, parent_achievement_id=Non
         parent_achievements = get_parent_achievements(cycle, kwargs=kwargs, one_user=user)
         if not add:
             # delete the cycle user record if it has no karma
-            models.CycleUser.objects.filter(user_id=user_id, cycle=cycle, karma=0).delete()
+            if models.CycleUser.objects.filter(user_id=user_id, cycle=cycle, karma=0).delete()[0]:
+                models.leaderboard.remove(cycle.id, user_id)
 
     elif action == 'user_achievement':
         try:
@@ -191,6 +192,7 @@ def update_cycle_progress(user_id=None, cycle_id=None, add=True):
         qs = get_user_model().objects.values_list('token_program', flat=True)
         if not cycle_user.karma and not qs.get(id=user_id):
             cycle_user.delete()
+            models.leaderboard.remove(cycle.id, user_id)
         else:
             cycle_user.save()
 
@@ -244,11 +246,18 @@ def update_yesterday_position():
     if not cycle:
         return
 
-    cycle_users = models.CycleUser.objects.filter(cycle=cycle)
-
-    for i, cycle_user in enumerate(cycle_users, start=1):
-        cycle_user.position_yesterday = i
-        cycle_user.save(update_fields=['position_yesterday'])
+    qs = models.CycleUser.objects.position(cycle.id).values_list('id', 'position')
+    positions, params = qs.query.sql_with_params()
+    with connection.cursor() as cursor:
+        sql = '''
+            UPDATE {table} SET position_yesterday = positions.position
+            FROM ({positions}) AS positions
+            WHERE {table}.id = positions.id
+        '''.format(table=models.CycleUser._meta.db_table, positions=positions)
+        cursor.execute(sql, params)
+
+    # the leaderboard of the active cycle is loaded again from the database once a day
+    models.leaderboard.reload(cycle.id)
 
 
 @celery.task(time_limit=600, ignore_result=True, acks_late=True, reject_on_worker_lost=True)
@@ -0,0 +1,51 @@
+import numpy as np
+from django.core.cache import cache
+
+from apps.users.models import UserGame
+
+CACHE_KEY = 'users.game_sets.{}'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def load(user_ids):
+    # the visible game ids of the users as arrays ordered by the number of the game additions,
+    # the users missed in the cache are read by one query
+    keys = {user_id: CACHE_KEY.format(user_id) for user_id in set(user_ids)}
+    cached = cache.get_many(list(keys.values()))
+    result = {}
+    missed = {}
+    for user_id, key in keys.items():
+        if key in cached:
+            result[user_id] = np.frombuffer(cached[key], dtype=np.uint32)
+        else:
+            missed[user_id] = []
+    if missed:
+        qs = UserGame.objects.visible().filter(user_id__in=list(missed)).order_by('game__added', 'game_id')
+        for user_id, game_id in qs.values_list('user_id', 'game_id'):
+            missed[user_id].append(game_id)
+        data = {}
+        for user_id, game_ids in missed.items():
+            result[user_id] = np.array(game_ids, dtype=np.uint32)
+            data[keys[user_id]] = result[user_id].tobytes()
+        cache.set_many(data, CACHE_TIMEOUT)
+    return result
+
+
+def invalidate(user_ids):
+    cache.delete_many([CACHE_KEY.format(user_id) for user_id in set(user_ids)])
+
+
+def as_array(games):
+    if isinstance(games, np.ndarray):
+        return games
+    return np.fromiter(set(games), dtype=np.uint32)
+
+
+def intersect(games, another_games):
+    return len(np.intersect1d(as_array(games), as_array(another_games), assume_unique=True))
+
+
+def shared(games, another_games, count):
+    # the first games of the user which are in the library of the another user, the order of the user is kept
+    games = as_array(games)
+    return games[np.isin(games, as_array(another_games), assume_unique=True)][0:count]
@@ -27,7 +27,7 @@ class Command(BaseCommand):
                 user.bio_html = urlize(linebreaksbr(user.bio))
                 user.save(update_fields=['bio_html'])
                 tasks.update_user_followers(user.id)
-                tasks.update_user_statistics(user.id, None)
+                tasks.update_user_statistics(user.id, None, rebuild=True)
                 tasks.because_you_completed(user.id)
                 tasks.save_user_platforms(user.id)
         self.stdout.write(self.style.SUCCESS('OK'))
@@ -0,0 +1,48 @@
+# Generated by Django 2.2 on 2026-10-18 12:00
+
+from django.conf import settings
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0075_auto_20230830_1210'),
+        ('users', '0031_auto_20231130_0923'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserGameStatistic',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keys', django.contrib.postgres.fields.ArrayField(
+                    base_field=models.CharField(max_length=30), default=list, size=None
+                )),
+                ('dirty', models.BooleanField(default=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='games.Game')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Game Statistic',
+                'verbose_name_plural': 'User Game Statistics',
+                'unique_together': {('user', 'game')},
+            },
+        ),
+        migrations.CreateModel(
+            name='UserStatisticCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=30)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Statistic Counter',
+                'verbose_name_plural': 'User Statistic Counters',
+                'unique_together': {('user', 'key')},
+            },
+        ),
+    ]
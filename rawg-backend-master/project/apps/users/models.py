@@ -24,7 +24,7 @@ from django.contrib.postgres.indexes import BrinIndex
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.validators import MinValueValidator
 from django.db import IntegrityError, connection, models, transaction
-from django.db.models import Count, Q
+from django.db.models import Count, Max, Q
 from django.db.models.functions import ExtractWeek, ExtractYear
 from django.template.defaultfilters import linebreaksbr, urlize
 from django.utils.dateparse import parse_datetime as parse
@@ -47,6 +47,7 @@ from apps.utils.dicts import find
 from apps.utils.emails import disposable_emails
 from apps.utils.haystack import clear_id
 from apps.utils.lang import get_site_by_current_language, get_site_by_language
+from apps.utils.list import split
 from apps.utils.models import AbstractPlatformUser, HiddenManager, HiddenModel, InitialValueMixin
 from apps.utils.player import RedisGuestPlayerDataStorage
 from apps.utils.upload import upload_to
@@ -442,6 +443,100 @@ class UserGame(HiddenModel):
 
         return result(user_game)
 
+    @classmethod
+    def create_user_games(cls, user, rows, only_created=False, store_slug=None, batch_size=2000):
+        # the set-wise version of create_user_game for the library imports,
+        # rows are (game_id, platform_slugs, playtime, last_played) tuples
+        rows = {row[0]: row for row in rows}
+        existing = {}
+        for game_ids in split(list(rows), batch_size):
+            existing.update((user_game.game_id, user_game) for user_game in cls.objects.filter(
+                user=user, game_id__in=game_ids
+            ))
+        created = []
+        updated = []
+        last_played_updated = []
+        for game_id, row in rows.items():
+            playtime, last_played = row[2], row[3]
+            user_game = existing.get(game_id)
+            if not user_game:
+                user_game = cls(user=user, game_id=game_id, is_imported=True, is_new=True, added=now())
+                if store_slug:
+                    user_game.set_playtime(store_slug, playtime)
+                user_game.last_played = last_played
+                created.append(user_game)
+            elif only_created:
+                # save only the last played date and don't run a post-save signal
+                if last_played and (not user_game.last_played or last_played > user_game.last_played):
+                    user_game.last_played = last_played
+                    last_played_updated.append(user_game)
+            else:
+                if playtime and store_slug:
+                    user_game.set_playtime(store_slug, playtime)
+                if last_played:
+                    user_game.last_played = last_played
+                user_game.added = now()
+                updated.append(user_game)
+        for user_games in split(created, batch_size):
+            try:
+                with transaction.atomic():
+                    cls.objects.bulk_create(user_games)
+            except IntegrityError as e:
+                if e.__cause__.pgcode != errorcodes.UNIQUE_VIOLATION:
+                    raise
+                # a game was added by a parallel request, the batch is saved one by one
+                for user_game in user_games:
+                    try:
+                        with transaction.atomic():
+                            user_game.save()
+                    except IntegrityError:
+                        user_game.pk = cls.objects.get(user=user, game_id=user_game.game_id).pk
+        cls.objects.bulk_update(updated, ['playtime_stores', 'playtime', 'last_played', 'added'], batch_size)
+        cls.objects.bulk_update(last_played_updated, ['last_played'], batch_size)
+
+        # the first platform is preferred, then any of the platforms
+        user_games = created + updated
+        game_platforms = {}
+        for game_ids in split([user_game.game_id for user_game in user_games], batch_size):
+            qs = games_models.GamePlatform.objects.filter(game_id__in=game_ids).order_by('id')
+            for game_id, platform_id, slug in qs.values_list('game_id', 'platform_id', 'platform__slug'):
+                game_platforms.setdefault(game_id, []).append((platform_id, slug))
+        platforms = []
+        for user_game in user_games:
+            slugs = rows[user_game.game_id][1] or []
+            candidates = game_platforms.get(user_game.game_id, [])
+            platform_id = next((pk for pk, slug in candidates if slugs and slug == slugs[0]), None) or next(
+                (pk for pk, slug in candidates if slug in slugs), None
+            )
+            if platform_id:
+                platforms.append(cls.platforms.through(usergame_id=user_game.pk, platform_id=platform_id))
+        cls.platforms.through.objects.bulk_create(platforms, batch_size, ignore_conflicts=True)
+
+        return [user_game for user_game in user_games if not user_game.hidden]
+
+
+class UserGameStatistic(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, models.CASCADE)
+    game = models.ForeignKey('games.Game', models.CASCADE)
+    keys = ArrayField(models.CharField(max_length=30), default=list)  # the counters applied for the user game
+    dirty = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name = 'User Game Statistic'
+        verbose_name_plural = 'User Game Statistics'
+        unique_together = ('user', 'game')
+
+
+class UserStatisticCounter(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, models.CASCADE)
+    key = models.CharField(max_length=30)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'User Statistic Counter'
+        verbose_name_plural = 'User Statistic Counters'
+        unique_together = ('user', 'key')
+
 
 class UserFavoriteGame(models.Model):
     MIN_POSITION = 0
@@ -919,13 +1014,15 @@ class User(InitialValueMixin, AbstractPlatformUser):
             }
         return data
 
-    def get_user_games_counters(self):
+    def get_user_games_counters(self, statuses=None):
         counters = {}
         for slug, title in UserGame.STATUSES:
             counters[slug] = 0
-        statuses = UserGame.objects.visible().filter(user_id=self.id).values('status').annotate(total=Count('status'))
-        for status in statuses:
-            counters[status['status']] = status['total']
+        if statuses is None:
+            statuses = UserGame.objects.visible().filter(user_id=self.id).values_list('status') \
+                .annotate(total=Count('status'))
+        for status, total in dict(statuses).items():
+            counters[status] = total
         counters['uncategorized'] = counters['owned']
         counters['owned'] = sum([count for _, count in counters.items()])
         return counters
@@ -970,20 +1067,24 @@ class User(InitialValueMixin, AbstractPlatformUser):
     def get_statistic_decades(self):
         return [1979, 1990, 2000, 2010, now().year]
 
-    def get_statistics_years(self, qs=None):
-        years = OrderedDict()
+    def get_statistics_years(self, qs=None, years=None):
+        result = OrderedDict()
         min_year, max_year = GameMinYear().get(), now().year
         for year in range(min_year, max_year + 1):
-            years[year] = {
+            result[year] = {
                 'year': year,
                 'count': 0,
             }
-        for year, count in self.get_years(max_year, qs):
-            years[year]['count'] = count
-        return list(years.values())
-
-    def get_statistics_years_top(self, qs=None):
-        all_years = dict(self.get_years(now().year, qs).order_by('released_year'))
+        if years is None:
+            years = self.get_years(max_year, qs)
+        for year, count in years:
+            result[year]['count'] = count
+        return list(result.values())
+
+    def get_statistics_years_top(self, qs=None, years=None):
+        if years is None:
+            years = list(self.get_years(now().year, qs).order_by('released_year'))
+        all_years = dict(years)
         decades = self.get_statistic_decades()
         intervals = []
         start = decades.pop(0)
@@ -1007,7 +1108,7 @@ class User(InitialValueMixin, AbstractPlatformUser):
             [interval for interval in intervals if interval['count']], key=lambda x: x['count'], reverse=True
         )
         if len(data) < 3:
-            data = self.get_years(now().year, qs).order_by('-count', '-released_year')
+            data = sorted(years, key=lambda x: (-x[1], -x[0]))
         else:
             data = [(interval['top_year'], interval['top_count']) for interval in data]
         years = {}
@@ -1027,19 +1128,14 @@ class User(InitialValueMixin, AbstractPlatformUser):
     def get_top_persons(self, qs=None):
         if qs is None:
             qs = UserGame.objects.visible().filter(user_id=self.id)
-        counter = {}
-        game_person = set()
-        users_games = qs.values_list('game_id', flat=True)
-        persons = GamePerson.objects.visible().filter(game_id__in=users_games)
-        for person_id, game_id, person_count in persons.values_list('person_id', 'game_id', 'person__games_count'):
-            value = counter.get(person_id) or {'games': 0, 'positions': 0, 'person': person_count}
-            value['positions'] += 1
-            if (person_id, game_id) not in game_person:
-                value['games'] += 1
-                game_person.add((person_id, game_id))
-            counter[person_id] = value
-        result = sorted(counter.items(), key=lambda x: (-x[1]['games'], -x[1]['person'], -x[1]['positions']))[0:15]
-        return [x[0] for x in result]
+        # the credits are aggregated by the database, only the top persons are fetched
+        persons = GamePerson.objects.visible().filter(game_id__in=qs.values('game_id')) \
+            .values('person_id') \
+            .annotate(games=Count('game_id', distinct=True), positions=Count('id')) \
+            .annotate(person_games=Max('person__games_count')) \
+            .order_by('-games', '-person_games', '-positions', 'person_id') \
+            .values_list('person_id', flat=True)
+        return list(persons[0:15])
 
     def get_real_user_games_count(self):
         return (
@@ -1067,43 +1163,45 @@ class User(InitialValueMixin, AbstractPlatformUser):
 
     def set_statistics(self, targets=None, commit=True, **kwargs):
         from apps.recommendations.tasks import update_user_recommendations
+        from apps.users import statistics as user_statistics
 
         if not self.statistics:
             self.statistics = {}
         fields = ['statistics']
         if not targets or 'game' in targets:
-            self.games_count = UserGame.objects.visible().filter(user=self).count()
+            counters = user_statistics.update(self.id)
+            statuses = counters.get('status', {})
+            self.games_count = sum(statuses.values())
             if not find(self.settings, 'recommendations_users_date') and self.games_count:
                 update_user_recommendations(self.id)
 
-            qs = UserGame.objects.prefetch_visible().filter(user=self).exclude(status=UserGame.STATUS_TOPLAY)
-            self.statistics['years'] = self.get_statistics_years(qs)
-            self.statistics['years_top'] = self.get_statistics_years_top(qs)
-            self.statistics['games_statuses'] = self.get_user_games_counters()
+            qs = UserGame.objects.visible().filter(user=self).exclude(status=UserGame.STATUS_TOPLAY)
+            years = sorted((year, count) for year, count in counters.get('year', {}).items() if year <= now().year)
+            self.statistics['years'] = self.get_statistics_years(years=years)
+            self.statistics['years_top'] = self.get_statistics_years_top(years=years)
+            self.statistics['games_statuses'] = self.get_user_games_counters(statuses)
             self.statistics['games_graph'] = self.get_user_games_graph(qs)
             self.statistics['persons_top'] = self.get_top_persons(qs)
 
-            games = []
-            user_game_platforms = {}
-            game_platforms = {}
-            for user_game in qs.prefetch_related('game__developers', 'game__genres'):
-                games.append(user_game.game)
-                user_game_platforms[user_game.game.id] = user_game.platforms.all()
-                game_platforms[user_game.game.id] = user_game.game.platforms.all()
-            games_to_play = []
-            game_platforms_to_play = {}
-            for user_game in UserGame.objects.prefetch_visible().filter(user=self, status=UserGame.STATUS_TOPLAY):
-                games_to_play.append(user_game.game)
-                game_platforms_to_play[user_game.game.id] = user_game.game.platforms.all()
-            self.statistics['games_platforms'] = games_formats.percents(games, user_game_platforms, 'platform', 'name')
-            self.statistics['games_platforms_all'] = games_formats.percents(games, game_platforms, 'platform', 'name')
-            self.statistics['games_platforms_to_play'] = games_formats.percents(
-                games_to_play, game_platforms_to_play, 'platform', 'name'
+            for key, kind in (
+                ('games_platforms', 'platform'),
+                ('games_platforms_all', 'platform_all'),
+                ('games_platforms_to_play', 'platform_to_play'),
+            ):
+                platforms = counters.get(kind, {})
+                self.statistics[key] = games_formats.counters_percents(
+                    platforms, games_models.Platform.objects.filter(id__in=list(platforms)), 'platform'
+                )
+            developers = counters.get('developer', {})
+            developers = games_formats.counters_percents(
+                developers, games_models.Developer.objects.visible().filter(id__in=list(developers)), 'developer'
             )
-            developers = games_formats.percents(games, 'developers', 'developer', 'name', True)
             self.statistics['games_developers'] = developers[0:10]
             self.statistics['games_developers_total'] = len(developers)
-            self.statistics['games_genres'] = games_formats.percents(games, 'genres', 'genre', 'name', True)
+            genres = counters.get('genre', {})
+            self.statistics['games_genres'] = games_formats.counters_percents(
+                genres, games_models.Genre.objects.visible().filter(id__in=list(genres)), 'genre'
+            )
 
             fields.append('games_count')
         if not targets or 'collection' in targets:
@@ -1139,29 +1237,38 @@ class User(InitialValueMixin, AbstractPlatformUser):
             get_user_model().objects.filter(id=self.id).update(**update)
 
     def get_compatibility(self, another_user_id):
-        users = (self.id, another_user_id)
-        all_games = UserGame.objects.visible().filter(user_id__in=users).values_list('user_id', 'game_id')
-        games = set()
-        another_games = set()
-        for user_id, game_id in all_games:
-            if user_id == self.id:
-                games.add(game_id)
-            else:
-                another_games.add(game_id)
-        percent, _ = self.get_compatibility_by_games(games, another_games=another_games)
-        return {
-            'percent': percent,
-            'label': 'low' if percent < 33 else ('middle' if percent < 67 else 'high')
-        }
+        return self.get_compatibility_many([another_user_id])[another_user_id]
+
+    def get_compatibility_many(self, user_ids):
+        from apps.users import game_sets
+
+        sets = game_sets.load([self.id] + list(user_ids))
+        result = {}
+        for user_id in user_ids:
+            percent, _ = self.get_compatibility_by_games(sets[self.id], another_games=sets[user_id])
+            result[user_id] = {
+                'percent': percent,
+                'label': 'low' if percent < 33 else ('middle' if percent < 67 else 'high')
+            }
+        return result
 
     def get_similar_games(self, another_user_id, count=10):
-        users = (self.id, another_user_id)
-        games = UserGame.objects.visible().values('game') \
-            .annotate(count=Count('id')) \
-            .filter(user_id__in=users, count=2) \
-            .order_by('-count', 'game__added') \
-            .values_list('game_id', 'game__slug', 'game__name')[0:count]
-        return list([{'id': pk, 'slug': slug, 'name': name} for pk, slug, name in games])
+        return self.get_similar_games_many([another_user_id], count)[another_user_id]
+
+    def get_similar_games_many(self, user_ids, count=10):
+        from apps.users import game_sets
+
+        sets = game_sets.load([self.id] + list(user_ids))
+        shared = {user_id: game_sets.shared(sets[self.id], sets[user_id], count).tolist() for user_id in user_ids}
+        games = {}
+        for game_ids in shared.values():
+            games.update((game_id, None) for game_id in game_ids)
+        for pk, slug, name in games_models.Game.objects.filter(id__in=list(games)).values_list('id', 'slug', 'name'):
+            games[pk] = {'id': pk, 'slug': slug, 'name': name}
+        return {
+            user_id: [games[game_id] for game_id in game_ids if games[game_id]]
+            for user_id, game_ids in shared.items()
+        }
 
     def get_context(self, request, is_current=False):
         result = False
@@ -1264,12 +1371,13 @@ class User(InitialValueMixin, AbstractPlatformUser):
 
     @staticmethod
     def get_compatibility_by_games(games, another_user_id=None, another_games=None):
-        if not another_games:
-            another_games = UserGame.objects.visible().filter(user_id=another_user_id) \
-                .values_list('game_id', flat=True)
-        intersect = len(set(another_games).intersection(games))
-        percent_my = int(intersect / (len(games) / 100)) if games else 0
-        percent_another = int(intersect / (len(another_games) / 100)) if another_games else 0
+        from apps.users import game_sets
+
+        if another_games is None:
+            another_games = game_sets.load([another_user_id])[another_user_id]
+        intersect = game_sets.intersect(games, another_games)
+        percent_my = int(intersect / (len(games) / 100)) if len(games) else 0
+        percent_another = int(intersect / (len(another_games) / 100)) if len(another_games) else 0
         return percent_my, percent_another
 
     @classmethod
@@ -8,11 +8,11 @@ from django.dispatch import receiver
 
 from apps.common.cache import CommonContentType
 from apps.games.models import Collection
-from apps.games.tasks import update_collection, update_game
+from apps.games.tasks import update_collection, update_game, update_games
 from apps.recommendations.models import UserRecommendationQueue
 from apps.recommendations.tasks import update_user_recommendations
-from apps.stat.tasks import add_recommended_game_adding
-from apps.users import models, tasks
+from apps.stat.tasks import add_recommended_game_adding, add_recommended_games_adding
+from apps.users import game_sets, models, statistics, tasks
 from apps.users.models import AnonymousPlayer, AuthenticatedPlayer, Balance
 from apps.utils.game_session import PlayerGameSessionController
 
@@ -24,17 +24,33 @@ def user_game_post_save_base(instances=None, instance=None, created=False, from_
         instances = [instance]
     user_id = None
     because_you_completed = None
+    user_games = {}
+    playtime_game_ids = []
     for instance in instances:
+        user_games.setdefault(instance.user_id, []).append(instance.game_id)
         update_playtime = (
             (created and instance.playtime)
             or instance.playtime != getattr(instance, 'initial_playtime', 0)
         )
-        update_game.delay(instance.game_id, update_playtime)
+        if update_playtime:
+            playtime_game_ids.append(instance.game_id)
         if instance.status == models.UserGame.STATUS_BEATEN:
             because_you_completed = instance.game_id
         user_id = instance.user_id
-        # when a user adds the game into his library hide the game from user recommendations and add into statistics
-        add_recommended_game_adding.delay(user_id, instance.game_id, instance.status, from_import, referer)
+        if not from_import:
+            update_game.delay(instance.game_id, update_playtime)
+            # when a user adds the game into his library hide the game from user recommendations
+            # and add into statistics
+            add_recommended_game_adding.delay(user_id, instance.game_id, instance.status, from_import, referer)
+    if from_import and instances:
+        # an import sends the games of the library at once
+        update_games.delay([instance.game_id for instance in instances], playtime_game_ids)
+        add_recommended_games_adding.delay(
+            user_id, [(instance.game_id, instance.status) for instance in instances], from_import, referer
+        )
+    game_sets.invalidate(user_games.keys())
+    for user_games_user_id, game_ids in user_games.items():
+        statistics.mark(user_games_user_id, game_ids)
     if user_id:
         # update user's statistics
         tasks.update_user_statistics.delay(user_id, ['game', 'review'])
@@ -49,6 +65,10 @@ def user_game_post_save_base(instances=None, instance=None, created=False, from_
 
 @receiver(post_save, sender=models.UserGame)
 def user_game_post_save(sender, instance, created, **kwargs):
+    # the cached game sets are dropped right away and after the commit,
+    # a request between them could cache the previous games
+    game_sets.invalidate([instance.user_id])
+
     def on_commit():
         user_game_post_save_base(instance=instance, created=created, referer=getattr(instance, '_referer', None))
     transaction.on_commit(on_commit)
@@ -56,8 +76,12 @@ def user_game_post_save(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=models.UserGame)
 def user_game_post_delete(instance, **kwargs):
+    game_sets.invalidate([instance.user_id])
+
     def on_commit():
         update_game.delay(instance.game_id)
+        game_sets.invalidate([instance.user_id])
+        statistics.mark(instance.user_id, [instance.game_id])
         tasks.update_user_statistics.delay(instance.user_id, ['game', 'review'])
     transaction.on_commit(on_commit)
 
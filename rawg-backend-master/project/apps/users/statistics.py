@@ -0,0 +1,155 @@
+import json
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models.functions import ExtractYear
+
+from apps.games.models import Game, GamePlatform
+from apps.users.models import UserGame, UserGameStatistic, UserStatisticCounter
+
+REBUILT_KEY = 'rebuilt'
+
+
+def user_game_keys(user_id, game_ids=None):
+    # the counters of every visible user game: the status for all the games, the year, the platforms,
+    # the developers and the genres for the library and the game platforms for the wishlist
+    qs = UserGame.objects.visible().filter(user_id=user_id)
+    if game_ids is not None:
+        qs = qs.filter(game_id__in=game_ids)
+    keys = {}
+    to_play = set()
+    for game_id, status, year in qs.annotate(year=ExtractYear('game__released')) \
+            .values_list('game_id', 'status', 'year'):
+        keys[game_id] = ['status:{}'.format(status)]
+        if status == UserGame.STATUS_TOPLAY:
+            to_play.add(game_id)
+        elif year and year > 1900:
+            keys[game_id].append('year:{}'.format(year))
+    if not keys:
+        return keys
+    games = qs.values('game_id')
+    relations = (
+        ('platform', UserGame.platforms.through.objects.filter(usergame__in=qs.values('id'))
+            .values_list('usergame__game_id', 'platform_id')),
+        ('platform_all', GamePlatform.objects.filter(game_id__in=games).values_list('game_id', 'platform_id')),
+        ('developer', Game.developers.through.objects.filter(game_id__in=games)
+            .values_list('game_id', 'developer_id')),
+        ('genre', Game.genres.through.objects.filter(game_id__in=games)
+            .values_list('game_id', 'genre_id')),
+    )
+    for kind, rows in relations:
+        for game_id, object_id in rows:
+            if game_id not in keys:
+                continue
+            if game_id in to_play:
+                if kind == 'platform_all':
+                    keys[game_id].append('platform_to_play:{}'.format(object_id))
+                continue
+            keys[game_id].append('{}:{}'.format(kind, object_id))
+    return keys
+
+
+def mark(user_id, game_ids):
+    # the user games are recalculated by the next update of the user statistics
+    if not game_ids:
+        return
+    with connection.cursor() as cursor:
+        sql = '''
+            insert into {statistic} (user_id, game_id, keys, dirty)
+            select users.id, games.id, '{{}}', true
+            from {users} as users, {games} as games
+            where users.id = %s and games.id = any(%s)
+            on conflict (user_id, game_id) do update set dirty = true
+        '''.format(
+            statistic=UserGameStatistic._meta.db_table,
+            users=get_user_model()._meta.db_table,
+            games=Game._meta.db_table,
+        )
+        cursor.execute(sql, [user_id, list(set(game_ids))])
+
+
+def mark_games(game_ids):
+    # the released date, the platforms, the developers or the genres of the games are changed,
+    # the games of all their owners are recalculated by the next update of the user statistics
+    if not game_ids:
+        return
+    UserGameStatistic.objects.filter(game_id__in=set(game_ids), dirty=False).update(dirty=True)
+
+
+def write_counters(user_id, delta):
+    delta = {key: count for key, count in delta.items() if count}
+    if not delta:
+        return
+    with connection.cursor() as cursor:
+        sql = '''
+            insert into {table} (user_id, key, count)
+            select %s, unnest(%s::varchar[]), unnest(%s::integer[])
+            on conflict (user_id, key) do update set count = {table}.count + excluded.count
+        '''.format(table=UserStatisticCounter._meta.db_table)
+        cursor.execute(sql, [user_id, list(delta.keys()), list(delta.values())])
+    UserStatisticCounter.objects.filter(user_id=user_id, count__lte=0).delete()
+
+
+def write_keys(user_id, keys):
+    if not keys:
+        return
+    with connection.cursor() as cursor:
+        sql = '''
+            update {table} set keys = array(select jsonb_array_elements_text(data.value))
+            from jsonb_each(%s::jsonb) as data
+            where {table}.user_id = %s and {table}.game_id = data.key::integer
+        '''.format(table=UserGameStatistic._meta.db_table)
+        cursor.execute(sql, [json.dumps(keys), user_id])
+
+
+def rebuild(user_id):
+    # the repair tool: the counters are calculated from all the user games
+    with transaction.atomic():
+        UserGameStatistic.objects.filter(user_id=user_id).delete()
+        UserStatisticCounter.objects.filter(user_id=user_id).delete()
+        keys = user_game_keys(user_id)
+        UserGameStatistic.objects.bulk_create([
+            UserGameStatistic(user_id=user_id, game_id=game_id, keys=game_keys, dirty=False)
+            for game_id, game_keys in keys.items()
+        ], batch_size=5000)
+        totals = Counter({REBUILT_KEY: 1})
+        for game_keys in keys.values():
+            totals.update(game_keys)
+        UserStatisticCounter.objects.bulk_create([
+            UserStatisticCounter(user_id=user_id, key=key, count=count) for key, count in totals.items()
+        ], batch_size=5000)
+
+
+def update(user_id):
+    # only the user games marked by the signals are recalculated, the difference is added to the counters
+    with transaction.atomic():
+        if not UserStatisticCounter.objects.filter(user_id=user_id, key=REBUILT_KEY).exists():
+            rebuild(user_id)
+            return counters(user_id)
+        old = dict(
+            UserGameStatistic.objects.select_for_update()
+            .filter(user_id=user_id, dirty=True)
+            .values_list('game_id', 'keys')
+        )
+        if old:
+            UserGameStatistic.objects.filter(user_id=user_id, game_id__in=list(old)).update(dirty=False)
+            new = user_game_keys(user_id, list(old))
+            delta = Counter()
+            for game_id, game_keys in old.items():
+                delta.subtract(game_keys)
+                delta.update(new.get(game_id, ()))
+            write_counters(user_id, delta)
+            write_keys(user_id, new)
+            UserGameStatistic.objects.filter(
+                user_id=user_id, game_id__in=[game_id for game_id in old if game_id not in new]
+            ).delete()
+    return counters(user_id)
+
+
+def counters(user_id):
+    result = {}
+    for key, count in UserStatisticCounter.objects.filter(user_id=user_id).values_list('key', 'count'):
+        kind, _, value = key.partition(':')
+        result.setdefault(kind, {})[int(value) if value.isdigit() else value] = count
+    return result
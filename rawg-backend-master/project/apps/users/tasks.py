@@ -16,6 +16,7 @@ from apps.feedback.models import Feedback
 from apps.games.models import Game
 from apps.pusher.models import Notification
 from apps.stat.models import Visit
+from apps.users import statistics
 from apps.users.models import UserFollowElement, UserGame
 from apps.utils.celery import lock
 from apps.utils.dates import midnight
@@ -56,7 +57,7 @@ def update_user_followers(self, user_id):
     time_limit=90, bind=True, ignore_result=True, max_retries=3, default_retry_delay=65,
     acks_late=True, reject_on_worker_lost=True
 )
-def update_user_statistics(self, user_id, targets):
+def update_user_statistics(self, user_id, targets, rebuild=False):
     with lock(user_lock_id.format(f'statistics:{user_id}'), self.app.oid) as acquired:
         if not acquired:
             return
@@ -72,6 +73,8 @@ def update_user_statistics(self, user_id, targets):
             if self.request.retries == 1:
                 return
             self.retry()
+        if rebuild:
+            statistics.rebuild(user_id)
         try:
             user.set_statistics(targets)
         except UserGame.game.RelatedObjectDoesNotExist:
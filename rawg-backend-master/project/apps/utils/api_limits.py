@@ -0,0 +1,214 @@
+from collections import defaultdict
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils.timezone import now
+from redis import ResponseError
+
+from apps.stat.models import APIUserCounter
+from apps.utils import storages
+from apps.utils.celery import lock
+
+USAGE_TIMEOUT = 60 * 60 * 24
+
+HIT_SCRIPT = '''
+local data = redis.call('hmget', KEYS[1], 'period', 'used')
+if data[1] ~= ARGV[1] then
+    return -1
+end
+if tonumber(data[2]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('hincrby', KEYS[1], 'used', 1)
+redis.call('hincrby', KEYS[2], ARGV[3], 1)
+return 1
+'''
+
+START_SCRIPT = '''
+if redis.call('hget', KEYS[1], 'period') ~= ARGV[1] then
+    redis.call('hset', KEYS[1], 'period', ARGV[1], 'used', ARGV[2])
+end
+redis.call('expire', KEYS[1], ARGV[3])
+'''
+
+
+def pending_field(user_id, day):
+    return '{}:{}'.format(user_id, day.isoformat())
+
+
+def parse_pending_field(field):
+    user_id, day = field.split(':')
+    return int(user_id), date.fromisoformat(day)
+
+
+class RedisStorage(storages.RedisStorage):
+    # the usage of the current api period of every user is a hash with the period start and the number of requests,
+    # a request is checked and counted by one script, so all the workers share the same limit,
+    # the requests which are not in the database yet are kept in a separate hash like in apps.utils.counters
+    scripts = {'hit': HIT_SCRIPT, 'start': START_SCRIPT}
+
+    def __init__(self, name, client=None):
+        super().__init__(name, client)
+        self.usage_key = 'api_limits.{}.usage.{{}}'.format(name)
+        self.pending_key = 'api_limits.{}.pending'.format(name)
+        self.flushing_key = 'api_limits.{}.flushing'.format(name)
+
+    def hit(self, user_id, period, limit, day):
+        # 1 - the request is counted, 0 - the limit is reached, -1 - the usage of the period is not loaded
+        return self.run_script(
+            'hit',
+            keys=[self.usage_key.format(user_id), self.pending_key],
+            args=[period, limit, pending_field(user_id, day)],
+        )
+
+    def start(self, user_id, period, used):
+        self.run_script('start', keys=[self.usage_key.format(user_id)], args=[period, used, USAGE_TIMEOUT])
+
+    def reset(self, user_id):
+        self.get_client().delete(self.usage_key.format(user_id))
+
+    def pending(self, user_id):
+        client = self.get_client()
+        match = '{}:*'.format(user_id)
+        return sum(
+            int(value)
+            for key in (self.pending_key, self.flushing_key)
+            for _, value in client.hscan_iter(key, match=match)
+        )
+
+    def take(self):
+        client = self.get_client()
+        # requests of a failed flush are taken again before the new ones
+        if not client.exists(self.flushing_key):
+            try:
+                client.renamenx(self.pending_key, self.flushing_key)
+            except ResponseError:
+                # there is nothing to rename
+                return {}
+        return {
+            parse_pending_field(field.decode()): int(value)
+            for field, value in client.hgetall(self.flushing_key).items()
+        }
+
+    def done(self):
+        self.get_client().delete(self.flushing_key)
+
+
+class MemoryStorage(storages.MemoryStorage):
+    def __init__(self, name):
+        super().__init__(name)
+        self.usage = {}
+        self.deltas = defaultdict(int)
+        self.flushing = {}
+
+    def hit(self, user_id, period, limit, day):
+        with self.lock:
+            usage_period, used = self.usage.get(user_id, (None, 0))
+            if usage_period != period:
+                return -1
+            if used >= limit:
+                return 0
+            self.usage[user_id] = (period, used + 1)
+            self.deltas[(user_id, day)] += 1
+            return 1
+
+    def start(self, user_id, period, used):
+        with self.lock:
+            if self.usage.get(user_id, (None, 0))[0] != period:
+                self.usage[user_id] = (period, used)
+
+    def reset(self, user_id):
+        with self.lock:
+            self.usage.pop(user_id, None)
+
+    def pending(self, user_id):
+        with self.lock:
+            return sum(
+                count
+                for deltas in (self.deltas, self.flushing)
+                for (pk, _), count in deltas.items() if pk == user_id
+            )
+
+    def take(self):
+        with self.lock:
+            if not self.flushing:
+                self.flushing, self.deltas = dict(self.deltas), defaultdict(int)
+            return dict(self.flushing)
+
+    def done(self):
+        with self.lock:
+            self.flushing = {}
+
+
+STORAGES = {
+    'redis': RedisStorage,
+    'memory': MemoryStorage,
+}
+
+
+class ApiLimiter:
+    # the api requests of the current period are counted in the shared storage, the usage is loaded from the database
+    # once a day or when the period changes, the counted requests are moved to the database by one bulk insert
+    def __init__(self, name, storage=None):
+        self.name = name
+        self.storage = storage or storages.get_storage(STORAGES, name)
+
+    def hit(self, user_id, limit, date_api):
+        period = date_api.isoformat()
+        day = now().date()
+        result = self.storage.hit(user_id, period, limit, day)
+        if result < 0:
+            self.storage.start(user_id, period, self.used(user_id, date_api))
+            result = self.storage.hit(user_id, period, limit, day)
+        return result > 0
+
+    def used(self, user_id, date_api):
+        return self.used_db(user_id, date_api) + self.pending(user_id)
+
+    def used_db(self, user_id, date_api):
+        return sum(
+            APIUserCounter.objects
+            .filter(user_id=user_id, date__gte=date_api)
+            .values_list('count', flat=True)
+        )
+
+    def pending(self, user_id):
+        return self.storage.pending(user_id)
+
+    def reset(self, user_id):
+        self.storage.reset(user_id)
+
+    def flush(self):
+        with lock('apps.utils.api_limits.flush.{}'.format(self.name), self.name, 60) as acquired:
+            if not acquired:
+                return 0
+            deltas = {key: count for key, count in self.storage.take().items() if count}
+            if deltas:
+                with transaction.atomic():
+                    self.write(deltas)
+            self.storage.done()
+            return len(deltas)
+
+    def write(self, deltas):
+        # the requests of the deleted users are skipped
+        user_ids, dates, counts = [], [], []
+        for (user_id, day), count in deltas.items():
+            user_ids.append(user_id)
+            dates.append(day)
+            counts.append(count)
+        with connection.cursor() as cursor:
+            sql = '''
+                insert into {counter} (user_id, date, count)
+                select data.user_id, data.date, data.count
+                from unnest(%s::integer[], %s::date[], %s::integer[]) as data (user_id, date, count)
+                join {users} as users on users.id = data.user_id
+                on conflict (user_id, date) do update set count = {counter}.count + excluded.count
+            '''.format(
+                counter=APIUserCounter._meta.db_table,
+                users=get_user_model()._meta.db_table,
+            )
+            cursor.execute(sql, [user_ids, dates, counts])
+
+
+limiter = ApiLimiter('api')
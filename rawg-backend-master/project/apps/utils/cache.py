@@ -1,6 +1,9 @@
 import importlib
 import inspect
+import pickle
+import threading
 import time
+from collections import OrderedDict
 
 from cacheback.base import Job as OldJob
 from django.conf import settings
@@ -9,15 +12,128 @@ from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.core.cache.backends.memcached import PyLibMCCache
 
 
+class LocalCache:
+    """
+    A process-local LRU cache with TTL, which is used as the first tier of cacheback jobs.
+    Values are kept pickled, so every caller gets its own copy as it does from the shared cache.
+    """
+    def __init__(self):
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_size(self):
+        return settings.CACHEBACK_LOCAL_MAX_SIZE
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self.data[key]
+                self.misses += 1
+                return False, None
+            self.data.move_to_end(key)
+            self.hits += 1
+            value = item[1]
+        return True, pickle.loads(value)
+
+    def set(self, key, value, timeout):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.data[key] = (time.monotonic() + timeout, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def stats(self):
+        return {'size': len(self.data), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+local_cache = LocalCache()
+
+
 class Job(OldJob):
     is_warm = False
+    # seconds to keep results in the process-local tier, 0 disables it
+    local_lifetime = 0
+    # seconds between checks of the version which invalidates the local tier in all processes
+    local_version_interval = 1
+    local_versions = {}
+
+    def get(self, *raw_args, **raw_kwargs):
+        if not self.local_lifetime or not local_cache.max_size:
+            return super().get(*raw_args, **raw_kwargs)
+        key = (
+            self.key(*self.prepare_args(*raw_args), **self.prepare_kwargs(**raw_kwargs)),
+            self.local_version(),
+        )
+        is_found, result = local_cache.get(key)
+        if is_found:
+            return result
+        result = super().get(*raw_args, **raw_kwargs)
+        if result is not None:
+            local_cache.set(key, result, min(self.local_lifetime, self.lifetime))
+        return result
 
     def refresh(self, *args, **kwargs):
+        is_replaced = self.local_lifetime and self.cache.get(self.key(*args, **kwargs)) is not None
         result = super().refresh(*args, **kwargs)
         if self.is_warm:
             cache.set(self.expired_key(*args, **kwargs), time.time() + self.lifetime, self.lifetime)
+        # the version is changed after the new value is stored, before it the other processes would keep
+        # the old shared value in their local tiers under the new version
+        if is_replaced:
+            self.local_invalidate()
         return result
 
+    def invalidate(self, *raw_args, **raw_kwargs):
+        # an existing value is refreshed asynchronously and the refresh changes the version
+        is_refreshed = self.local_lifetime and self.cache.get(
+            self.key(*self.prepare_args(*raw_args), **self.prepare_kwargs(**raw_kwargs))
+        ) is not None
+        super().invalidate(*raw_args, **raw_kwargs)
+        if not is_refreshed:
+            self.local_invalidate()
+
+    def delete(self, *raw_args, **raw_kwargs):
+        super().delete(*raw_args, **raw_kwargs)
+        self.local_invalidate()
+
+    def set(self, *raw_args, **raw_kwargs):
+        super().set(*raw_args, **raw_kwargs)
+        self.local_invalidate()
+
+    def local_version_key(self):
+        return '{}:local_version'.format(self.class_path)
+
+    def local_version(self):
+        version, checked = self.local_versions.get(self.class_path, (None, None))
+        if checked is None or time.monotonic() - checked >= self.local_version_interval:
+            version = self.cache.get(self.local_version_key(), 0)
+            self.local_versions[self.class_path] = (version, time.monotonic())
+        return version
+
+    def local_invalidate(self):
+        # other processes see the new version after local_version_interval at most
+        if not self.local_lifetime:
+            return
+        key = self.local_version_key()
+        if not self.cache.add(key, 1, None):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, None)
+        self.local_versions.pop(self.class_path, None)
+
     def expired_at(self, *args, **kwargs):
         return cache.get(self.expired_key(*args, **kwargs))
 
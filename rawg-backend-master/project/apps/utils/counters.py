@@ -0,0 +1,124 @@
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from redis import ResponseError
+
+from apps.utils import storages
+from apps.utils.celery import lock
+
+buffers = {}
+
+
+class RedisStorage(storages.RedisStorage):
+    # pending deltas are kept in a hash, a flush renames it to take all the deltas at once
+    # and keeps them readable until they are in the database
+    def __init__(self, name, client=None):
+        super().__init__(name, client)
+        self.key = 'counters.{}'.format(name)
+        self.flushing_key = 'counters.{}.flushing'.format(name)
+
+    def incr(self, pk, amount):
+        self.get_client().hincrby(self.key, pk, amount)
+
+    def pending(self, pks):
+        with self.get_client().pipeline(transaction=False) as pipe:
+            pipe.hmget(self.key, pks)
+            pipe.hmget(self.flushing_key, pks)
+            values, flushing = pipe.execute()
+        return {pk: int(value or 0) + int(flushing or 0) for pk, value, flushing in zip(pks, values, flushing)}
+
+    def take(self):
+        client = self.get_client()
+        # deltas of a failed flush are taken again before the new ones
+        if not client.exists(self.flushing_key):
+            try:
+                client.renamenx(self.key, self.flushing_key)
+            except ResponseError:
+                # there is nothing to rename
+                return {}
+        return {int(pk): int(value) for pk, value in client.hgetall(self.flushing_key).items()}
+
+    def done(self):
+        self.get_client().delete(self.flushing_key)
+
+
+class MemoryStorage(storages.MemoryStorage):
+    def __init__(self, name):
+        super().__init__(name)
+        self.deltas = defaultdict(int)
+        self.flushing = {}
+
+    def incr(self, pk, amount):
+        with self.lock:
+            self.deltas[int(pk)] += amount
+
+    def pending(self, pks):
+        with self.lock:
+            return {pk: self.deltas.get(int(pk), 0) + self.flushing.get(int(pk), 0) for pk in pks}
+
+    def take(self):
+        with self.lock:
+            if not self.flushing:
+                self.flushing, self.deltas = dict(self.deltas), defaultdict(int)
+            return dict(self.flushing)
+
+    def done(self):
+        with self.lock:
+            self.flushing = {}
+
+
+STORAGES = {
+    'redis': RedisStorage,
+    'memory': MemoryStorage,
+}
+
+
+class CounterBuffer:
+    # write-behind buffer of an integer field: increments go to the storage and are moved to the database
+    # by one bulk update on every flush, reads return the database value plus the pending deltas
+    def __init__(self, name, model, field, storage=None):
+        self.name = name
+        self.model = model
+        self.field = field
+        self.storage = storage or storages.get_storage(STORAGES, name)
+        buffers[name] = self
+
+    def get_model(self):
+        if isinstance(self.model, str):
+            self.model = apps.get_model(self.model)
+        return self.model
+
+    def get_queryset(self):
+        return self.get_model().objects.all()
+
+    def incr(self, pk, amount=1):
+        self.storage.incr(pk, amount)
+
+    def pending(self, pks):
+        return self.storage.pending(list(pks))
+
+    def value(self, pk, db_value=None):
+        if db_value is None:
+            db_value = self.get_queryset().filter(pk=pk).values_list(self.field, flat=True).first() or 0
+        return db_value + self.pending([pk])[pk]
+
+    def flush(self):
+        with lock('apps.utils.counters.flush.{}'.format(self.name), self.name, 60) as acquired:
+            if not acquired:
+                return 0
+            deltas = {pk: delta for pk, delta in self.storage.take().items() if delta}
+            updated = 0
+            if deltas:
+                whens = [When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()]
+                with transaction.atomic():
+                    updated = self.get_queryset().filter(pk__in=deltas.keys()).update(**{
+                        self.field: F(self.field) + Case(*whens, default=Value(0), output_field=IntegerField())
+                    })
+            self.storage.done()
+            return updated
+
+
+def flush_all():
+    return {name: buffer.flush() for name, buffer in buffers.items()}
@@ -94,3 +94,7 @@ class Cast(Func):
             template="%(function)s(%(expressions)s AS %(type)s)",
             **extra_context
         )
+
+
+class ArrayRemove(Func):
+    function = 'ARRAY_REMOVE'
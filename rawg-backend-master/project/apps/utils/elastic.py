@@ -1,9 +1,19 @@
+import copy
+import itertools
 import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from time import time
 
+import django
 import elasticsearch
+from django.apps import apps
 from django.conf import settings
-from elasticsearch.helpers import bulk, scan
+from django.db import connections as db_connections
+from django.utils.timezone import now
+from elasticsearch.helpers import bulk, parallel_bulk, streaming_bulk
 from haystack.constants import DJANGO_CT, ID
 from haystack.exceptions import SkipDocument
 from haystack.models import SearchResult
@@ -217,10 +227,14 @@ class ElasticsearchSearchBackend(Elasticsearch6SearchBackend):
         if not self.setup_complete:
             self.setup()
 
+        post_filter = kwargs.pop('post_filter', None)
         search_kwargs = self.build_search_kwargs(query_string, **kwargs)
         if search_kwargs.get('custom_query'):
             search_kwargs['query'] = search_kwargs['custom_query']
             del search_kwargs['custom_query']
+        if post_filter:
+            # the post filter is applied to the hits only, the facets are counted without it
+            search_kwargs['post_filter'] = post_filter
 
         order_fields = set()
         for order in search_kwargs.get('sort', []):
@@ -277,16 +291,11 @@ class ElasticsearchSearchBackend(Elasticsearch6SearchBackend):
                 for model in models:
                     models_to_delete.append("%s:%s" % (DJANGO_CT, get_model_ct(model)))
 
-                # Delete using scroll API
+                # one request deletes all the documents on the side of the cluster
                 query = {'query': {'query_string': {'query': " OR ".join(models_to_delete)}}}
-                generator = scan(self.conn, query=query, index=self.index_name, doc_type='modelresult')
-                actions = ({
-                    '_op_type': 'delete',
-                    '_id': doc['_id'],
-                } for doc in generator)
-                bulk(self.conn, actions=actions, index=self.index_name, doc_type='modelresult',
-                     **settings.ELASTIC_BULK)
-                self.conn.indices.refresh(index=self.index_name)
+                self.conn.delete_by_query(
+                    index=self.index_name, doc_type='modelresult', body=query, conflicts='proceed', refresh=True
+                )
 
         except elasticsearch.TransportError as e:
             if not self.silently_fail:
@@ -309,19 +318,27 @@ class ElasticsearchSearchBackend(Elasticsearch6SearchBackend):
                 self.log.error("Failed to add documents to Elasticsearch: %s", e, exc_info=True)
                 return
 
-        prepped_docs = []
+        # documents are streamed into the bulk requests instead of being collected in a list
+        bulk(self.conn, self.prepare_documents(index, iterable), index=self.index_name, doc_type='modelresult',
+             **settings.ELASTIC_BULK)
 
-        for obj in iterable:
-            try:
-                prepped_data = index.full_prepare(obj)
-                final_data = {}
+        if commit:
+            self.conn.indices.refresh(index=self.index_name)
 
-                # Convert the data to make sure it's happy.
-                for key, value in prepped_data.items():
-                    final_data[key] = self._from_python(value)
-                final_data['_id'] = final_data[ID]
+    def prepare_document(self, index, obj):
+        prepped_data = index.full_prepare(obj)
+        final_data = {}
 
-                prepped_docs.append(final_data)
+        # Convert the data to make sure it's happy.
+        for key, value in prepped_data.items():
+            final_data[key] = self._from_python(value)
+        final_data['_id'] = final_data[ID]
+        return final_data
+
+    def prepare_documents(self, index, iterable):
+        for obj in iterable:
+            try:
+                yield self.prepare_document(index, obj)
             except SkipDocument:
                 self.log.debug(u"Indexing for object `%s` skipped", obj)
             except elasticsearch.TransportError as e:
@@ -335,28 +352,135 @@ class ElasticsearchSearchBackend(Elasticsearch6SearchBackend):
                                extra={"data": {"index": index,
                                                "object": get_identifier(obj)}})
 
-        bulk(self.conn, prepped_docs, index=self.index_name, doc_type='modelresult', **settings.ELASTIC_BULK)
+    def reindex(self, processes=4, batch_size=1000, thread_count=4, keep_old=False):
+        """
+        Builds a new versioned index and switches the alias to it, the current index serves the searches
+        until the switch. Objects are read by a server-side cursor, prepared by a process pool
+        and streamed into the bulk requests, so the documents are never collected in the memory.
+        """
+        from haystack import connections
 
-        if commit:
-            self.conn.indices.refresh(index=self.index_name)
+        unified_index = connections[self.connection_alias].get_unified_index()
+        index_name = '{}_{}'.format(self.index_name, datetime.now().strftime('%Y%m%d%H%M%S'))
+        self.create_index(index_name, unified_index)
+        started = now()
+        total, errors = self.bulk_documents(
+            index_name, self.stream_documents(unified_index, processes, batch_size), thread_count
+        )
+        # objects which were changed during the indexing
+        changed_total, changed_errors = self.bulk_documents(
+            index_name, self.stream_documents(unified_index, processes, batch_size, started), thread_count
+        )
+        self.conn.indices.put_settings(index=index_name, body={'index': {'refresh_interval': None}})
+        self.conn.indices.refresh(index=index_name)
+        self.switch_alias(index_name, keep_old)
+        return index_name, total + changed_total, errors + changed_errors
+
+    def create_index(self, index_name, unified_index):
+        self.content_field_name, field_mapping = self.build_schema(unified_index.all_searchfields())
+        body = copy.deepcopy(self.DEFAULT_SETTINGS)
+        # the index is refreshed once after the indexing
+        body['settings']['refresh_interval'] = '-1'
+        body['mappings'] = {'modelresult': {'properties': field_mapping}}
+        self.conn.indices.create(index=index_name, body=body)
+
+    def stream_documents(self, unified_index, processes, batch_size, updated_after=None):
+        # the pool is spawned because forked processes would share the database connections
+        db_connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(processes, mp_context=context, initializer=django.setup) as executor:
+            pending = deque()
+            for model in unified_index.get_indexed_models():
+                index = unified_index.get_index(model)
+                qs = index.build_queryset(using=self.connection_alias)
+                if updated_after:
+                    updated_field = index.get_updated_field()
+                    if not updated_field:
+                        continue
+                    qs = qs.filter(**{'{}__gte'.format(updated_field): updated_after})
+                pks = qs.order_by().values_list('pk', flat=True).iterator(chunk_size=batch_size)
+                for chunk in iter(lambda: list(itertools.islice(pks, batch_size)), []):
+                    pending.append(executor.submit(
+                        prepare_documents, self.connection_alias, model._meta.label, chunk
+                    ))
+                    # a few chunks are prepared ahead of the bulk requests
+                    if len(pending) > processes * 2:
+                        yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def bulk_documents(self, index_name, documents, thread_count):
+        kwargs = dict(settings.ELASTIC_BULK, index=index_name, doc_type='modelresult', raise_on_error=False)
+        if thread_count > 1:
+            results = parallel_bulk(self.conn, documents, thread_count=thread_count, **kwargs)
+        else:
+            results = streaming_bulk(self.conn, documents, **kwargs)
+        total = 0
+        errors = 0
+        for ok, item in results:
+            total += 1
+            if not ok:
+                errors += 1
+                self.log.error('Failed to index a document: %s', item)
+        return total, errors
+
+    def switch_alias(self, index_name, keep_old=False):
+        alias = self.index_name
+        try:
+            old_indexes = list(self.conn.indices.get_alias(name=alias))
+        except elasticsearch.NotFoundError:
+            old_indexes = []
+        actions = [{'remove': {'index': old_index, 'alias': alias}} for old_index in old_indexes]
+        actions.append({'add': {'index': index_name, 'alias': alias}})
+        if not old_indexes and self.conn.indices.exists(index=alias):
+            # the index which was created before the aliases is replaced in the same request
+            actions.append({'remove_index': {'index': alias}})
+        self.conn.indices.update_aliases(body={'actions': actions})
+        if not keep_old:
+            for old_index in old_indexes:
+                self.conn.indices.delete(index=old_index, ignore=404)
+        self.setup_complete = False
+        self.existing_mapping = {}
+
+
+def prepare_documents(connection_alias, model_label, pks):
+    # runs in the processes of the reindexing pool
+    from haystack import connections
+
+    backend = connections[connection_alias].get_backend()
+    index = connections[connection_alias].get_unified_index().get_index(apps.get_model(model_label))
+    documents = []
+    for obj in index.build_queryset(using=connection_alias).filter(pk__in=pks):
+        try:
+            documents.append(backend.prepare_document(index, obj))
+        except SkipDocument:
+            continue
+    return documents
 
 
 class ElasticsearchSearchQuery(Elasticsearch6SearchQuery):
     custom_query = None
+    post_filter = None
 
     def build_params(self, spelling_query=None, **kwargs):
         result = super().build_params(spelling_query, **kwargs)
         if self.custom_query:
             result['custom_query'] = self.custom_query
+        if self.post_filter:
+            result['post_filter'] = self.post_filter
         return result
 
     def _clone(self, klass=None, using=None):
         result = super()._clone(klass, using)
         result.custom_query = self.custom_query
+        result.post_filter = self.post_filter
         return result
 
-    def add_custom_query(self, custom_query=None, order_by=None, facets=None, start_offset=None, end_offset=None):
+    def add_custom_query(
+        self, custom_query=None, order_by=None, facets=None, start_offset=None, end_offset=None, post_filter=None
+    ):
         self.custom_query = custom_query
+        self.post_filter = post_filter
         if order_by:
             self.order_by = order_by
         if facets:
@@ -368,9 +492,11 @@ class ElasticsearchSearchQuery(Elasticsearch6SearchQuery):
 
 
 class ConfigurableSearchQuerySet(SearchQuerySet):
-    def custom_query(self, custom_query, order_by=None, facets=None, start_offset=None, end_offset=None):
+    def custom_query(
+        self, custom_query, order_by=None, facets=None, start_offset=None, end_offset=None, post_filter=None
+    ):
         clone = self._clone()
-        clone.query.add_custom_query(custom_query, order_by, facets, start_offset, end_offset)
+        clone.query.add_custom_query(custom_query, order_by, facets, start_offset, end_offset, post_filter)
         return clone
 
 
@@ -0,0 +1,210 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from apps.utils import storages
+
+LOADED_TIMEOUT = 60 * 60 * 24 * 7
+# the members with the same score are ordered by the id, so the id is a part of the redis score
+ID_RANGE = 2 ** 32
+
+SET_SCRIPT = '''
+if redis.call('exists', KEYS[3]) == 0 then
+    return 0
+end
+local old = redis.call('zscore', KEYS[1], ARGV[1])
+if old then
+    local score = (tonumber(old) + tonumber(ARGV[1])) / tonumber(ARGV[4])
+    if score > 0 then
+        redis.call('hincrby', KEYS[2], score, -1)
+    end
+end
+if ARGV[2] == '' then
+    redis.call('zrem', KEYS[1], ARGV[1])
+else
+    redis.call('zadd', KEYS[1], ARGV[3], ARGV[1])
+    if tonumber(ARGV[2]) > 0 then
+        redis.call('hincrby', KEYS[2], ARGV[2], 1)
+        redis.call('expire', KEYS[2], redis.call('ttl', KEYS[3]))
+    end
+end
+return 1
+'''
+
+
+class RedisStorage(storages.RedisStorage):
+    # the members of a board are a sorted set, so a rank is found in O(log n), the number of the members
+    # with every positive score is kept in a hash to sum the scores of a rank range without reading the members
+    scripts = {'set': SET_SCRIPT}
+
+    def __init__(self, name, client=None):
+        super().__init__(name, client)
+        self.ranks_key = 'leaderboard.{}.{{}}.ranks'.format(name)
+        self.levels_key = 'leaderboard.{}.{{}}.levels'.format(name)
+        self.loaded_key = 'leaderboard.{}.{{}}.loaded'.format(name)
+
+    def get_keys(self, board_id):
+        return [key.format(board_id) for key in (self.ranks_key, self.levels_key, self.loaded_key)]
+
+    def is_loaded(self, board_id):
+        return bool(self.get_client().exists(self.loaded_key.format(board_id)))
+
+    def load(self, board_id, rows):
+        ranks_key, levels_key, loaded_key = self.get_keys(board_id)
+        ranks = {}
+        levels = defaultdict(int)
+        for member_id, score in rows:
+            ranks[member_id] = score * ID_RANGE - member_id
+            if score > 0:
+                levels[score] += 1
+        with self.get_client().pipeline(transaction=True) as pipe:
+            pipe.delete(ranks_key, levels_key)
+            if ranks:
+                pipe.zadd(ranks_key, ranks)
+                pipe.expire(ranks_key, LOADED_TIMEOUT)
+            if levels:
+                pipe.hset(levels_key, mapping=levels)
+                pipe.expire(levels_key, LOADED_TIMEOUT)
+            pipe.set(loaded_key, 1, ex=LOADED_TIMEOUT)
+            pipe.execute()
+
+    def set(self, board_id, member_id, score):
+        # the changes of a board which is not loaded are skipped, it is loaded from the database on the next read
+        args = [member_id, '', '', ID_RANGE]
+        if score is not None:
+            args[1:3] = [score, score * ID_RANGE - member_id]
+        return bool(self.run_script('set', keys=self.get_keys(board_id), args=args))
+
+    def rank(self, board_id, member_id):
+        return self.get_client().zrevrank(self.ranks_key.format(board_id), member_id)
+
+    def count(self, board_id):
+        return self.get_client().zcard(self.ranks_key.format(board_id))
+
+    def total(self, board_id):
+        return self.get_client().zcount(self.ranks_key.format(board_id), '(0', '+inf')
+
+    def levels(self, board_id):
+        return {
+            int(score): int(count)
+            for score, count in self.get_client().hgetall(self.levels_key.format(board_id)).items()
+            if int(count) > 0
+        }
+
+    def drop(self, board_id):
+        self.get_client().delete(*self.get_keys(board_id))
+
+
+class MemoryStorage(storages.MemoryStorage):
+    # the members are kept in a sorted list of the (-score, id) keys
+    def __init__(self, name):
+        super().__init__(name)
+        self.boards = {}
+
+    def is_loaded(self, board_id):
+        return board_id in self.boards
+
+    def load(self, board_id, rows):
+        scores = dict(rows)
+        with self.lock:
+            self.boards[board_id] = (scores, sorted((-score, member_id) for member_id, score in scores.items()))
+
+    def set(self, board_id, member_id, score):
+        with self.lock:
+            if board_id not in self.boards:
+                return False
+            scores, keys = self.boards[board_id]
+            if member_id in scores:
+                del keys[bisect_left(keys, (-scores.pop(member_id), member_id))]
+            if score is not None:
+                scores[member_id] = score
+                insort(keys, (-score, member_id))
+            return True
+
+    def rank(self, board_id, member_id):
+        with self.lock:
+            scores, keys = self.boards[board_id]
+            if member_id not in scores:
+                return None
+            return bisect_left(keys, (-scores[member_id], member_id))
+
+    def count(self, board_id):
+        with self.lock:
+            return len(self.boards[board_id][1])
+
+    def total(self, board_id):
+        with self.lock:
+            return bisect_left(self.boards[board_id][1], (0,))
+
+    def levels(self, board_id):
+        levels = defaultdict(int)
+        with self.lock:
+            for score in self.boards[board_id][0].values():
+                if score > 0:
+                    levels[score] += 1
+        return dict(levels)
+
+    def drop(self, board_id):
+        with self.lock:
+            self.boards.pop(board_id, None)
+
+
+STORAGES = {
+    'redis': RedisStorage,
+    'memory': MemoryStorage,
+}
+
+
+class Leaderboard:
+    # the members of every board are ordered like ORDER BY score DESC, id ASC, a board is loaded from the database
+    # by the loader on the first read and is kept up to date by the set and remove calls of the score changes
+    def __init__(self, name, loader, storage=None):
+        self.name = name
+        self.loader = loader
+        self.storage = storage or storages.get_storage(STORAGES, name)
+
+    def ensure(self, board_id):
+        if not self.storage.is_loaded(board_id):
+            self.reload(board_id)
+
+    def reload(self, board_id):
+        self.storage.load(board_id, list(self.loader(board_id)))
+
+    def set(self, board_id, member_id, score):
+        return self.storage.set(board_id, member_id, score)
+
+    def remove(self, board_id, member_id):
+        return self.storage.set(board_id, member_id, None)
+
+    def position(self, board_id, member_id):
+        self.ensure(board_id)
+        rank = self.storage.rank(board_id, member_id)
+        return None if rank is None else rank + 1
+
+    def count(self, board_id):
+        # all the members
+        self.ensure(board_id)
+        return self.storage.count(board_id)
+
+    def total(self, board_id):
+        # the members with a positive score
+        self.ensure(board_id)
+        return self.storage.total(board_id)
+
+    def sum(self, board_id, start=0, end=None):
+        # the sum of the positive scores of the members in the positions[start:end], the members with the same
+        # score are next to each other, so the sum is counted by the number of the members with every score
+        self.ensure(board_id)
+        result = 0
+        position = 0
+        for score, count in sorted(self.storage.levels(board_id).items(), reverse=True):
+            if end is not None and position >= end:
+                break
+            first = max(position, start)
+            last = position + count if end is None else min(position + count, end)
+            if last > first:
+                result += (last - first) * score
+            position += count
+        return result
+
+    def drop(self, board_id):
+        self.storage.drop(board_id)
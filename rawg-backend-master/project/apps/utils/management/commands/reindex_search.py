@@ -0,0 +1,24 @@
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+from haystack import connections
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search index into a new index and switch the alias to it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-u', '--using', action='store', dest='using', default='default')
+        parser.add_argument('-p', '--processes', action='store', dest='processes', default=4, type=int)
+        parser.add_argument('-b', '--batch-size', action='store', dest='batch_size', default=1000, type=int)
+        parser.add_argument('-t', '--threads', action='store', dest='threads', default=4, type=int)
+        parser.add_argument('-k', '--keep-old', action='store_true', dest='keep_old', default=False)
+
+    def handle(self, *args, **options):
+        start = monotonic()
+        index_name, total, errors = connections[options['using']].get_backend().reindex(
+            options['processes'], options['batch_size'], options['threads'], options['keep_old']
+        )
+        self.stdout.write(self.style.SUCCESS('{}: {} documents, {} errors, {:.2f} sec'.format(
+            index_name, total, errors, monotonic() - start
+        )))
@@ -1,4 +1,3 @@
-from datetime import date, timedelta
 from urllib import parse
 
 from cachetools.func import ttl_cache
@@ -12,15 +11,10 @@ from django.middleware.csrf import CsrfViewMiddleware, get_token, rotate_token
 from django.utils import translation
 from django.utils.deprecation import MiddlewareMixin
 from django.utils.http import is_same_domain
-from django.utils.timezone import now
 from knbauth.middleware import AuthenticationMiddleware as BaseAuthenticationMiddleware
 from modeltranslation.utils import get_language
 
-from apps.stat.models import APIUserCounter
-from apps.stat.tasks import dump_api_stat
-
-_api_counter = {}
-_api_counter_last_dump = None
+from apps.utils import api_limits
 
 
 class AddPathHeaderMiddleware:
@@ -99,8 +93,6 @@ class ApiKeyMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        global _api_counter, _api_counter_last_dump
-
         request.API_KEY = request.GET.get('key')
         request.API_GROUP = None
         user_id = ''
@@ -140,17 +132,9 @@ class ApiKeyMiddleware:
                 if not cache_result:
                     return JsonResponse({'error': 'The API key is not found'}, status=401)
                 user_id, request.API_GROUP, date_api = cache_result
-                if settings.API_LIMITS[request.API_GROUP]:
-                    counter = _api_counter.get(user_id, 0)
-                    if not counter and self.check_limit_reached(user_id, request.API_GROUP, date_api):
-                        return JsonResponse({'error': 'The monthly API limit reached'}, status=401)
-                    _api_counter[user_id] = counter + 1
-                    if not _api_counter_last_dump:
-                        _api_counter_last_dump = now()
-                    elif (now() - _api_counter_last_dump) > timedelta(minutes=3):
-                        dump_api_stat.delay(_api_counter)
-                        _api_counter = {}
-                        _api_counter_last_dump = now()
+                api_limit = settings.API_LIMITS[request.API_GROUP]
+                if api_limit and not api_limits.limiter.hit(user_id, api_limit, date_api):
+                    return JsonResponse({'error': 'The monthly API limit reached'}, status=401)
 
         response = self.get_response(request)
         response['Api-User'] = user_id
@@ -166,18 +150,6 @@ class ApiKeyMiddleware:
             cache.set(cache_key, cache_result, 600)
         return cache_result
 
-    @ttl_cache(maxsize=1000, ttl=60)
-    def check_limit_reached(self, user_id: str, api_group: str, date_api: date) -> bool:
-        api_limit = settings.API_LIMITS[api_group]
-        if not api_limit:
-            return False
-        counter = sum(
-            APIUserCounter.objects
-            .filter(user_id=user_id, date__gte=date_api)
-            .values_list('count', flat=True)
-        )
-        return counter >= api_limit
-
 
 class AuthenticationMiddleware(BaseAuthenticationMiddleware, MiddlewareMixin):
     pass
@@ -1,8 +1,10 @@
 import abc
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Context, Decimal, ROUND_CEILING, ROUND_FLOOR, localcontext
 from functools import reduce
-from typing import Dict, Iterable, Optional, Tuple, TypeVar, Union
+from time import monotonic, sleep
+from typing import Dict, Iterable, List, Optional, Tuple, TypeVar, Union
 from urllib.parse import urljoin
 
 import requests
@@ -15,13 +17,25 @@ from simplejson.errors import JSONDecodeError
 from apps.payments.models import Payment, PaymentProject, PendingEvent
 from apps.users.models import PlayerType
 from .exceptions import InvalidPaymentSystemResponse, PaymentNotFound
-from .tools import get_project
+from .tools import get_project, get_session
 
 SyncResult = Tuple[bool, Optional[str]]
 PaymentSyncResultMap = Dict[Payment, SyncResult]
 
 
 class BaseSynchronizer(metaclass=abc.ABCMeta):
+    MAX_WORKERS = 8
+    MAX_RETRIES = 3
+    RETRY_STATUSES = (429, 502, 503, 504)
+    RETRY_DELAY = 1
+    MAX_RETRY_DELAY = 30
+    TIMEOUT = 30
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self.projects = {}
+        self.paused_until = 0
+
     @property
     @abc.abstractmethod
     def PAYMENT_SYSTEM_NAME(self) -> str:
@@ -41,23 +55,84 @@ class BaseSynchronizer(metaclass=abc.ABCMeta):
     def name(self) -> str:
         return f'{self.PAYMENT_SYSTEM_NAME}_{self.POSTFIX}'
 
-    def sync(self, payments: Iterable[Payment]) -> PaymentSyncResultMap:
+    @cached_property
+    def session(self) -> requests.Session:
+        return get_session(self.PAYMENT_SYSTEM_NAME, self.max_workers)
+
+    def sync(self, payments: Iterable[Payment], concurrent: bool = True) -> PaymentSyncResultMap:
         result = namedtuple('result', ['updated', 'error'])
         results = {}
-        for payment in payments:
-            if self.need_to_check(payment):
-                try:
-                    project = get_project(payment.game_id, self.PAYMENT_SYSTEM_NAME)
-                    response = self.get_response(payment, project)
-                    if self.has_updates(payment, response):
-                        results[payment] = result(True, None)
-                        self.update(payment, response)
-                    else:
-                        results[payment] = result(False, None)
-                except (InvalidPaymentSystemResponse, PaymentNotFound) as error:
-                    results[payment] = result(False, error.description)
+        payments = self.need_to_check_many(list(payments))
+        self.prepare(payments)
+        # only the requests to the payment system are made in the threads, the database is used by this thread
+        if concurrent and len(payments) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                responses = list(executor.map(self.fetch, payments))
+        else:
+            responses = [self.fetch(payment) for payment in payments]
+        for payment, (response, error) in zip(payments, responses):
+            try:
+                if error:
+                    raise error
+                if self.has_updates(payment, response):
+                    results[payment] = result(True, None)
+                    self.update(payment, response)
+                else:
+                    results[payment] = result(False, None)
+            except (InvalidPaymentSystemResponse, PaymentNotFound) as error:
+                results[payment] = result(False, error.description)
         return results
 
+    def need_to_check_many(self, payments: List[Payment]) -> List[Payment]:
+        return [payment for payment in payments if self.need_to_check(payment)]
+
+    def prepare(self, payments: List[Payment]) -> None:
+        game_ids = {payment.game_id for payment in payments} - set(self.projects)
+        if not game_ids:
+            return
+        projects = PaymentProject.objects.filter(game_id__in=game_ids, payment_system_name=self.PAYMENT_SYSTEM_NAME)
+        for project in projects:
+            self.projects[project.game_id] = project
+        # the missed projects raise the error here
+        for game_id in game_ids:
+            self.get_project(game_id)
+
+    def get_project(self, game_id: int) -> PaymentProject:
+        if game_id not in self.projects:
+            self.projects[game_id] = get_project(game_id, self.PAYMENT_SYSTEM_NAME)
+        return self.projects[game_id]
+
+    def fetch(self, payment: Payment) -> Tuple[Optional[dict], Optional[Exception]]:
+        try:
+            return self.get_response(payment, self.get_project(payment.game_id)), None
+        except (InvalidPaymentSystemResponse, PaymentNotFound) as error:
+            return None, error
+
+    def request(self, url: str, **kwargs) -> requests.Response:
+        # a throttled request pauses all the threads of the synchronizer for the time the payment system asks for
+        for attempt in range(self.MAX_RETRIES + 1):
+            delay = self.paused_until - monotonic()
+            if delay > 0:
+                sleep(delay)
+            try:
+                response = self.session.get(url, timeout=self.TIMEOUT, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if attempt == self.MAX_RETRIES:
+                    raise InvalidPaymentSystemResponse(f'Connection error with {self.PAYMENT_SYSTEM_NAME}') from error
+                delay = self.RETRY_DELAY * 2 ** attempt
+            else:
+                if response.status_code not in self.RETRY_STATUSES or attempt == self.MAX_RETRIES:
+                    return response
+                delay = self.get_retry_delay(response, attempt)
+            self.paused_until = max(self.paused_until, monotonic() + delay)
+
+    def get_retry_delay(self, response: requests.Response, attempt: int) -> float:
+        try:
+            delay = float(response.headers['Retry-After'])
+        except (KeyError, ValueError):
+            delay = self.RETRY_DELAY * 2 ** attempt
+        return min(delay, self.MAX_RETRY_DELAY)
+
     @abc.abstractmethod
     def get_response(self, payment: Payment, project: PaymentProject):
         pass
@@ -112,12 +187,12 @@ class BaseXsollaSynchronizer(BaseSynchronizer, metaclass=abc.ABCMeta):
 
     def _get_simple_search_response(self, payment: Payment):
         url = urljoin(self.BASE_URL, self._simple_search_path)
-        response = requests.get(url, auth=self._auth, params=dict(external_id=payment.id))
+        response = self.request(url, auth=self._auth, params=dict(external_id=payment.id))
         return self._check_response(response)
 
     def _get_detail_response(self, transaction_id: int):
         url = urljoin(self.BASE_URL, self._details_path.format(transaction_id=transaction_id))
-        response = requests.get(url, auth=self._auth)
+        response = self.request(url, auth=self._auth)
         return self._check_response(response)
 
     def _prepare_event_data(self, payment: Payment, response) -> dict:
@@ -162,13 +237,26 @@ class BaseXsollaSynchronizer(BaseSynchronizer, metaclass=abc.ABCMeta):
 class BaseUkassaSynchronizer(BaseSynchronizer, metaclass=abc.ABCMeta):
     PAYMENT_SYSTEM_NAME = Payment.UKASSA
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.transaction_ids = {}
+
+    def prepare(self, payments: List[Payment]) -> None:
+        super().prepare(payments)
+        events = PendingEvent.objects.filter(
+            payment_id__in=[payment.id for payment in payments if payment.id not in self.transaction_ids],
+            data__payment_system_name=Payment.UKASSA,
+        ).order_by('id').values_list('payment_id', 'data')
+        for payment_id, data in events:
+            self.transaction_ids.setdefault(payment_id, data['id'])
+
     def get_response(self, payment: Payment, project: PaymentProject):
         transaction_id = self.get_transaction_id(payment)
         url = self.get_url(transaction_id)
 
         auth = HTTPBasicAuth(str(project.id), project.secret_key)
 
-        response = requests.get(url, auth=auth)
+        response = self.request(url, auth=auth)
         try:
             response.raise_for_status()
             return response.json()
@@ -177,9 +265,8 @@ class BaseUkassaSynchronizer(BaseSynchronizer, metaclass=abc.ABCMeta):
 
     def get_transaction_id(self, payment: Payment) -> str:
         try:
-            event = PendingEvent.objects.get(payment=payment, data__payment_system_name=Payment.UKASSA)
-            return event.data['id']
-        except PendingEvent.DoesNotExist as error:
+            return self.transaction_ids[payment.id]
+        except KeyError as error:
             raise PaymentNotFound('Payment creation event in ukassa not found') from error
 
     @abc.abstractmethod
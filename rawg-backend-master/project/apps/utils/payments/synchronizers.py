@@ -1,4 +1,5 @@
 from copy import deepcopy
+from typing import List
 from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
 
 from apps.payments.models import PaidEvent, Payment, RefundedEvent
@@ -6,12 +7,23 @@ from .bases import BaseUkassaSynchronizer, BaseXsollaSynchronizer
 from .exceptions import InvalidPaymentSystemResponse
 
 
+def without_events(event_model, payments: List[Payment]) -> List[Payment]:
+    synced = set(
+        event_model.objects.filter(payment_id__in=[payment.id for payment in payments])
+        .values_list('payment_id', flat=True)
+    )
+    return [payment for payment in payments if payment.id not in synced]
+
+
 class XsollaPaymentSynchronizer(BaseXsollaSynchronizer):
     POSTFIX = 'payment'
 
     def need_to_check(self, payment: Payment) -> bool:
         return not PaidEvent.objects.filter(payment=payment).exists()
 
+    def need_to_check_many(self, payments: List[Payment]) -> List[Payment]:
+        return without_events(PaidEvent, payments)
+
     def has_updates(self, payment: Payment, response) -> bool:
         try:
             return response['transaction_details']['status'] in ['done', 'canceled']
@@ -39,6 +51,9 @@ class XsollaRefundSynchronizer(BaseXsollaSynchronizer):
     def need_to_check(self, payment: Payment) -> bool:
         return not RefundedEvent.objects.filter(payment=payment).exists()
 
+    def need_to_check_many(self, payments: List[Payment]) -> List[Payment]:
+        return without_events(RefundedEvent, payments)
+
     def has_updates(self, payment: Payment, response) -> bool:
         try:
             return response['transaction_details']['status'] in ['canceled']
@@ -65,6 +80,9 @@ class UkassaPaymentSynchronizer(BaseUkassaSynchronizer):
     def need_to_check(self, payment: Payment) -> bool:
         return not PaidEvent.objects.filter(payment=payment).exists()
 
+    def need_to_check_many(self, payments: List[Payment]) -> List[Payment]:
+        return without_events(PaidEvent, payments)
+
     def has_updates(self, payment: Payment, response) -> bool:
         try:
             return response['status'] == 'succeeded'
@@ -98,6 +116,9 @@ class UkassaRefundSynchronizer(BaseUkassaSynchronizer):
     def need_to_check(self, payment: Payment) -> bool:
         return not RefundedEvent.objects.filter(payment=payment).exists()
 
+    def need_to_check_many(self, payments: List[Payment]) -> List[Payment]:
+        return without_events(RefundedEvent, payments)
+
     def has_updates(self, payment: Payment, response) -> bool:
         try:
             return bool(response['items'])
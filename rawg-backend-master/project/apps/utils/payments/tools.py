@@ -1,6 +1,14 @@
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+
 from apps.payments.models import PaymentProject
 from .exceptions import PaymentProjectNotConfigured
 
+_sessions = {}
+_sessions_lock = Lock()
+
 
 def get_project(game_id: int, payment_system_name: str) -> PaymentProject:
     try:
@@ -9,3 +17,17 @@ def get_project(game_id: int, payment_system_name: str) -> PaymentProject:
         raise PaymentProjectNotConfigured(
             f'Payment system not configured for game (game_id: {game_id})'
         ) from error
+
+
+def get_session(name: str, pool_size: int = 10, hosts: int = 10) -> requests.Session:
+    # keep-alive connection pools per host which are shared by all the threads of the process,
+    # the callers with other pool sizes get their own sessions
+    key = (name, pool_size, hosts)
+    with _sessions_lock:
+        if key not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[key] = session
+        return _sessions[key]
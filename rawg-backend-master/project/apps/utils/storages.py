@@ -0,0 +1,38 @@
+from threading import Lock
+
+from django.conf import settings
+from redis import Redis
+
+
+class RedisStorage:
+    # the base of the redis storages: the client is created on the first use,
+    # the lua scripts of `scripts` are registered with it when they are run for the first time
+    scripts = {}
+
+    def __init__(self, name, client=None):
+        self.name = name
+        self.client = client
+        self.registered_scripts = {}
+
+    def get_client(self):
+        if not self.client:
+            self.client = Redis.from_url(settings.REDIS_LOCATION)
+        return self.client
+
+    def run_script(self, script, keys, args, client=None):
+        # the client can be a pipeline, then the result is in its execute()
+        if script not in self.registered_scripts:
+            self.registered_scripts[script] = self.get_client().register_script(self.scripts[script])
+        return self.registered_scripts[script](keys=keys, args=args, client=client)
+
+
+class MemoryStorage:
+    # the base of the in-process stand-ins of the redis storages for tests and single process setups
+    def __init__(self, name):
+        self.name = name
+        self.lock = Lock()
+
+
+def get_storage(storages, name):
+    # storages are {'redis': ..., 'memory': ...} classes, the tests use the memory ones
+    return storages[settings.COUNTERS_STORAGE](name)
@@ -16,7 +16,7 @@ from langdetect.lang_detect_exception import LangDetectException
 from reversion.models import Revision, Version
 
 from apps.celery import app as celery
-from apps.utils import cache
+from apps.utils import cache, counters
 from apps.utils.emails import send
 from apps.utils.lang import local_lang_detect
 from apps.utils.slack import send_info
@@ -67,6 +67,11 @@ def get_versions_and_send_slack(self, object_id, object_name, object_slug, conte
         self.retry()
 
 
+@celery.task(time_limit=50, ignore_result=True, expires=50)
+def flush_counters():
+    counters.flush_all()
+
+
 @celery.task(time_limit=60, ignore_result=True)
 def warm_cache():
     cache.warm_cache()
@@ -1,11 +1,16 @@
+import json
 import os
 import shutil
+import time
 import typing
 from contextlib import contextmanager
 from copy import deepcopy
 from datetime import datetime as dt, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from importlib import import_module
+from threading import Thread
 from unittest.mock import MagicMock, patch
+from urllib.parse import parse_qsl, urlparse
 
 import gender_predictor
 from django.conf import settings
@@ -66,6 +71,40 @@ def cache_test_config(index):
     }
 
 
+@contextmanager
+def fake_http_server(
+    handle: typing.Callable[[str, dict], typing.Tuple[int, dict, typing.Any]], delay: float = 0
+) -> typing.Generator[str, None, None]:
+    # a local json api in place of an external service, handle(path, query) returns the status, headers and data
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if delay:
+                time.sleep(delay)
+            url = urlparse(self.path)
+            status, headers, data = handle(url.path, dict(parse_qsl(url.query)))
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield 'http://127.0.0.1:{}/'.format(server.server_port)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
 class APIClient(drf_APIClient):
     def login(self, username, password):
         try:
@@ -263,6 +263,10 @@ CACHES = {
     },
 }
 CACHEBACK_VERIFY_CACHE_WRITE = os.environ.get('CACHEBACK_VERIFY_CACHE_WRITE', False)
+# the size of the process-local tier of cacheback jobs, 0 disables it
+CACHEBACK_LOCAL_MAX_SIZE = int(os.environ.get('CACHEBACK_LOCAL_MAX_SIZE', 1000))
+if ENVIRONMENT == 'TESTS':
+    CACHEBACK_LOCAL_MAX_SIZE = 0
 USE_ETAGS = False
 
 #########
@@ -273,6 +277,16 @@ REDIS_LOCATION = os.environ.get('REDIS_LOCATION', 'redis://redis:6379/1')
 if ENVIRONMENT == 'TESTS':
     REDIS_LOCATION = os.environ.get('TEST_REDIS_LOCATION', 'redis://redis:6379/10')
 
+# write-behind counters, see apps.utils.counters
+COUNTERS_STORAGE = os.environ.get('COUNTERS_STORAGE', 'redis')
+if ENVIRONMENT == 'TESTS':
+    COUNTERS_STORAGE = 'memory'
+
+# precomputed explore timelines, see apps.feed.timeline
+FEED_TIMELINE = os.environ.get('FEED_TIMELINE', 'on') == 'on'
+if ENVIRONMENT == 'TESTS':
+    FEED_TIMELINE = False
+
 ###########
 # Logging #
 ###########
@@ -838,6 +852,8 @@ if ENVIRONMENT != 'TESTS':
 CELERY_HAYSTACK_DEFAULT_TASK = 'apps.utils.tasks.HaystackSignalHandler'
 
 HAYSTACK_LOG = os.environ.get('HAYSTACK_LOG')
+# seconds to keep the results of the games list searches, 0 disables the cache
+GAMES_SEARCH_CACHE_TIMEOUT = int(os.environ.get('GAMES_SEARCH_CACHE_TIMEOUT', 0))
 
 ########
 # REST #
@@ -922,6 +938,7 @@ REDOC_SETTINGS = {
 
 CRAWLING_SAVE_IMAGES = ENVIRONMENT == 'PRODUCTION'
 DISABLE_GAME_UPDATE_SIGNALS = os.environ.get('DISABLE_GAME_UPDATE_SIGNALS', False)
+GAME_DENORMALIZE_DELAY = int(os.environ.get('GAME_DENORMALIZE_DELAY', 10))
 
 MONGO_HOST = 'mongo'
 MONGO_PORT = 27017
@@ -1113,6 +1130,11 @@ XSOLLA_MERCHANT_ID = os.environ.get('XSOLLA_MERCHANT_ID', '')
 XSOLLA_API_KEY = os.environ.get('XSOLLA_API_KEY', '')
 XSOLLA_PRODUCTION_MODE = os.environ.get('XSOLLA_MODE') == 'production'
 
+# delivery of the payments to the game webhooks, see apps.payments.delivery
+PAYMENTS_DELIVERY_CONCURRENCY = int(os.environ.get('PAYMENTS_DELIVERY_CONCURRENCY', 4))
+PAYMENTS_DELIVERY_BREAKER_FAILURES = int(os.environ.get('PAYMENTS_DELIVERY_BREAKER_FAILURES', 5))
+PAYMENTS_DELIVERY_BREAKER_TIMEOUT = int(os.environ.get('PAYMENTS_DELIVERY_BREAKER_TIMEOUT', 10 * 60))
+
 DAV_STORE_CONFIG = {
     'SCHEME': os.environ.get('DAV_STORE_SCHEME', ''),
     'HOST': os.environ.get('DAV_STORE_HOST', '').strip('/'),